@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Every app's models are loaded by now
+        from core.queryset_cache import connect_invalidation_receivers
+        connect_invalidation_receivers()
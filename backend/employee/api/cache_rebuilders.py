@@ -0,0 +1,83 @@
+"""
+Rebuilders for the report view caches, used by access-driven warming
+(``core.cache_warming.warm_most_missed``).
+
+Each one parses its cache key back into query parameters with the family's
+``core.cache_keys`` schema (keys of an older version are skipped) and runs the
+view's own queryset and serializer, so the warmed value is exactly what a
+request would have cached.
+"""
+
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.utils.dateparse import parse_date
+from rest_framework.request import Request
+
+from core.cache_access import register_rebuilder
+from core.cache_keys import DASHBOARD_REPORT_ENTRIES_RANGE, REPORT_ENTRIES_DATE, REPORT_ENTRIES_RANGE
+from core.cache_tags import report_date_tag, report_month_tags, REPORT_ALL_TAG
+from api.views.report_views import AllReportEntriesView, ReportEntriesByDateView, get_cache_timeout_for_date
+from api.views.dashboard_views import DashboardReportEntriesByDateView
+
+
+def _list_data(view_class, params):
+    """Serialized, unpaginated list a GET with ``params`` would return."""
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(urlencode(params))
+    view = view_class()
+    view.request = Request(http_request)
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    return view.get_serializer(view.get_queryset(), many=True).data
+
+
+@register_rebuilder(REPORT_ENTRIES_DATE.name)
+def rebuild_report_entries_date(key):
+    parts = REPORT_ENTRIES_DATE.parse(key)
+    if parts is None or parts['date'] == 'None':
+        return None
+    date_param, salesman = parts['date'], parts['salesman']
+    timeout = get_cache_timeout_for_date(date_param)
+    if timeout <= 0:
+        return None
+    params = {'date': date_param}
+    if salesman != 'all':
+        params['salesman_name'] = salesman
+    query_date = parse_date(date_param)
+    tags = [report_date_tag(query_date.isoformat())] if query_date else [REPORT_ALL_TAG]
+    return REPORT_ENTRIES_DATE.entry(key, _list_data(AllReportEntriesView, params), timeout, tags, swr=True)
+
+
+@register_rebuilder(REPORT_ENTRIES_RANGE.name)
+def rebuild_report_entries_range(key):
+    parts = REPORT_ENTRIES_RANGE.parse(key)
+    if parts is None:
+        return None
+    start_param, end_param, salesman = parts['start'], parts['end'], parts['salesman']
+    start_date, end_date = parse_date(start_param), parse_date(end_param)
+    timeout = max(get_cache_timeout_for_date(start_param), get_cache_timeout_for_date(end_param))
+    if not start_date or not end_date or start_date > end_date or timeout <= 0:
+        return None
+    params = {'start_date': start_param, 'end_date': end_param}
+    if salesman != 'all':
+        params['salesman_name'] = salesman
+    return REPORT_ENTRIES_RANGE.entry(
+        key, _list_data(ReportEntriesByDateView, params), timeout, report_month_tags(start_date, end_date), swr=True
+    )
+
+
+@register_rebuilder(DASHBOARD_REPORT_ENTRIES_RANGE.name)
+def rebuild_dashboard_report_entries_range(key):
+    parts = DASHBOARD_REPORT_ENTRIES_RANGE.parse(key)
+    if parts is None:
+        return None
+    start_param, end_param = parts['start'], parts['end']
+    start_date, end_date = parse_date(start_param), parse_date(end_param)
+    if not start_date or not end_date or start_date > end_date or (end_date - start_date).days > 90:
+        return None
+    data = _list_data(DashboardReportEntriesByDateView, {'start_date': start_param, 'end_date': end_param})
+    return DASHBOARD_REPORT_ENTRIES_RANGE.entry(
+        key, data, settings.CACHE_TIMEOUTS.get('report_recent', 120), report_month_tags(start_date, end_date), swr=True
+    )
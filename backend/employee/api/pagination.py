@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
 
 
@@ -29,4 +29,15 @@ class DailyReportPagination(OptimizedPageNumberPagination):
     Since daily reports are typically smaller, we can load more at once.
     """
     page_size = 100  # Higher default for daily views
-    max_page_size = 500  # Allow loading entire day at once if needed
\ No newline at end of file
+    max_page_size = 500  # Allow loading entire day at once if needed
+
+
+class VacationRequestCursorPagination(CursorPagination):
+    """
+    Cursor pagination for vacation approvals.
+    Pages stay stable while new requests arrive and cost the same however deep the history is.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-submitted_at', '-id')
@@ -1,3 +1,200 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITransactionTestCase, force_authenticate
+from rest_framework.views import APIView
+
+from core.cache_access import flush_access_counts
+from core.cache_keys import EMPLOYEE_SALARIES, REPORT_ENTRIES_DATE, USER_PROFILE, USER_SALARY
+from core.cache_utils import ROLE_SCOPE, cached_response, response_cache_key
+from core.cache_warming import warm_most_missed, warm_report_caches, warm_user_caches
+from core.queryset_cache import invalidate_model_cache
+from core.redis_config import safe_cache_get
+from core.testing import FakeRedisMixin
+from employee.models import EmployeeProfile
+from report.models import ReportEntry
+
+
+def make_employee(username, role='CLERK'):
+    profile = User.objects.create_user(username=username, password='x').profile
+    if profile.role != role:
+        profile.role = role
+        profile.save(update_fields=['role'])
+    return profile
+
+
+class CacheWarmingTest(FakeRedisMixin, APITransactionTestCase):
+    """Warmers write the entries the views read back, in their payload format."""
+
+    cache_settings = {'CACHE_ACCESS_TRACKING': {'SAMPLE_RATE': 1.0, 'FLUSH_INTERVAL': 3600}}
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_employee('warm-admin', role='ADMIN')
+        self.client.force_authenticate(self.admin.user)
+
+    def test_user_warming_serves_views(self):
+        self.assertEqual(warm_user_caches(), 2)
+        self.assertEqual(cache.get(USER_PROFILE.key(self.admin.user.id))['username'], 'warm-admin')
+
+        # Bypasses the invalidation signals: only a warmed entry can answer with the old salary
+        EmployeeProfile.objects.filter(pk=self.admin.pk).update(base_salary=99999)
+        response = self.client.get('/api/salary/me')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['base_salary'], 99999)
+
+    def test_report_warming_skips_today(self):
+        yesterday = date.today() - timedelta(days=1)
+        for day in (yesterday, date.today()):
+            ReportEntry.objects.create(salesman=self.admin.user, date=day, client_type='doctor')
+        self.assertEqual(warm_report_caches(days=3), 1)
+        self.assertIsNotNone(cache.get(REPORT_ENTRIES_DATE.key(yesterday.isoformat(), 'all')))
+        self.assertIsNone(cache.get(REPORT_ENTRIES_DATE.key(date.today().isoformat(), 'all')))
+
+    def test_endpoint_waits_for_results(self):
+        response = self.client.post('/api/health/cache/warm/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(body['results']['users_warmed'], 2)
+        self.assertIn('duration_ms', body['results'])
+
+    def test_endpoint_background_opt_in(self):
+        with mock.patch('api.views.health.warm_in_background', return_value=True) as started:
+            response = self.client.post('/api/health/cache/warm/?background=true')
+        self.assertEqual(response.status_code, 202)
+        started.assert_called_once_with()
+        with mock.patch('api.views.health.warm_in_background', return_value=False):
+            response = self.client.post('/api/health/cache/warm/?background=true')
+        self.assertEqual(response.status_code, 409)
+
+    def test_most_missed_keys_are_rebuilt(self):
+        other = make_employee('warm-other')
+        for user_id in (self.admin.user.id, other.user.id, other.user.id, 0):
+            safe_cache_get(USER_PROFILE.key(user_id))
+        cache.set(USER_PROFILE.key(self.admin.user.id), {'username': 'cached'})
+        flush_access_counts()
+
+        # Already cached and no longer existing users are skipped
+        self.assertEqual(warm_most_missed(), 1)
+        self.assertEqual(cache.get(USER_PROFILE.key(other.user.id))['username'], 'warm-other')
+        self.assertEqual(cache.get(USER_PROFILE.key(self.admin.user.id)), {'username': 'cached'})
+
+
+class CachedResponseTest(FakeRedisMixin, APITransactionTestCase):
+    """Cached responses are shared only within their scope, and only 200s are cached."""
+
+    def setUp(self):
+        super().setUp()
+        self.clerk = make_employee('scope-clerk')
+        self.admin = make_employee('scope-admin', role='ADMIN')
+        self.director = make_employee('scope-director', role='DIRECTOR')
+        EmployeeProfile.objects.filter(pk=self.clerk.pk).update(base_salary=1000)
+        EmployeeProfile.objects.filter(pk=self.admin.pk).update(base_salary=2000)
+
+    def _get(self, profile, url):
+        self.client.force_authenticate(User.objects.get(pk=profile.user_id))
+        return self.client.get(url)
+
+    def test_user_scope(self):
+        self.assertEqual(self._get(self.clerk, '/api/salary/me').data['base_salary'], 1000)
+        self.assertEqual(self._get(self.admin, '/api/salary/me').data['base_salary'], 2000)
+        self.assertIsNotNone(cache.get(response_cache_key(USER_SALARY, f'u{self.clerk.user_id}')))
+
+    def test_global_scope_shared_behind_role_check(self):
+        first = self._get(self.admin, '/api/salaries/')
+        self.assertEqual(first.status_code, 200)
+        # Bypasses the invalidation signals: the director must be served the admin's entry
+        EmployeeProfile.objects.filter(pk=self.clerk.pk).update(base_salary=1)
+        self.assertEqual(self._get(self.director, '/api/salaries/').data, first.data)
+        self.assertEqual(self._get(self.clerk, '/api/salaries/').status_code, 403)
+        self.assertEqual(len(self.redis.keys(f'*{EMPLOYEE_SALARIES.name}:*')), 1)
+
+    def test_role_scope_and_query_parameters(self):
+        calls = []
+
+        class RoleView(APIView):
+            @cached_response(USER_SALARY, 60, scope=ROLE_SCOPE)
+            def get(self, request):
+                calls.append(request.user.username)
+                return Response({'computed_for': request.user.username})
+
+        factory = APIRequestFactory()
+
+        def get(profile, query=''):
+            request = factory.get(f'/role/{query}')
+            force_authenticate(request, User.objects.get(pk=profile.user_id))
+            return RoleView.as_view()(request).data['computed_for']
+
+        other_clerk = make_employee('scope-clerk-2')
+        self.assertEqual(get(self.clerk), 'scope-clerk')
+        self.assertEqual(get(other_clerk), 'scope-clerk')
+        self.assertEqual(get(self.admin), 'scope-admin')
+        self.assertEqual(get(self.clerk, '?a=1&b=2'), 'scope-clerk')
+        self.assertEqual(get(other_clerk, '?b=2&a=1'), 'scope-clerk')
+        self.assertEqual(calls, ['scope-clerk', 'scope-admin', 'scope-clerk'])
+
+    def test_error_responses_are_not_cached(self):
+        EmployeeProfile.objects.filter(pk=self.clerk.pk).delete()
+        self.assertEqual(self._get(self.clerk, '/api/salary/me').status_code, 404)
+        self.assertEqual(self.redis.keys(f'*{USER_SALARY.name}:*'), [])
+
+
+class QuerysetCacheTest(FakeRedisMixin, APITransactionTestCase):
+    """Cached querysets are served from Redis until a table they read is written to."""
+
+    def setUp(self):
+        super().setUp()
+        self.salesman = make_employee('qs-salesman', role='SALESMAN')
+        self.entry = ReportEntry.objects.create(
+            salesman=self.salesman.user, date=date(2024, 5, 1), client_type='doctor', district='North'
+        )
+
+    def _districts(self):
+        queryset = ReportEntry.objects.select_related('salesman__profile').order_by('pk')
+        with CaptureQueriesContext(connection) as queries:
+            districts = [entry.district for entry in queryset.cached(60)]
+        return districts, len(queries)
+
+    def test_served_from_cache_until_a_save(self):
+        self.assertEqual(self._districts(), (['North'], 1))
+        ReportEntry.objects.filter(pk=self.entry.pk).update(district='South')
+        self.assertEqual(self._districts(), (['North'], 0))
+
+        self.entry.district = 'East'
+        self.entry.save()
+        self.assertEqual(self._districts(), (['East'], 1))
+
+    def test_joined_table_writes_invalidate(self):
+        self._districts()
+        self.salesman.save()
+        self.assertEqual(self._districts()[1], 1)
+
+    def test_manual_invalidation_after_update(self):
+        self._districts()
+        ReportEntry.objects.update(district='South')
+        invalidate_model_cache(ReportEntry)
+        self.assertEqual(self._districts(), (['South'], 1))
+
+    def test_unwatched_tables_are_not_cached(self):
+        # django_admin_log has no invalidation receivers
+        queryset = ReportEntry.objects.filter(salesman__logentry__isnull=True)
+        self.assertEqual(queryset.cached(60), [self.entry])
+        self.assertEqual(self.redis.keys('*queryset:*'), [])
+
+    def test_dashboard_view(self):
+        self.client.force_authenticate(self.salesman.user)
+        self.assertEqual([item['id'] for item in self.client.get('/api/dashboard/report-entries/').data], [self.entry.pk])
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/report-entries/')
+
+        newer = ReportEntry.objects.create(salesman=self.salesman.user, date=date(2024, 5, 2), client_type='nurse')
+        response = self.client.get('/api/dashboard/report-entries/', {'date': '2024-05-02'})
+        self.assertEqual([item['id'] for item in response.data], [newer.pk])
+        response = self.client.get('/api/dashboard/report-entries/')
+        self.assertEqual([item['id'] for item in response.data], [newer.pk, self.entry.pk])
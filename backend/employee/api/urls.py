@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views.auth_views import TokenObtainPairViewCustom, TokenRefreshViewCustom, ProtectedView, ChangePassword
 from .views.employee_views import DownloadPaySlipPDFView, GetOwnSalaryView, GetAllEmployeeSalary, GetOwnEmployeeProfile, GetEmployeeProfileAPIView, UpdateEmployeeProfileAPIView, ToggleEmployeeStatusView, GetAllEmployeesView
-from .views.vacation_views import MyVacationRequestListView, VacationRequestCreateView, VacationRequestListView, VacationRequestUpdateAPIView
+from .views.vacation_views import MyVacationRequestListView, VacationRequestCreateView, VacationRequestListView, VacationRequestUpdateAPIView, TeamLeaveCalendarView, VacationPendingCountView, VacationRequestBulkUpdateView, LeaveSummaryView
 from .views.report_views import ReportEntryDatesView, ReportEntryViewSet, AllReportEntriesView, ReportEntriesByDateView
 from .views.dashboard_views import DashboardReportEntriesView, DashboardReportEntriesByDateView
 from .views.health import redis_health, app_health, redis_metrics, cache_warm, cache_stats
@@ -30,6 +30,11 @@ urlpatterns = [
     path('vacations/', VacationRequestListView.as_view(), name='vacation-list'),
     path('vacation/<int:pk>/update/', VacationRequestUpdateAPIView.as_view(), name='vacation-update'),
     path('vacations/me/', MyVacationRequestListView.as_view(), name='get-own-vacation-list'),
+    path('vacations/bulk-update/', VacationRequestBulkUpdateView.as_view(), name='vacation-bulk-update'),
+    path('vacations/pending-count/', VacationPendingCountView.as_view(), name='vacation-pending-count'),
+    path('vacations/summary/me/', LeaveSummaryView.as_view(), name='own-leave-summary'),
+    path('vacations/summary/<int:pk>/', LeaveSummaryView.as_view(), name='leave-summary'),
+    path('vacations/calendar/', TeamLeaveCalendarView.as_view(), name='vacation-team-calendar'),
 
     # Report management endpoints (sales team only)
     path('all-report-entries/', AllReportEntriesView.as_view(), name='all-report-entries'),
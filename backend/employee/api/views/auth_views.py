@@ -6,8 +6,9 @@ from django.contrib.auth.password_validation import validate_password
 from rest_framework.views import APIView
 from django.utils.decorators import method_decorator
 from django.conf import settings
-from django.views.decorators.cache import cache_page
-from core.redis_config import safe_cache_delete
+from core.redis_config import safe_cache_get, safe_cache_set
+from core.cache_tags import user_tag
+from core.cache_keys import USER_PROFILE
 from employee.models import EmployeeProfile
 from django.contrib.auth import authenticate
 from core.permissions import get_permission_message
@@ -86,10 +87,9 @@ class ProtectedView(APIView):
     def get(self, request):
         # Cache per user using manual caching instead of cache_page decorator
         # to ensure each user gets their own cached response
-        from django.core.cache import cache
-        cache_key = f'user_profile_{request.user.id}'
+        cache_key = USER_PROFILE.key(request.user.id)
         
-        cached_data = cache.get(cache_key)
+        cached_data = safe_cache_get(cache_key)
         if cached_data:
             return Response(cached_data)
         
@@ -131,7 +131,7 @@ class ProtectedView(APIView):
         }
         
         # Cache the user data
-        cache.set(cache_key, data, settings.CACHE_TIMEOUTS['user_profile'])
+        safe_cache_set(cache_key, data, settings.CACHE_TIMEOUTS['user_profile'], tags=[user_tag(request.user.id)])
         
         return Response(data)
     
@@ -151,9 +151,6 @@ class ChangePassword(APIView):
             return Response({"detail": list(e.messages)}, status=400)
 
         user.set_password(new_password)
-        user.save()
-        
-        # Invalidate user cache after password change
-        safe_cache_delete(f'user_profile_{user.id}')
+        user.save()  # the User post_save signal invalidates the user's caches
 
         return Response({"detail": "Password changed successfully"})
\ No newline at end of file
@@ -8,12 +8,13 @@ from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.utils.dateparse import parse_date
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.conf import settings
 from datetime import datetime, timedelta
 from rest_framework.exceptions import ValidationError
 
+from core.cache_keys import DASHBOARD_REPORT_ENTRIES_RANGE
+from core.cache_tags import report_month_tags
+from core.redis_config import safe_cache_get_or_set
 from report.models import ReportEntry
 from report.serializers import ReportEntrySerializer
 
@@ -42,12 +43,18 @@ class DashboardReportEntriesView(generics.ListAPIView):
 
         return qs
 
+    def list(self, request, *args, **kwargs):
+        # Evaluated through the queryset cache: any ReportEntry/User/EmployeeProfile write invalidates it
+        entries = self.filter_queryset(self.get_queryset()).cached(settings.CACHE_TIMEOUTS.get('report_recent', 120))
+        serializer = self.get_serializer(entries, many=True)
+        return Response(serializer.data)
+
 
-@method_decorator(cache_page(settings.CACHE_TIMEOUTS.get('report_recent', 120)), name='get')
 class DashboardReportEntriesByDateView(generics.ListAPIView):
     """
     Dashboard view for report entries by date range - accessible to all authenticated users.
     Provides basic reporting data for weekly/monthly dashboard summaries.
+    Served stale-while-revalidate so dashboard loads never wait on a recompute.
     """
     serializer_class = ReportEntrySerializer
     permission_classes = [IsAuthenticated]
@@ -84,4 +91,18 @@ class DashboardReportEntriesByDateView(generics.ListAPIView):
         # Filter by date range
         qs = qs.filter(date__gte=start_date, date__lt=end_date_plus_one)
 
-        return qs
\ No newline at end of file
+        return qs
+
+    def get(self, request, *args, **kwargs):
+        # Building the (lazy) queryset validates the range before it is used for the key and tags
+        self.get_queryset()
+        start_date = parse_date(request.query_params["start_date"])
+        end_date = parse_date(request.query_params["end_date"])
+        data = safe_cache_get_or_set(
+            DASHBOARD_REPORT_ENTRIES_RANGE.key(start_date, end_date),
+            lambda: self.list(request, *args, **kwargs).data,
+            settings.CACHE_TIMEOUTS.get('report_recent', 120),
+            tags=report_month_tags(start_date, end_date),
+            swr=True,
+        )
+        return Response(data)
@@ -10,9 +10,9 @@ from employee.serializers import EmployeeProfileSerializer
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from django.conf import settings
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
-from core.redis_config import safe_cache_delete
+from core.cache_tags import user_tag, EMPLOYEES_TAG
+from core.cache_utils import cached_response, GLOBAL_SCOPE, USER_SCOPE
+from core.cache_keys import EMPLOYEE_SALARIES, USER_SALARY
 from rest_framework.decorators import action
 from core.permissions import (
     IsManagement, 
@@ -24,10 +24,11 @@ from core.permissions import (
 import io
 
 
-@method_decorator(cache_page(settings.CACHE_TIMEOUTS['user_salary']), name='get')
 class GetOwnSalaryView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @cached_response(USER_SALARY, settings.CACHE_TIMEOUTS['user_salary'], scope=USER_SCOPE,
+                     tags=[lambda request: user_tag(request.user.id)])
     def get(self, request, *args, **kwargs):
         try:
             profile = EmployeeProfile.objects.get(user=request.user)
@@ -40,11 +41,13 @@ class GetOwnSalaryView(APIView):
             return Response({'error': 'Profile not found for this user'}, status=status.HTTP_404_NOT_FOUND)
         
 
-@method_decorator(cache_page(settings.CACHE_TIMEOUTS['employee_salaries']), name='get')
 class GetAllEmployeeSalary(APIView):
     permission_classes = [IsAuthenticated]
 
     @require_roles(['ADMIN', 'DIRECTOR'], custom_message=get_permission_message('view_payroll'))
+    # Same payload for every payroll viewer, so one shared entry behind the role check
+    @cached_response(EMPLOYEE_SALARIES, settings.CACHE_TIMEOUTS['employee_salaries'], scope=GLOBAL_SCOPE,
+                     tags=[EMPLOYEES_TAG])
     def get(self, request, *args, **kwargs):
         profiles = EmployeeProfile.objects.select_related('user').filter(is_active=True)
         serializer = EmployeeProfileSerializer(profiles, many=True)
@@ -94,12 +97,8 @@ class UpdateEmployeeProfileAPIView(generics.UpdateAPIView):
         serializer = self.get_serializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        
-        # Invalidate related caches after profile update
-        safe_cache_delete(f'user_profile_{profile.user.id}')
-        safe_cache_delete(f'user_salary_{profile.user.id}')
-        safe_cache_delete('employee_salaries')
-        
+        # The EmployeeProfile post_save signal invalidates the related caches
+
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
@@ -145,13 +144,9 @@ class ToggleEmployeeStatusView(APIView):
         
         # Toggle the is_active status
         profile.is_active = not profile.is_active
-        profile.save()
-        
-        # Invalidate related caches
-        safe_cache_delete(f'user_profile_{profile.user.id}')
-        safe_cache_delete(f'user_salary_{profile.user.id}')
-        safe_cache_delete('employee_salaries')
-        
+        profile.save(update_fields=['is_active'])
+        # The EmployeeProfile post_save signal invalidates the related caches
+
         action = "activated" if profile.is_active else "deactivated"
         
         return Response({
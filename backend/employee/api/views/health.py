@@ -1,8 +1,10 @@
 from django.http import JsonResponse
 from django.core.cache import cache
 from core.redis_config import get_redis_client
+from core.circuit_breaker import get_redis_breaker
+from core.degraded_cache import degraded_stats
 from core.cache_monitoring import RedisMonitor, log_cache_metrics
-from core.cache_warming import warm_essential_caches
+from core.cache_warming import warm_essential_caches, warm_in_background
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -17,6 +19,10 @@ def redis_health(request):
     Simple Redis health check endpoint for monitoring.
     Returns Redis status and basic connection info.
     """
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        return JsonResponse({'redis': 'unhealthy', 'circuit_breaker': breaker.snapshot()})
+
     try:
         # Test basic cache operations
         test_key = 'health_check_test'
@@ -25,6 +31,7 @@ def redis_health(request):
         # Try to set and get a test value
         cache.set(test_key, test_value, 10)
         result = cache.get(test_key)
+        breaker.record_success()
         
         if result == test_value:
             # Clean up test key
@@ -46,6 +53,7 @@ def redis_health(request):
             return JsonResponse({'redis': 'unhealthy', 'error': 'Cache read/write test failed'})
             
     except Exception as e:
+        breaker.record_error(e)
         logger.error(f"Redis health check failed: {e}")
         return JsonResponse({
             'redis': 'unhealthy', 
@@ -59,25 +67,33 @@ def app_health(request):
     Overall application health check including Redis status.
     """
     try:
-        # Check Redis
+        # Check Redis, unless the circuit breaker already knows it is down
         redis_status = 'unknown'
-        try:
-            cache.set('app_health_check', 'ok', 5)
-            result = cache.get('app_health_check')
-            redis_status = 'healthy' if result == 'ok' else 'unhealthy'
-            cache.delete('app_health_check')
-        except Exception as e:
-            redis_status = f'unhealthy: {str(e)}'
+        breaker = get_redis_breaker()
+        if breaker.allow_request():
+            try:
+                cache.set('app_health_check', 'ok', 5)
+                result = cache.get('app_health_check')
+                redis_status = 'healthy' if result == 'ok' else 'unhealthy'
+                cache.delete('app_health_check')
+                breaker.record_success()
+            except Exception as e:
+                breaker.record_error(e)
+                redis_status = f'unhealthy: {str(e)}'
+        else:
+            redis_status = 'unavailable: circuit open'
         
         # Overall status
-        overall_status = 'healthy' if 'healthy' in redis_status else 'degraded'
+        overall_status = 'healthy' if redis_status == 'healthy' else 'degraded'
         
         return JsonResponse({
             'status': overall_status,
             'services': {
                 'redis': redis_status,
                 'django': 'healthy'
-            }
+            },
+            'circuit_breaker': breaker.snapshot(),
+            'degraded_cache': degraded_stats(),
         })
         
     except Exception as e:
@@ -102,8 +118,16 @@ def redis_metrics(request):
 def cache_warm(request):
     """
     Manually trigger cache warming for better performance.
+    Waits for the warmers and returns their results; ``?background=true``
+    starts them in the background instead (202, or 409 while a run is active).
     """
     if request.method == 'POST':
+        if request.query_params.get('background') == 'true':
+            started = warm_in_background()
+            return JsonResponse({
+                'status': 'accepted' if started else 'already_running',
+                'message': 'Cache warming started' if started else 'Cache warming is already running'
+            }, status=202 if started else 409)
         try:
             results = warm_essential_caches()
             return JsonResponse({
@@ -131,7 +155,12 @@ def cache_stats(request):
     """
     monitor = RedisMonitor()
     stats = monitor.get_cache_stats()
-    key_patterns = monitor.get_cache_key_patterns()
+    keyspace = monitor.analyze_keyspace()
+    access = monitor.get_access_stats()
+    family_metrics = monitor.get_family_metrics()
+    key_patterns = {
+        family: details['keys'] for family, details in keyspace.get('families', {}).items()
+    }
     
     return JsonResponse({
         'redis_status': stats.get('status', 'unknown'),
@@ -139,5 +168,8 @@ def cache_stats(request):
         'total_keys': stats.get('total_keys', 0),
         'used_memory': stats.get('used_memory_human', '0B'),
         'connected_clients': stats.get('connected_clients', 0),
-        'key_patterns': key_patterns
+        'key_patterns': key_patterns,
+        'keyspace': keyspace,
+        'access': access,
+        'family_metrics': family_metrics,
     })
\ No newline at end of file
@@ -11,11 +11,12 @@ from rest_framework.exceptions import ValidationError
 from datetime import timedelta
 from api.pagination import OptimizedPageNumberPagination, DailyReportPagination
 from django.core.cache import cache
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from datetime import datetime, timedelta
 from django.conf import settings
-from core.redis_config import safe_cache_get, safe_cache_set, safe_cache_delete
+from core.redis_config import safe_cache_get_or_set
+from core.cache_tags import report_date_tag, report_month_tags, REPORT_ALL_TAG, REPORT_DATES_TAG
+from core.cache_utils import cached_response, GLOBAL_SCOPE
+from core.cache_keys import REPORT_ENTRIES_DATE, REPORT_ENTRIES_RANGE, REPORT_ENTRY_DATES
 from core.permissions import IsSalesTeam
 
 def get_cache_timeout_for_date(date_param):
@@ -69,13 +70,8 @@ class ReportEntryViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-date')
 
     def perform_create(self, serializer):
+        # Report caches are invalidated by the ReportEntry post_save signal
         serializer.save(salesman=self.request.user)
-        # Invalidate report caches when new entry is created
-        safe_cache_delete('report_entry_dates')
-        # Clear date-specific caches for today
-        today = datetime.now().date().strftime('%Y-%m-%d')
-        safe_cache_delete(f'report_entries_date:{today}:salesman:all')
-        safe_cache_delete(f'report_entries_date:{today}:salesman:{self.request.user.username}')
 
 
 class AllReportEntriesView(generics.ListAPIView):
@@ -122,17 +118,13 @@ class AllReportEntriesView(generics.ListAPIView):
         
         # Only cache if timeout > 0
         if cache_timeout > 0:
-            cache_key = f"report_entries_date:{date_param}:salesman:{request.query_params.get('salesman_name', 'all')}"
-            cached_response = safe_cache_get(cache_key)
-            
-            if cached_response is not None:
-                return Response(cached_response)
-            
-            # Get the response and cache it
-            response = super().get(request, *args, **kwargs)
-            if response.status_code == 200:
-                safe_cache_set(cache_key, response.data, cache_timeout)
-            return response
+            cache_key = REPORT_ENTRIES_DATE.key(date_param, request.query_params.get('salesman_name', 'all'))
+            query_date = parse_date(date_param) if date_param else None
+            tags = [report_date_tag(query_date.isoformat())] if query_date else [REPORT_ALL_TAG]
+            data = safe_cache_get_or_set(
+                cache_key, lambda: self.list(request, *args, **kwargs).data, cache_timeout, tags=tags, swr=True
+            )
+            return Response(data)
         
         # No caching for current date
         if request.query_params.get('paginate') == 'true':
@@ -140,10 +132,10 @@ class AllReportEntriesView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
     
-@method_decorator(cache_page(60 * 15), name='get')  # Cache for 15 minutes
 class ReportEntryDatesView(APIView):
     permission_classes = [IsSalesTeam]
 
+    @cached_response(REPORT_ENTRY_DATES, 60 * 15, scope=GLOBAL_SCOPE, tags=[REPORT_DATES_TAG])  # 15 minutes
     def get(self, request):
         # Only include dates from active employees
         dates = list(
@@ -214,17 +206,14 @@ class ReportEntriesByDateView(generics.ListAPIView):
         # Only cache if timeout > 0
         if cache_timeout > 0:
             salesman_param = request.query_params.get("salesman_name", "all")
-            cache_key = f"report_entries_range:{start_date_param}:{end_date_param}:salesman:{salesman_param}"
-            cached_response = safe_cache_get(cache_key)
-            
-            if cached_response is not None:
-                return Response(cached_response)
-            
-            # Get the response and cache it
-            response = super().get(request, *args, **kwargs)
-            if response.status_code == 200:
-                safe_cache_set(cache_key, response.data, cache_timeout)
-            return response
+            cache_key = REPORT_ENTRIES_RANGE.key(start_date_param, end_date_param, salesman_param)
+            # Building the (lazy) queryset validates both dates before they are used for tags
+            self.get_queryset()
+            tags = report_month_tags(parse_date(start_date_param), parse_date(end_date_param))
+            data = safe_cache_get_or_set(
+                cache_key, lambda: self.list(request, *args, **kwargs).data, cache_timeout, tags=tags, swr=True
+            )
+            return Response(data)
         
         # No caching for current date ranges
         return super().get(request, *args, **kwargs)
\ No newline at end of file
@@ -2,16 +2,36 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics
-from vacation.models import VacationRequest
+from vacation.models import VacationRequest, VacationItem, LeaveLedgerEntry
 from vacation.serializers import VacationRequestSerializer
+from employee.models import EmployeeProfile
+from vacation.ledger import debit_leave, credit_leave, apply_ledger_changes, held_days
+from vacation.team_calendar import get_team_calendar, invalidate_team_calendar
+from vacation.summary import get_leave_summary
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
-from core.redis_config import safe_cache_delete
+from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.backends.postgresql.psycopg_any import DateRange
+from api.pagination import VacationRequestCursorPagination
+from core.redis_config import safe_cache_get, safe_cache_set
+from core.cache_tags import invalidate_tags, vacation_employee_tag, EMPLOYEES_TAG, VACATION_REQUESTS_TAG
+from core.cache_utils import cached_response, GLOBAL_SCOPE, USER_SCOPE
+from core.cache_keys import MY_VACATION_REQUESTS, VACATION_PENDING_COUNT, VACATION_REQUESTS
+from core.queryset_cache import invalidate_model_cache
 from django.conf import settings
-from core.permissions import require_roles, get_permission_message
+from core.permissions import require_roles, get_permission_message, ALL_MANAGEMENT
+from datetime import datetime
 
 
+def _date_param(params, name):
+    """Query parameter ``name`` as a date, None if absent or not YYYY-MM-DD; 400 for an impossible date."""
+    try:
+        return parse_date(params.get(name) or '')
+    except ValueError:
+        raise ValidationError(f"{name} is not a valid date")
+
 
 class VacationRequestCreateView(generics.CreateAPIView):
     serializer_class = VacationRequestSerializer
@@ -19,35 +39,64 @@ class VacationRequestCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         user_profile = self.request.user.profile
-        instance = serializer.save(employee=user_profile)
-
-        # Calculate total days from the instance
-        total_days = instance.get_total_days()
 
-        if total_days > user_profile.annual_leave_days:
-            raise ValidationError(f"You only have {user_profile.annual_leave_days} days left, but requested {total_days}.")
+        # The request and its deduction commit together; an insufficient
+        # balance rolls back the request as well
+        with transaction.atomic():
+            instance = serializer.save(employee=user_profile)
+            debit_leave(user_profile.pk, instance.get_total_days(), request=instance)
 
-        # Deduct days
-        user_profile.annual_leave_days -= total_days
-        user_profile.save()
-        
-        # Invalidate vacation-related caches
-        safe_cache_delete('vacation_requests')
-        safe_cache_delete(f'vacation_requests_user_{self.request.user.id}')
+            # Invalidate vacation-related caches with the balance ones on commit;
+            # the employee tag covers their leave summary
+            invalidate_team_calendar(instance)
+            invalidate_tags(VACATION_REQUESTS_TAG, vacation_employee_tag(user_profile.pk))
 
-@method_decorator(cache_page(settings.CACHE_TIMEOUTS['vacation_requests']), name='get')
 class VacationRequestListView(generics.ListAPIView):
-    queryset = VacationRequest.objects.all()
+    """
+    GET /api/vacations/[?status=pending[,approved]][&employee=<id|username>]
+                       [&start_date=YYYY-MM-DD][&end_date=YYYY-MM-DD]
+    Date filters keep requests with any item overlapping the window.
+
+    Optional cursor pagination: add ?paginate=true
+    """
     serializer_class = VacationRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None  # No pagination by default for backwards compatibility
+
+    def get_queryset(self):
+        qs = VacationRequest.objects.for_listing().order_by('-submitted_at', '-id')
+        params = self.request.query_params
+
+        status_param = params.get('status')
+        if status_param:
+            qs = qs.filter(status__in=status_param.split(','))
+
+        employee_param = params.get('employee')
+        if employee_param:
+            if employee_param.isdigit():
+                qs = qs.filter(employee_id=int(employee_param))
+            else:
+                qs = qs.filter(employee__user__username=employee_param)
+
+        start_date = _date_param(params, 'start_date')
+        end_date = _date_param(params, 'end_date')
+        if start_date or end_date:
+            # EXISTS rather than a join so multi-item requests are not returned twice
+            qs = qs.filter(Exists(VacationItem.objects.filter(
+                request=OuterRef('pk'),
+                date_range__overlap=DateRange(start_date, end_date, '[]'),
+            )))
+
+        return qs
     
+    # Only management can view all vacation requests; they all see the same data,
+    # so the cached entry is shared behind the role check
+    @require_roles(['MANAGER', 'ADMIN', 'DIRECTOR', 'CEO'], custom_message=get_permission_message('approve_vacation'))
+    @cached_response(VACATION_REQUESTS, settings.CACHE_TIMEOUTS['vacation_requests'], scope=GLOBAL_SCOPE,
+                     tags=[VACATION_REQUESTS_TAG, EMPLOYEES_TAG])
     def get(self, request, *args, **kwargs):
-        # Only management can view all vacation requests
-        if request.user.profile.role not in ['MANAGER', 'ADMIN', 'DIRECTOR', 'CEO']:
-            return Response(
-                {"detail": get_permission_message('approve_vacation')},
-                status=status.HTTP_403_FORBIDDEN
-            )
+        if request.query_params.get('paginate') == 'true':
+            self.pagination_class = VacationRequestCursorPagination
         return super().get(request, *args, **kwargs)
     
 class VacationRequestUpdateAPIView(generics.UpdateAPIView):
@@ -62,27 +111,215 @@ class VacationRequestUpdateAPIView(generics.UpdateAPIView):
 
         if new_status not in ['approved', 'rejected']:
             return Response({'detail': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if new_status == "rejected" and vacation_request.status != "rejected":
-            user_profile = vacation_request.employee
-            total_days = vacation_request.get_total_days()
-            user_profile.annual_leave_days += total_days
-            user_profile.save()
-
-        vacation_request.status = new_status
-        vacation_request.save()
-        
-        # Invalidate vacation-related caches
-        safe_cache_delete('vacation_requests')
-        safe_cache_delete(f'vacation_requests_user_{vacation_request.employee.user.id}')
+
+        with transaction.atomic():
+            # Lock the request so two reviewers cannot refund the same days twice
+            vacation_request = VacationRequest.objects.select_for_update().get(pk=vacation_request.pk)
+            old_status = vacation_request.status
+
+            if new_status == "rejected" and old_status != "rejected":
+                # Give back what was debited, not a recount under today's rules
+                refund = held_days([vacation_request])[vacation_request.pk]
+                credit_leave(vacation_request.employee_id, refund, request=vacation_request)
+            elif new_status != "rejected" and old_status == "rejected":
+                debit_leave(vacation_request.employee_id, vacation_request.get_total_days(), request=vacation_request)
+
+            vacation_request.status = new_status
+            vacation_request.save(update_fields=['status'])
+
+            # Invalidate vacation-related caches with the balance ones on commit;
+            # the employee tag covers their leave summary
+            invalidate_team_calendar(vacation_request)
+            invalidate_tags(VACATION_REQUESTS_TAG, vacation_employee_tag(vacation_request.employee_id))
 
         return Response(self.get_serializer(vacation_request).data, status=status.HTTP_200_OK)
+
+
+class VacationRequestBulkUpdateView(APIView):
+    """
+    POST /api/vacations/bulk-update/
+    Body: {"decisions": [{"id": 1, "status": "approved"}, {"id": 2, "status": "rejected"}]}
+       or {"ids": [1, 2, 3], "status": "approved"}
+
+    Applies every decision in one transaction: balance refunds (and re-debits
+    for reinstated rejections) are summed per employee and written in one
+    batch, and caches are invalidated once for the whole sweep.
+    """
+    permission_classes = [IsAuthenticated]
+    max_batch_size = 500
+
+    def _parse_decisions(self, data):
+        if 'decisions' in data:
+            decisions = {}
+            for decision in data.get('decisions') or []:
+                try:
+                    decisions[int(decision['id'])] = decision.get('status')
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    raise ValidationError("Each decision needs an integer id and a status")
+            return decisions
+
+        try:
+            ids = [int(pk) for pk in data.get('ids') or []]
+        except (TypeError, ValueError):
+            raise ValidationError("ids must be a list of integers")
+        return {pk: data.get('status') for pk in ids}
+
+    @require_roles(ALL_MANAGEMENT, custom_message=get_permission_message('approve_vacation'))
+    def post(self, request):
+        decisions = self._parse_decisions(request.data)
+        if not decisions:
+            raise ValidationError("No vacation requests given")
+        if len(decisions) > self.max_batch_size:
+            raise ValidationError(f"At most {self.max_batch_size} requests can be updated at once")
+        if any(new_status not in ['approved', 'rejected'] for new_status in decisions.values()):
+            return Response({'detail': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Lock in primary-key order so overlapping sweeps cannot deadlock
+            locked = {
+                vacation_request.pk: vacation_request
+                for vacation_request in VacationRequest.objects.select_for_update()
+                .filter(pk__in=decisions)
+                .order_by('pk')
+                .only('id', 'status', 'employee_id')
+            }
+            missing = sorted(set(decisions) - set(locked))
+            if missing:
+                return Response(
+                    {'detail': 'Vacation requests not found', 'missing_ids': missing},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            changed = {pk: new_status for pk, new_status in decisions.items() if locked[pk].status != new_status}
+            balance_moves = [
+                pk for pk, new_status in changed.items()
+                if (new_status == 'rejected') != (locked[pk].status == 'rejected')
+            ]
+            # Every affected request with its items in one prefetch
+            moving = list(
+                VacationRequest.objects.filter(pk__in=balance_moves).prefetch_related('date_items')
+            ) if balance_moves else []
+            # Refunds give back what each request's ledger entries took; re-debits use today's rules
+            refunds = held_days(
+                [vacation_request for vacation_request in moving if changed[vacation_request.pk] == 'rejected']
+            )
+
+            ledger_changes = []
+            for vacation_request in moving:
+                if changed[vacation_request.pk] == 'rejected':
+                    ledger_changes.append((
+                        vacation_request.employee_id, refunds[vacation_request.pk],
+                        LeaveLedgerEntry.REFUND, vacation_request,
+                    ))
+                else:
+                    ledger_changes.append((
+                        vacation_request.employee_id, -vacation_request.get_total_days(),
+                        LeaveLedgerEntry.DEBIT, vacation_request,
+                    ))
+            apply_ledger_changes(ledger_changes, check_balance=True)
+
+            for new_status in set(changed.values()):
+                VacationRequest.objects.filter(
+                    pk__in=[pk for pk, decided in changed.items() if decided == new_status]
+                ).update(status=new_status)
+
+            if changed:
+                changed_requests = [locked[pk] for pk in changed]
+
+                # Invalidate vacation-related caches once for the whole batch, flushed on commit
+                invalidate_team_calendar(*changed_requests)
+                invalidate_model_cache(VacationRequest)
+                invalidate_tags(
+                    VACATION_REQUESTS_TAG,
+                    *{vacation_employee_tag(vacation_request.employee_id) for vacation_request in changed_requests}
+                )
+
+        return Response({
+            'updated': sorted(changed),
+            'unchanged': sorted(set(decisions) - set(changed)),
+        }, status=status.HTTP_200_OK)
+
     
-@method_decorator(cache_page(settings.CACHE_TIMEOUTS['vacation_requests']), name='get')
 class MyVacationRequestListView(generics.ListAPIView):
     serializer_class = VacationRequestSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user_profile = self.request.user.profile
-        return VacationRequest.objects.filter(employee=user_profile)
+        return VacationRequest.objects.filter(employee=user_profile).for_listing()
+
+    @cached_response(MY_VACATION_REQUESTS, settings.CACHE_TIMEOUTS['vacation_requests'], scope=USER_SCOPE,
+                     tags=[lambda request: vacation_employee_tag(request.user.profile.pk)])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class VacationPendingCountView(APIView):
+    """GET /api/vacations/pending-count/ - number of requests awaiting approval, for badges."""
+    permission_classes = [IsAuthenticated]
+
+    @require_roles(ALL_MANAGEMENT, custom_message=get_permission_message('approve_vacation'))
+    def get(self, request):
+        pending = safe_cache_get(VACATION_PENDING_COUNT.key())
+        if pending is None:
+            # Served by the (status, submitted_at) index
+            pending = VacationRequest.objects.filter(status='pending').count()
+            safe_cache_set(
+                VACATION_PENDING_COUNT.key(), pending, settings.CACHE_TIMEOUTS['vacation_pending_count'],
+                tags=[VACATION_REQUESTS_TAG]
+            )
+        return Response({'pending': pending})
+
+
+class TeamLeaveCalendarView(APIView):
+    """
+    GET /api/vacations/calendar/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    Returns one entry per day in the window listing who is on (non-rejected) leave.
+    """
+    permission_classes = [IsAuthenticated]
+    max_window_days = 366
+
+    @require_roles(ALL_MANAGEMENT, custom_message=get_permission_message('approve_vacation'))
+    def get(self, request):
+        start_date = _date_param(request.query_params, 'start_date')
+        end_date = _date_param(request.query_params, 'end_date')
+
+        if not start_date or not end_date:
+            raise ValidationError("start_date and end_date are required in YYYY-MM-DD format")
+        if start_date > end_date:
+            raise ValidationError("start_date must be before or equal to end_date")
+        if (end_date - start_date).days >= self.max_window_days:
+            raise ValidationError(f"Date range cannot exceed {self.max_window_days} days")
+
+        return Response(get_team_calendar(start_date, end_date))
+
+
+class LeaveSummaryView(APIView):
+    """
+    GET /api/vacations/summary/me/[?year=YYYY]
+    GET /api/vacations/summary/<profile id>/[?year=YYYY]
+    Used, pending and remaining leave by leave type for one year (defaults to the current year).
+    Employees can view their own summary; managers and above can view anyone's.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk=None):
+        year_param = request.query_params.get('year')
+        if year_param and not (year_param.isdigit() and 1 <= int(year_param) <= 9999):
+            raise ValidationError("year must be between 1 and 9999")
+        year = int(year_param) if year_param else datetime.now().year
+
+        if pk is None:
+            profile = request.user.profile
+        else:
+            try:
+                profile = EmployeeProfile.objects.select_related('user').get(pk=pk)
+            except EmployeeProfile.DoesNotExist:
+                return Response({"detail": "Employee profile not found."}, status=status.HTTP_404_NOT_FOUND)
+            if profile.user_id != request.user.id and request.user.profile.role not in ALL_MANAGEMENT:
+                return Response(
+                    {"detail": get_permission_message('not_owner')},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+        return Response(get_leave_summary(profile, year))
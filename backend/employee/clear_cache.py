@@ -1,5 +1,10 @@
 #!/usr/bin/env python
-"""Script to clear Redis cache"""
+"""
+Script to clear Redis cache.
+
+    python clear_cache.py                      # everything
+    python clear_cache.py user_profile ...     # only these key families (core.cache_keys), every version
+"""
 
 import os
 import django
@@ -13,13 +18,15 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
 from django.core.cache import cache
-from core.redis_config import get_redis_connection
+from core.redis_config import get_redis_client
+from core.cache_keys import families
+from core.keyspace import KeyspaceAnalyzer
 
 def clear_all_cache():
     """Clear all Redis cache entries"""
     try:
         # Try to get Redis connection
-        redis_conn = get_redis_connection()
+        redis_conn = get_redis_client()
         if redis_conn:
             # Clear all keys
             redis_conn.flushdb()
@@ -33,9 +40,26 @@ def clear_all_cache():
         return False
     return True
 
+def clear_families(names):
+    """Clear the keys of the given key families with SCAN + UNLINK"""
+    registered = families()
+    unknown = [name for name in names if name not in registered]
+    if unknown:
+        print(f"✗ Unknown key families: {', '.join(unknown)} (known: {', '.join(sorted(registered))})")
+        return False
+    redis_conn = get_redis_client()
+    if not redis_conn:
+        print("✗ Redis client unavailable")
+        return False
+    for name in names:
+        deleted, _ = KeyspaceAnalyzer(redis_conn, match=registered[name].match()).delete_matching()
+        print(f"✓ Cleared {deleted} {name} keys")
+    return True
+
 if __name__ == "__main__":
-    print("Clearing Redis cache...")
-    if clear_all_cache():
+    names = sys.argv[1:]
+    print(f"Clearing {', '.join(names)} cache keys..." if names else "Clearing Redis cache...")
+    if clear_families(names) if names else clear_all_cache():
         print("Cache cleared successfully!")
     else:
         print("Failed to clear cache!")
\ No newline at end of file
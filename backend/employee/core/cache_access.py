@@ -0,0 +1,166 @@
+"""
+Access-driven cache warming support.
+
+``safe_cache_get`` reports every lookup here. A random sample of them
+(``CACHE_ACCESS_TRACKING['SAMPLE_RATE']``) is counted in-process, like
+``core.cache_metrics``, and flushed to Redis at most every ``FLUSH_INTERVAL``
+seconds as one pipelined batch, into daily buckets:
+
+- ``cache_access:families:<day>``: hash of ``<family>:hits`` / ``<family>:misses``
+- ``cache_access:misses:<day>``: sorted set of missed keys scored by miss count,
+  trimmed to the ``MAX_TRACKED_KEYS`` most missed
+
+Key families register a *rebuilder* that recomputes one of their keys from the
+key alone; the warmer asks for the most-missed keys over the last
+``WINDOW_DAYS`` days and pre-populates those it can rebuild.
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.circuit_breaker import get_redis_breaker
+from core.keyspace import key_family
+
+logger = logging.getLogger(__name__)
+
+_rebuilders = {}
+
+_lock = threading.Lock()
+_family_counts = Counter()  # (family, 'hits' | 'misses') -> sampled lookups
+_missed_keys = Counter()    # key -> sampled misses
+_last_flush = time.monotonic()
+
+
+def _options():
+    return getattr(settings, 'CACHE_ACCESS_TRACKING', {})
+
+
+def register_rebuilder(family):
+    """
+    Decorator registering ``func(key)`` as the rebuilder of a key family. It
+    returns the ``(key, value, timeout, tags)`` entry to write, or None if the
+    key cannot or should not be rebuilt.
+    """
+    def decorator(func):
+        _rebuilders[family] = func
+        return func
+    return decorator
+
+
+def get_rebuilder(key):
+    return _rebuilders.get(key_family(key))
+
+
+def _day_keys(kind, days):
+    today = date.today()
+    return [cache.make_key(f'cache_access:{kind}:{today - timedelta(days=offset)}') for offset in range(days)]
+
+
+def record_access(key, hit):
+    """Sample one cache lookup into this process's access counters; no Redis call."""
+    options = _options()
+    if not options.get('ENABLED', True) or random.random() >= options.get('SAMPLE_RATE', 0.1):
+        return
+
+    with _lock:
+        _family_counts[(key_family(key), 'hits' if hit else 'misses')] += 1
+        # Bounded per process; keys first missed once the table is full wait for the next interval
+        if not hit and (key in _missed_keys or len(_missed_keys) < options.get('MAX_TRACKED_KEYS', 2000)):
+            _missed_keys[key] += 1
+        due = time.monotonic() - _last_flush >= options.get('FLUSH_INTERVAL', 10)
+    if due:
+        flush_access_counts()
+
+
+def flush_access_counts():
+    """Add the counts sampled since the last flush to today's buckets in one pipeline."""
+    global _family_counts, _missed_keys, _last_flush
+    with _lock:
+        family_counts, missed_keys = _family_counts, _missed_keys
+        _family_counts, _missed_keys = Counter(), Counter()
+        _last_flush = time.monotonic()
+    if not family_counts:
+        return
+
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        return
+    try:
+        from django_redis import get_redis_connection
+        client = get_redis_connection('default')
+        options = _options()
+        ttl = (options.get('WINDOW_DAYS', 3) + 1) * 86400
+        families_key, = _day_keys('families', 1)
+        pipe = client.pipeline(transaction=False)
+        for (family, kind), count in family_counts.items():
+            pipe.hincrby(families_key, f'{family}:{kind}', count)
+        pipe.expire(families_key, ttl)
+        if missed_keys:
+            misses_key, = _day_keys('misses', 1)
+            for key, count in missed_keys.items():
+                pipe.zincrby(misses_key, count, key)
+            pipe.zremrangebyrank(misses_key, 0, -(options.get('MAX_TRACKED_KEYS', 2000) + 1))
+            pipe.expire(misses_key, ttl)
+        pipe.execute()
+        breaker.record_success()
+    except Exception as e:
+        # Best effort, like the metrics: drop this interval rather than retry
+        breaker.record_error(e)
+        logger.debug(f"Failed to flush cache access counts: {e}")
+
+
+def top_missed_keys(limit=None, days=None):
+    """Most-missed keys over the window that have a rebuilder, most missed first."""
+    from django_redis import get_redis_connection
+
+    flush_access_counts()
+    options = _options()
+    limit = limit or options.get('WARM_TOP_N', 50)
+    days = days or options.get('WINDOW_DAYS', 3)
+    client = get_redis_connection('default')
+    scored = client.zunion(_day_keys('misses', days), withscores=True)
+
+    keys = []
+    for member, _ in reversed(scored):
+        key = member.decode() if isinstance(member, bytes) else member
+        if get_rebuilder(key) is not None:
+            keys.append(key)
+            if len(keys) >= limit:
+                break
+    return keys
+
+
+def family_access_stats(days=None):
+    """Sampled hits/misses per key family over the window."""
+    from django_redis import get_redis_connection
+
+    flush_access_counts()
+    options = _options()
+    days = days or options.get('WINDOW_DAYS', 3)
+    client = get_redis_connection('default')
+    pipe = client.pipeline(transaction=False)
+    for day_key in _day_keys('families', days):
+        pipe.hgetall(day_key)
+
+    counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    for day in pipe.execute():
+        for field, value in day.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            family, _, kind = field.rpartition(':')
+            counts[family][kind] += int(value)
+
+    stats = {}
+    for family, family_counts in sorted(counts.items(), key=lambda item: -item[1]['misses']):
+        total = family_counts['hits'] + family_counts['misses']
+        stats[family] = {
+            **family_counts,
+            'hit_ratio': round(family_counts['hits'] / total * 100, 2) if total else 0,
+        }
+    return {'sample_rate': options.get('SAMPLE_RATE', 0.1), 'window_days': days, 'families': stats}
@@ -0,0 +1,150 @@
+"""
+Cache key schema: the one place application cache keys are spelled out.
+
+Every key is ``<family>:v<version>:<part>:<part>...``. ``core.keyspace.key_family``
+still reads the family from the first segment, so metrics, access tracking and
+the L1 family list are unaffected by versions. Bumping a family's ``version``
+makes every existing key of it unreachable at once - no SCAN or tag
+invalidation needed; the old entries simply age out on their TTL.
+
+Each family also states the payload stored under it: ``format`` is ``plain``
+(the value as is, ``safe_cache_get`` / ``safe_cache_set``) or ``envelope``
+(``safe_cache_get_or_set``'s envelope around the value), and ``payload``
+describes the value. Views, warming and rebuilders must all write that
+payload; change its shape only together with a version bump.
+
+Bookkeeping keys (``tag:``, ``cache_access:``, ``cache_metrics:``, ``<key>:lock``)
+are owned by their modules and are not families here.
+"""
+
+from django.conf import settings
+
+PLAIN = 'plain'
+ENVELOPE = 'envelope'
+
+_registry = {}
+
+
+class KeyFamily:
+    def __init__(self, name, version, parts, payload, format=PLAIN):
+        self.name = name
+        self.version = version
+        self.parts = tuple(parts)
+        self.payload = payload
+        self.format = format
+
+    def key(self, *values):
+        """Current-version key from one value per part (the last part may contain ``:``)."""
+        if len(values) != len(self.parts):
+            raise ValueError(f"{self.name} keys take {self.parts}, got {values!r}")
+        return ':'.join([self.name, f'v{self.version}', *(str(value) for value in values)])
+
+    def parse(self, key):
+        """Part values of a current-version key of this family, or None for any other key."""
+        segments = key.split(':', len(self.parts) + 1)
+        if segments[:2] != [self.name, f'v{self.version}'] or len(segments) != len(self.parts) + 2:
+            return None
+        return dict(zip(self.parts, segments[2:]))
+
+    def match(self, all_versions=True):
+        """SCAN pattern of this family's full keys (with the cache KEY_PREFIX and version)."""
+        prefix = f"{settings.CACHES['default'].get('KEY_PREFIX', '')}:*:{self.name}:"
+        if all_versions:
+            return f'{prefix}*'
+        return f"{prefix}v{self.version}{':*' if self.parts else ''}"
+
+    def entry(self, key, value, timeout, tags=(), swr=False):
+        """
+        ``(key, stored value, redis timeout, tags)`` for ``safe_cache_set_many``,
+        with ``value`` wrapped the way readers of this family expect.
+        """
+        if self.parse(key) is None:
+            raise ValueError(f"{key} is not a current {self.name} key")
+        if self.format == ENVELOPE:
+            from core.redis_config import make_envelope
+            value, timeout = make_envelope(value, timeout, swr=swr)
+        return key, value, timeout, list(tags)
+
+    def describe(self):
+        return {'version': self.version, 'parts': list(self.parts), 'format': self.format, 'payload': self.payload}
+
+
+def register(name, version, parts, payload, format=PLAIN):
+    if name in _registry:
+        raise ValueError(f"Cache key family {name} is already registered")
+    _registry[name] = KeyFamily(name, version, parts, payload, format)
+    return _registry[name]
+
+
+def get_family(name):
+    return _registry.get(name)
+
+
+def families():
+    """Registered families by name."""
+    return dict(_registry)
+
+
+def schema_version(key):
+    """``(family, version segment)`` of a key, prefixed or not; version is None for unversioned keys."""
+    from core.keyspace import key_family
+
+    if isinstance(key, bytes):
+        key = key.decode('utf-8', errors='replace')
+    family = key_family(key)
+    _, _, rest = key.partition(f'{family}:')
+    version = rest.split(':', 1)[0]
+    return family, version if version[:1] == 'v' and version[1:].isdigit() else None
+
+
+# Views keyed by ``core.cache_utils.cached_response``: <scope>:<query digest or ->
+RESPONSE_PARTS = ('scope', 'query')
+
+USER_PROFILE = register(
+    'user_profile', 1, ('user_id',),
+    'ProtectedView dict: username, firstname, lastname, email, role, annual_leave_days',
+)
+USER_SALARY = register(
+    'user_salary', 1, RESPONSE_PARTS,
+    'GetOwnSalaryView data: base_salary, bonus_payment, transportation_allowance, is_mpf_exempt',
+    ENVELOPE,
+)
+EMPLOYEE_SALARIES = register(
+    'employee_salaries', 1, RESPONSE_PARTS, 'GetAllEmployeeSalary data: list of EmployeeProfileSerializer dicts',
+    ENVELOPE,
+)
+REPORT_ENTRY_DATES = register(
+    'report_entry_dates', 1, RESPONSE_PARTS, 'ReportEntryDatesView data: list of dates with entries', ENVELOPE,
+)
+VACATION_REQUESTS = register(
+    'vacation_requests', 1, RESPONSE_PARTS,
+    'VacationRequestListView data: paginated VacationRequestSerializer dicts', ENVELOPE,
+)
+MY_VACATION_REQUESTS = register(
+    'my_vacation_requests', 1, RESPONSE_PARTS,
+    "MyVacationRequestListView data: the user's VacationRequestSerializer dicts", ENVELOPE,
+)
+REPORT_ENTRIES_DATE = register(
+    'report_entries_date', 1, ('date', 'salesman'),
+    'AllReportEntriesView data: list of ReportEntrySerializer dicts for one date (every date when date is None)',
+    ENVELOPE,
+)
+REPORT_ENTRIES_RANGE = register(
+    'report_entries_range', 1, ('start', 'end', 'salesman'),
+    'ReportEntriesByDateView data: list of ReportEntrySerializer dicts', ENVELOPE,
+)
+DASHBOARD_REPORT_ENTRIES_RANGE = register(
+    'dashboard_report_entries_range', 1, ('start', 'end'),
+    'DashboardReportEntriesByDateView data: list of ReportEntrySerializer dicts', ENVELOPE,
+)
+VACATION_PENDING_COUNT = register('vacation_pending_count', 1, (), 'int: pending vacation requests')
+VACATION_SUMMARY = register(
+    'vacation_summary', 1, ('profile_id', 'year'),
+    'dict: leave type -> {approved, pending, rejected} days in the year (vacation.summary)',
+)
+VACATION_CALENDAR = register(
+    'vacation_calendar', 1, ('month',), 'dict: ISO date -> list of absence dicts for one YYYY-MM month',
+)
+QUERYSET = register(
+    'queryset', 1, ('model', 'digest'), 'list of model instances (core.queryset_cache)', ENVELOPE,
+)
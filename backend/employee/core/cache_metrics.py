@@ -0,0 +1,168 @@
+"""
+Per-key-family cache metrics.
+
+The cache helpers report every operation (get / set / delete / compute) with
+its outcome and latency. Counts and a latency histogram are aggregated
+in-process per key family (see ``core.keyspace.key_family``) and flushed to
+Redis at most every ``CACHE_METRICS['FLUSH_INTERVAL']`` seconds, as one
+pipelined ``HINCRBY`` batch into a hash per family:
+
+    cache_metrics:<family>   {'get:hit': 812, 'get:miss': 40, 'get:le:5': 790, 'get:total_ms': 1532.4, ...}
+
+Unlike Redis's global keyspace_hits/misses this separates application key
+families from each other and from session traffic.
+"""
+
+from collections import defaultdict
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.circuit_breaker import get_redis_breaker
+from core.keyspace import key_family
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+_lock = threading.Lock()
+_pending = defaultdict(lambda: defaultdict(float))
+_last_flush = time.monotonic()
+
+
+def _options():
+    return getattr(settings, 'CACHE_METRICS', {})
+
+
+def _buckets():
+    return tuple(_options().get('LATENCY_BUCKETS_MS', DEFAULT_BUCKETS_MS))
+
+
+def _bucket_label(buckets, elapsed_ms):
+    index = bisect.bisect_left(buckets, elapsed_ms)
+    return str(buckets[index]) if index < len(buckets) else 'inf'
+
+
+def record_cache_op(key, operation, outcome, started):
+    """
+    Count one cache operation on ``key``. ``started`` is its ``time.perf_counter()``
+    start; ``outcome`` is e.g. hit / miss / l1_hit / degraded_hit / stale / ok / error / skipped.
+    """
+    options = _options()
+    if not options.get('ENABLED', True):
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    family = key_family(key)
+    with _lock:
+        counters = _pending[family]
+        counters[f'{operation}:{outcome}'] += 1
+        counters[f'{operation}:le:{_bucket_label(_buckets(), elapsed_ms)}'] += 1
+        counters[f'{operation}:total_ms'] += elapsed_ms
+        due = time.monotonic() - _last_flush >= options.get('FLUSH_INTERVAL', 10)
+    if due:
+        flush_metrics()
+
+
+def flush_metrics():
+    """Write the counters aggregated since the last flush to Redis in one pipeline."""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, defaultdict(lambda: defaultdict(float))
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        return
+    try:
+        from django_redis import get_redis_connection
+        client = get_redis_connection('default')
+        ttl = _options().get('RETENTION', 7 * 86400)
+        pipe = client.pipeline(transaction=False)
+        pipe.sadd(cache.make_key('cache_metrics:families'), *pending)
+        pipe.expire(cache.make_key('cache_metrics:families'), ttl)
+        for family, counters in pending.items():
+            metrics_key = cache.make_key(f'cache_metrics:{family}')
+            for field, amount in counters.items():
+                if field.endswith(':total_ms'):
+                    pipe.hincrbyfloat(metrics_key, field, round(amount, 3))
+                else:
+                    pipe.hincrby(metrics_key, field, int(amount))
+            pipe.expire(metrics_key, ttl)
+        pipe.execute()
+        breaker.record_success()
+    except Exception as e:
+        # Metrics are best effort: drop this interval rather than retry
+        breaker.record_error(e)
+        logger.debug(f"Failed to flush cache metrics: {e}")
+
+
+def _percentile(histogram, total, fraction):
+    """Upper bound of the histogram bucket holding the given fraction of operations."""
+    running = 0
+    for label, count in histogram:
+        running += count
+        if running >= total * fraction:
+            return label
+    return None
+
+
+def _summarize(fields, buckets):
+    operations = defaultdict(lambda: {'outcomes': {}, 'histogram': {}, 'total_ms': 0.0})
+    for field, value in fields.items():
+        operation, _, rest = field.partition(':')
+        if rest == 'total_ms':
+            operations[operation]['total_ms'] = float(value)
+        elif rest.startswith('le:'):
+            operations[operation]['histogram'][rest[3:]] = int(float(value))
+        else:
+            operations[operation]['outcomes'][rest] = int(float(value))
+
+    summary = {}
+    labels = [str(bound) for bound in buckets] + ['inf']
+    for operation, data in operations.items():
+        histogram = [(label, data['histogram'].get(label, 0)) for label in labels]
+        count = sum(count for _, count in histogram)
+        entry = {
+            **data['outcomes'],
+            'count': count,
+            'avg_ms': round(data['total_ms'] / count, 3) if count else 0,
+            'p50_le_ms': _percentile(histogram, count, 0.5),
+            'p95_le_ms': _percentile(histogram, count, 0.95),
+            'latency_histogram_ms': {label: count for label, count in histogram if count},
+        }
+        if operation == 'get':
+            hits = entry.get('hit', 0) + entry.get('l1_hit', 0) + entry.get('degraded_hit', 0)
+            lookups = hits + entry.get('miss', 0)
+            entry['hit_ratio'] = round(hits / lookups * 100, 2) if lookups else 0
+        summary[operation] = entry
+    return summary
+
+
+def get_family_metrics():
+    """Flushed metrics of every key family, all processes combined."""
+    from django_redis import get_redis_connection
+
+    flush_metrics()
+    client = get_redis_connection('default')
+    families = sorted(
+        member.decode() if isinstance(member, bytes) else member
+        for member in client.smembers(cache.make_key('cache_metrics:families'))
+    )
+    pipe = client.pipeline(transaction=False)
+    for family in families:
+        pipe.hgetall(cache.make_key(f'cache_metrics:{family}'))
+
+    buckets = _buckets()
+    metrics = {}
+    for family, fields in zip(families, pipe.execute()):
+        fields = {
+            (field.decode() if isinstance(field, bytes) else field): value for field, value in fields.items()
+        }
+        metrics[family] = _summarize(fields, buckets)
+    return metrics
@@ -1,5 +1,12 @@
 from django.core.cache import cache
 from core.redis_config import get_redis_client
+from core.circuit_breaker import get_redis_breaker
+from core.degraded_cache import degraded_stats
+from core.keyspace import KeyspaceAnalyzer
+from core.cache_keys import families, schema_version
+from core.cache_access import family_access_stats
+from core.cache_metrics import get_family_metrics
+from collections import defaultdict
 from datetime import datetime, timedelta
 import logging
 import json
@@ -19,6 +26,7 @@ class RedisMonitor:
         
         try:
             info = self.redis_client.info()
+            get_redis_breaker().record_success()
             
             stats = {
                 'status': 'healthy',
@@ -54,36 +62,79 @@ class RedisMonitor:
             return stats
             
         except Exception as e:
+            get_redis_breaker().record_error(e)
             logger.error(f"Failed to get Redis stats: {e}")
             return {'status': 'error', 'error': str(e)}
     
     def get_cache_key_patterns(self):
-        """Get cache key usage patterns"""
+        """Get cache key counts per key family (SCAN-based, never KEYS)"""
         if not self.redis_client:
             return {}
         
         try:
-            patterns = {}
-            
-            # Count keys by pattern
-            key_patterns = [
-                'lafarge_cache:user_profile_*',
-                'lafarge_cache:user_salary_*', 
-                'lafarge_cache:employee_salaries',
-                'lafarge_cache:report_entries_*',
-                'lafarge_cache:vacation_requests*',
-            ]
-            
-            for pattern in key_patterns:
-                keys = self.redis_client.keys(pattern)
-                pattern_name = pattern.replace('lafarge_cache:', '').replace('*', 'X')
-                patterns[pattern_name] = len(keys)
-            
-            return patterns
-            
+            return KeyspaceAnalyzer(self.redis_client).count_families()
         except Exception as e:
+            get_redis_breaker().record_error(e)
             logger.error(f"Failed to get key patterns: {e}")
             return {}
+
+    def get_key_schema(self):
+        """Registered key families (version, payload format) and their key counts per version (SCAN-based)"""
+        schema = {name: {**family.describe(), 'keys_by_version': {}} for name, family in families().items()}
+        if not self.redis_client:
+            return schema
+
+        try:
+            counts = defaultdict(int)
+            for keys, _ in KeyspaceAnalyzer(self.redis_client).iter_batches():
+                for key in keys:
+                    counts[schema_version(key)] += 1
+        except Exception as e:
+            get_redis_breaker().record_error(e)
+            logger.error(f"Failed to count keys per schema version: {e}")
+            return schema
+
+        for (family, version), count in counts.items():
+            if family in schema:
+                # Keys of other versions are outdated and only wait for their TTL
+                schema[family]['keys_by_version'][version or 'unversioned'] = count
+        return schema
+
+    def analyze_keyspace(self, **options):
+        """Sampled per-family key count, memory, TTL distribution and largest keys"""
+        if not self.redis_client:
+            return {'status': 'disconnected', 'error': 'Redis client unavailable'}
+
+        try:
+            return KeyspaceAnalyzer(self.redis_client, **options).analyze()
+        except Exception as e:
+            get_redis_breaker().record_error(e)
+            logger.error(f"Keyspace analysis failed: {e}")
+            return {'status': 'error', 'error': str(e)}
+    
+    def get_access_stats(self):
+        """Sampled hits/misses per key family recorded by the cache helpers"""
+        if not self.redis_client:
+            return {'status': 'disconnected', 'error': 'Redis client unavailable'}
+
+        try:
+            return family_access_stats()
+        except Exception as e:
+            get_redis_breaker().record_error(e)
+            logger.error(f"Failed to get cache access stats: {e}")
+            return {'status': 'error', 'error': str(e)}
+    
+    def get_family_metrics(self):
+        """Application-side hit/miss/error counts and latency per key family"""
+        if not self.redis_client:
+            return {'status': 'disconnected', 'error': 'Redis client unavailable'}
+
+        try:
+            return get_family_metrics()
+        except Exception as e:
+            get_redis_breaker().record_error(e)
+            logger.error(f"Failed to get cache family metrics: {e}")
+            return {'status': 'error', 'error': str(e)}
     
     def test_cache_performance(self):
         """Test cache read/write performance"""
@@ -122,8 +173,11 @@ class RedisMonitor:
         """Get complete monitoring summary"""
         return {
             'timestamp': datetime.now().isoformat(),
+            'circuit_breaker': get_redis_breaker().snapshot(),
+            'degraded_cache': degraded_stats(),
             'cache_stats': self.get_cache_stats(),
             'key_patterns': self.get_cache_key_patterns(),
+            'key_schema': self.get_key_schema(),
             'performance_test': self.test_cache_performance()
         }
 
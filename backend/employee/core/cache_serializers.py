@@ -0,0 +1,136 @@
+"""
+Serializer and compressor for django-redis (``CACHES['default']['OPTIONS']``).
+
+``MsgpackSerializer`` encodes values with msgpack, which is smaller and faster
+than pickle for the dicts and lists the views cache. Anything msgpack has no
+native type for (dates, Decimals, tuples, sets...) is embedded as a pickle
+extension, so every value still round-trips exactly. Encoded values start
+with a byte msgpack never emits, so values pickled before the switch are
+still readable.
+
+``ThresholdCompressor`` leaves small values alone and compresses the rest with
+lz4, zstd or zlib. A one-byte header records what was done, and values from
+django-redis's ``ZlibCompressor`` are still decompressed.
+
+msgpack, lz4 and zstandard are optional: without them the serializer falls
+back to pickle and the compressor to zlib. Use ``manage.py cache_benchmark``
+to compare the options on real payloads.
+"""
+
+import logging
+import pickle
+import zlib
+
+from django_redis.compressors.base import BaseCompressor
+from django_redis.exceptions import CompressorError
+from django_redis.serializers.base import BaseSerializer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 0xc1 is reserved and never used by msgpack, and pickle streams start with 0x80
+_MSGPACK_MARKER = b'\xc1'
+_PICKLE_EXT = 1
+
+
+class MsgpackSerializer(BaseSerializer):
+    def __init__(self, options):
+        super().__init__(options=options)
+        self._protocol = options.get('PICKLE_VERSION', pickle.DEFAULT_PROTOCOL)
+        if msgpack is None:
+            logger.warning("msgpack is not installed, cache values will be pickled")
+
+    def _default(self, obj):
+        # strict_types sends subclasses here too: plain dicts and lists stay native
+        if isinstance(obj, dict):
+            return dict(obj)
+        if isinstance(obj, list):
+            return list(obj)
+        return msgpack.ExtType(_PICKLE_EXT, pickle.dumps(obj, self._protocol))
+
+    def _ext_hook(self, code, data):
+        if code == _PICKLE_EXT:
+            return pickle.loads(data)
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value):
+        if msgpack is not None:
+            try:
+                return _MSGPACK_MARKER + msgpack.packb(
+                    value, default=self._default, strict_types=True, use_bin_type=True
+                )
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return pickle.dumps(value, self._protocol)
+
+    def loads(self, value):
+        if value[:1] == _MSGPACK_MARKER:
+            if msgpack is None:
+                raise ValueError("Cached value is msgpack-encoded but msgpack is not installed")
+            return msgpack.unpackb(value[1:], ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+        return pickle.loads(value)
+
+
+def available_codecs():
+    """Available compression algorithms: name -> (header byte, compress, decompress)."""
+    codecs = {'zlib': (b'\x01', lambda data: zlib.compress(data, 6), zlib.decompress)}
+    if lz4_frame is not None:
+        codecs['lz4'] = (b'\x02', lz4_frame.compress, lz4_frame.decompress)
+    if zstandard is not None:
+        codecs['zstd'] = (b'\x03', lambda data: zstandard.compress(data, 3), zstandard.decompress)
+    return codecs
+
+
+_RAW = b'\x00'
+
+
+class ThresholdCompressor(BaseCompressor):
+    """
+    Compress only values of at least ``COMPRESS_MIN_LENGTH`` bytes, with
+    ``COMPRESS_ALGORITHM`` (``lz4``, ``zstd`` or ``zlib``).
+    """
+
+    def __init__(self, options):
+        super().__init__(options=options)
+        self.min_length = options.get('COMPRESS_MIN_LENGTH', 1024)
+        codecs = available_codecs()
+        algorithm = options.get('COMPRESS_ALGORITHM', 'lz4')
+        if algorithm not in codecs:
+            logger.warning(f"Cache compression '{algorithm}' is not available, using zlib")
+            algorithm = 'zlib'
+        self.algorithm = algorithm
+        self._header, self._compress, _ = codecs[algorithm]
+        self._decompressors = {header: decompress for header, _, decompress in codecs.values()}
+
+    def compress(self, value):
+        if len(value) < self.min_length:
+            return _RAW + value
+        return self._header + self._compress(value)
+
+    def decompress(self, value):
+        header = value[:1]
+        if header == _RAW:
+            return value[1:]
+        decompress = self._decompressors.get(header)
+        try:
+            if decompress is not None:
+                return decompress(value[1:])
+            # Written by django-redis's ZlibCompressor before the switch
+            return zlib.decompress(value)
+        except Exception as e:
+            # Not compressed (e.g. a small legacy value): django-redis then uses it as is
+            raise CompressorError(e)
@@ -0,0 +1,280 @@
+"""
+Tag-based cache invalidation.
+
+A cache write can declare tags (``report:date:2025-03-01``, ``user:42``...).
+Each tag is a Redis sorted set holding the full keys written under it, scored
+by their expiry, so ``invalidate_tags()`` deletes every associated key - and
+the tag sets themselves - with one Lua script call. Callers never need to know
+key shapes and Redis never has to walk the keyspace.
+
+A tag set that is evicted while its members survive would leave them
+impossible to invalidate. Tag sets therefore have no TTL, and Redis must run
+with a ``volatile-*`` eviction policy (``docker-compose.yml``) so only keys
+with a TTL - the cached values, which always have one - are evicted. Writes
+prune the members that have expired from the sets they touch.
+
+Inside a transaction, ``invalidate_tags()`` and ``invalidate_keys()`` only
+collect: the deduplicated tags and keys of the whole transaction, nested
+``atomic()`` blocks included, are flushed in a single script call by one
+``transaction.on_commit`` callback, so a transaction saving many rows costs
+one round trip and a rolled-back one evicts nothing.
+
+Tag names are built with the helpers below rather than by hand.
+"""
+
+from datetime import date, timedelta
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from core.circuit_breaker import REDIS_OUTAGE_ERRORS, get_redis_breaker
+from core.degraded_cache import discard, remember_invalidation
+from core.local_cache import l1_discard
+
+logger = logging.getLogger(__name__)
+
+# Tag builders - the only place tag strings are spelled out
+REPORT_DATES_TAG = 'report:dates'
+REPORT_ALL_TAG = 'report:all'
+EMPLOYEES_TAG = 'employees'
+VACATION_REQUESTS_TAG = 'vacation:requests'
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def report_date_tag(day):
+    return f'report:date:{day}'
+
+
+def report_month_tag(day):
+    return f'report:month:{day:%Y-%m}'
+
+
+def report_month_tags(start, end):
+    """One tag per calendar month between two dates, for range-keyed caches."""
+    tags = []
+    day = date(start.year, start.month, 1)
+    while day <= end:
+        tags.append(report_month_tag(day))
+        day = (day + timedelta(days=32)).replace(day=1)
+    return tags
+
+
+def report_entry_tags(day):
+    """Everything a report entry written on ``day`` can appear in."""
+    return [REPORT_DATES_TAG, REPORT_ALL_TAG, report_date_tag(day.isoformat()), report_month_tag(day)]
+
+
+def table_tag(db_table):
+    """Cached querysets reading ``db_table`` (``core.queryset_cache``)."""
+    return f'table:{db_table}'
+
+
+def vacation_month_tag(year, month):
+    return f'vacation:month:{year:04d}-{month:02d}'
+
+
+def vacation_employee_tag(profile_id):
+    return f'vacation:employee:{profile_id}'
+
+
+# KEYS holds ARGV[2] tag set keys followed by plain cache keys. Every member of
+# each tag set, the sets themselves and the plain keys are unlinked, and the
+# removed cache keys are published once on the L1 invalidation channel (ARGV[1])
+# so in-process caches drop them too. Returns the number of keys deleted and
+# the removed keys. Members are removed in chunks to stay under Lua's unpack()
+# limit.
+_INVALIDATE_SCRIPT = """
+local tag_count = tonumber(ARGV[2])
+local deleted = 0
+local removed = {}
+for i, key in ipairs(KEYS) do
+    if i <= tag_count then
+        local members = redis.call('ZRANGE', key, 0, -1)
+        for j = 1, #members, 500 do
+            deleted = deleted + redis.call('UNLINK', unpack(members, j, math.min(j + 499, #members)))
+        end
+        for _, member in ipairs(members) do
+            removed[#removed + 1] = member
+        end
+        redis.call('UNLINK', key)
+    else
+        deleted = deleted + redis.call('UNLINK', key)
+        removed[#removed + 1] = key
+    end
+end
+if #removed > 0 then
+    redis.call('PUBLISH', ARGV[1], cjson.encode({keys = removed}))
+end
+return {deleted, removed}
+"""
+
+_invalidate_script = None
+
+
+def tag_key(tag):
+    """
+    Full Redis key of the sorted set tracking ``tag`` (carries the cache
+    KEY_PREFIX). v2: sorted sets without a TTL, replacing plain sets that
+    expired with their longest-lived member.
+    """
+    return cache.make_key(f'tag:v2:{tag}')
+
+
+def _get_invalidate_script(client):
+    global _invalidate_script
+    if _invalidate_script is None:
+        _invalidate_script = client.register_script(_INVALIDATE_SCRIPT)
+    return _invalidate_script
+
+
+def set_with_tags(key, value, timeout, tags):
+    """
+    Write ``key`` and register it under ``tags`` in one pipelined round trip.
+    """
+    set_many_with_tags([(key, value, timeout, tags)])
+
+
+def set_many_with_tags(entries):
+    """
+    Write many ``(key, value, timeout, tags)`` entries, and their tag
+    registrations, in a single pipeline. ``tags`` may be empty. Returns the
+    full keys written; entries with ``timeout <= 0`` are skipped.
+    """
+    client = get_redis_connection('default')
+    pipe = client.pipeline(transaction=False)
+    now = time.time()
+    written = []
+    touched = {}
+    for key, value, timeout, tags in entries:
+        if timeout is not None and timeout <= 0:
+            continue
+        full_key = cache.make_key(key)
+        pipe.set(full_key, cache.client.encode(value), ex=timeout)
+        expires_at = float('inf') if timeout is None else now + timeout
+        for tag in tags or ():
+            key_of_tag = tag_key(tag)
+            pipe.zadd(key_of_tag, {full_key: expires_at}, gt=True)
+            touched[key_of_tag] = None
+        written.append(full_key)
+    for key_of_tag in touched:
+        # Members already gone; the set itself never expires
+        pipe.zremrangebyscore(key_of_tag, '-inf', f'({now}')
+    if written:
+        pipe.execute()
+    return written
+
+
+def run_invalidation(tags, keys):
+    """
+    Unlink ``tags`` (with their members) and ``keys`` and publish them to the
+    L1s in one script call, and drop them from this process's L1 before
+    returning the number deleted. No breaker or fallback: errors propagate.
+    """
+    client = get_redis_connection('default')
+    l1_options = getattr(settings, 'CACHE_L1', {})
+    deleted, removed = _get_invalidate_script(client)(
+        keys=[tag_key(tag) for tag in tags] + [cache.make_key(key) for key in keys],
+        args=[l1_options.get('CHANNEL', 'lafarge_cache:l1:invalidate'), len(tags)],
+        client=client,
+    )
+    if removed and l1_options.get('ENABLED', False):
+        # The published message reaches this process's subscriber only later
+        l1_discard([key.decode() if isinstance(key, bytes) else key for key in removed])
+    return deleted
+
+
+def invalidate_now(tags, keys):
+    """
+    Invalidate ``tags`` and ``keys`` right away, even inside a transaction - use
+    ``invalidate_tags`` / ``invalidate_keys``. While Redis is unreachable the
+    invalidation is kept by ``core.degraded_cache`` and replayed on recovery.
+    """
+    tags = [tag for tag in dict.fromkeys(tags) if tag]
+    keys = [key for key in dict.fromkeys(keys) if key]
+    if not tags and not keys:
+        return 0
+    # Entries the degraded cache kept during an earlier failure are stale now too
+    discard(tags, keys)
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        logger.warning(f"Redis circuit open, deferred invalidation of tags {tags} and keys {keys} until it recovers")
+        remember_invalidation(tags, keys)
+        return 0
+    try:
+        deleted = run_invalidation(tags, keys)
+        breaker.record_success()
+        logger.debug(f"Invalidated {deleted} keys for tags {tags} and keys {keys}")
+        return deleted
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache invalidation failed for tags {tags} and keys {keys}: {e}")
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            remember_invalidation(tags, keys)
+        return 0
+
+
+class _PendingInvalidation:
+    """``on_commit`` callback collecting the tags and keys invalidated in one transaction."""
+
+    def __init__(self):
+        self.tags = {}
+        self.keys = {}
+        self.flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        invalidate_now(self.tags, self.keys)
+
+
+# Weak references: the on_commit registration is what keeps a batch alive
+_batches = threading.local()
+
+
+def _pending_invalidation(connection):
+    """
+    The batch of the transaction open on ``connection``, registered with
+    ``on_commit`` when it is started. When the transaction - or the savepoint
+    the batch was started in - rolls back, Django drops the callback, the
+    batch goes with it and the next invalidation starts a new one. Tags added
+    inside a savepoint that later rolls back stay in the batch; flushing them
+    only evicts a little more than needed.
+    """
+    ref = getattr(_batches, connection.alias, None)
+    pending = ref() if ref is not None else None
+    if pending is None or pending.flushed:
+        pending = _PendingInvalidation()
+        transaction.on_commit(pending, using=connection.alias, robust=True)
+        setattr(_batches, connection.alias, weakref.ref(pending))
+    return pending
+
+
+def _invalidate(tags, keys):
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return invalidate_now(tags, keys)
+    pending = _pending_invalidation(connection)
+    pending.tags.update(dict.fromkeys(tags))
+    pending.keys.update(dict.fromkeys(keys))
+    return 0
+
+
+def invalidate_tags(*tags):
+    """
+    Delete every key written under any of ``tags``. Returns the number of keys
+    removed, or 0 when deferred to the end of the current transaction.
+    """
+    return _invalidate(tags, ())
+
+
+def invalidate_keys(*keys):
+    """Delete cache keys, batched with tag invalidations like ``invalidate_tags``."""
+    return _invalidate((), keys)
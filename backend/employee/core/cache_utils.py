@@ -1,41 +1,83 @@
 from functools import wraps
-from django.views.decorators.cache import cache_page
+from hashlib import md5
+from urllib.parse import urlencode
 import logging
 
+from rest_framework.response import Response
+
+from core.redis_config import safe_cache_get_or_set
+
 logger = logging.getLogger(__name__)
 
-def safe_cache_page(timeout):
+USER_SCOPE = 'user'
+ROLE_SCOPE = 'role'
+GLOBAL_SCOPE = 'global'
+
+
+def scope_token(request, scope):
+    """Key segment separating callers that must not share a cached response."""
+    if scope == USER_SCOPE:
+        return f'u{request.user.id}'
+    if scope == ROLE_SCOPE:
+        profile = getattr(request.user, 'profile', None)
+        return f'r{profile.role if profile else "none"}'
+    return 'all'
+
+
+def response_cache_key(family, scope, query_params=None, view_kwargs=None):
     """
-    Cache decorator with graceful fallback for Redis failures.
-    If Redis is unavailable, the view executes normally without caching.
+    Key of a ``core.cache_keys`` response family (parts ``scope``, ``query``);
+    the query part is ``-`` or a digest of the sorted parameters.
     """
-    def decorator(view_func):
-        @wraps(view_func)
-        def wrapper(*args, **kwargs):
-            try:
-                # Try to apply cache_page decorator
-                cached_view = cache_page(timeout)(view_func)
-                return cached_view(*args, **kwargs)
-            except Exception as e:
-                logger.warning(f"Cache failed for {view_func.__name__}: {e}. Executing without cache.")
-                # Execute view without caching if Redis fails
-                return view_func(*args, **kwargs)
-        return wrapper
-    return decorator
+    items = sorted(query_params.lists()) if query_params else []
+    items += sorted((f'kw:{name}', value) for name, value in (view_kwargs or {}).items())
+    query = md5(urlencode(items, doseq=True).encode()).hexdigest()[:16] if items else '-'
+    return family.key(scope, query)
 
-def safe_method_cache(timeout):
+
+class _UncacheableResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def cached_response(family, timeout, scope=USER_SCOPE, tags=(), swr=False):
     """
-    Method decorator for class-based views with cache fallback.
+    Cache the data of a DRF view method's 200 responses in Redis, under a
+    ``core.cache_keys`` response family (``family``, a ``KeyFamily``).
+
+    Unlike ``cache_page`` the key carries the caller's identity: ``scope`` is
+    ``'user'`` (one entry per user), ``'role'`` (shared per profile role) or
+    ``'global'`` (shared by everyone - put role checks such as ``require_roles``
+    above this decorator). Query parameters and URL kwargs are part of the key.
+
+    ``tags`` are tag strings or callables ``tag(request)`` returning a tag or a
+    list of tags; ``core.cache_tags.invalidate_tags`` evicts the entries.
+    ``timeout`` may be a callable ``timeout(request)``. Recomputation is
+    single-flight and ``swr`` serves stale data while refreshing
+    (``safe_cache_get_or_set``).
     """
     def decorator(method):
         @wraps(method)
         def wrapper(self, request, *args, **kwargs):
+            key = response_cache_key(family, scope_token(request, scope), request.query_params, kwargs)
+            resolved_tags = []
+            for tag in tags:
+                tag = tag(request) if callable(tag) else tag
+                resolved_tags.extend(tag if isinstance(tag, (list, tuple)) else [tag])
+
+            def compute():
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    raise _UncacheableResponse(response)
+                return response.data
+
             try:
-                from django.utils.decorators import method_decorator
-                cached_method = method_decorator(cache_page(timeout))(method)
-                return cached_method(self, request, *args, **kwargs)
-            except Exception as e:
-                logger.warning(f"Cache failed for {method.__name__}: {e}. Executing without cache.")
-                return method(self, request, *args, **kwargs)
+                data = safe_cache_get_or_set(
+                    key, compute, timeout(request) if callable(timeout) else timeout,
+                    tags=resolved_tags, swr=swr
+                )
+            except _UncacheableResponse as uncacheable:
+                return uncacheable.response
+            return Response(data)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
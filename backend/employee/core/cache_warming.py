@@ -1,96 +1,252 @@
-from django.core.cache import cache
+"""
+Cache warming.
+
+Each warmer builds the entries of one resource family from a single query and
+writes them in pipelined batches of ``CACHE_WARMING['BATCH_SIZE']`` keys, one
+round trip per batch, in the payload format ``core.cache_keys`` declares for
+the family - exactly what the views read back. Families can
+be warmed in parallel on a small thread pool.
+
+Run on a schedule with ``python manage.py warm_cache`` (cron, systemd timer...)
+or trigger it from ``POST /api/health/cache/warm/`` (``?background=true`` to not wait).
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import logging
+import threading
+import time
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from employee.models import EmployeeProfile
+from django.core.cache import cache
+from django.db import connections
+
+from core.cache_access import get_rebuilder, register_rebuilder, top_missed_keys
+from core.cache_keys import REPORT_ENTRIES_DATE, USER_PROFILE, USER_SALARY
+from core.cache_tags import user_tag, report_date_tag
+from core.cache_utils import response_cache_key
+from core.redis_config import safe_cache_set_many
 from report.models import ReportEntry
-from vacation.models import VacationRequest
-from datetime import datetime, timedelta
-import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _options():
+    return getattr(settings, 'CACHE_WARMING', {})
+
+
+def write_entries(entries, batch_size=None):
+    """
+    Write ``(key, value, timeout, tags)`` entries with ``safe_cache_set_many``,
+    one pipelined batch at a time. Returns the number of keys written; stops
+    early if Redis goes away.
+    """
+    batch_size = batch_size or _options().get('BATCH_SIZE', 500)
+    written = 0
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        if not safe_cache_set_many(batch):
+            logger.warning(f"Stopped cache warming after {written} keys")
+            break
+        written += len(batch)
+    return written
+
+
+def _user_salary_key(user_id):
+    """Key GetOwnSalaryView's ``cached_response`` uses for this user (no query parameters)."""
+    return response_cache_key(USER_SALARY, f'u{user_id}')
+
+
+def _user_entries(user):
+    """
+    The user_profile / user_salary cache entries of one user, as ProtectedView
+    and GetOwnSalaryView cache them.
+    """
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return []
+    tags = [user_tag(user.id)]
+    return [
+        USER_PROFILE.entry(USER_PROFILE.key(user.id), {
+            "username": user.username,
+            "firstname": user.first_name,
+            "lastname": user.last_name,
+            "email": user.email,
+            "role": profile.role,
+            "annual_leave_days": profile.annual_leave_days,
+        }, settings.CACHE_TIMEOUTS['user_profile'], tags),
+        USER_SALARY.entry(_user_salary_key(user.id), {
+            'base_salary': profile.base_salary,
+            'bonus_payment': profile.bonus_payment,
+            "transportation_allowance": profile.transportation_allowance,
+            "is_mpf_exempt": profile.is_mpf_exempt
+        }, settings.CACHE_TIMEOUTS['user_salary'], tags),
+    ]
+
+
+@register_rebuilder(USER_PROFILE.name)
+@register_rebuilder(USER_SALARY.name)
+def rebuild_user_entry(key):
+    profile_parts, salary_parts = USER_PROFILE.parse(key), USER_SALARY.parse(key)
+    if profile_parts:
+        user_id = profile_parts['user_id']
+    elif salary_parts and salary_parts['query'] == '-':
+        user_id = salary_parts['scope'][1:]
+    else:
+        return None
+    if not user_id.isdigit():
+        return None
+    user = User.objects.select_related('profile').filter(pk=int(user_id)).first()
+    entries = [entry for entry in (_user_entries(user) if user else []) if entry[0] == key]
+    return entries[0] if entries else None
+
+
 def warm_user_caches():
-    """Pre-populate cache with frequently accessed user data"""
+    """Pre-populate the per-user profile and salary caches from one query"""
     try:
-        users = User.objects.select_related('profile').all()
-        warmed_count = 0
-        
-        for user in users:
-            try:
-                # Warm user profile cache
-                cache_key = f'user_profile_{user.id}'
-                profile_data = {
-                    "username": user.username,
-                    "firstname": user.first_name,
-                    "lastname": user.last_name,
-                    "email": user.email,
-                    "role": user.profile.role,
-                    "annual_leave_days": user.profile.annual_leave_days,
-                }
-                cache.set(cache_key, profile_data, 60 * 30)  # 30 minutes
-                
-                # Warm user salary cache
-                salary_key = f'user_salary_{user.id}'
-                salary_data = {
-                    'base_salary': user.profile.base_salary,
-                    'bonus_payment': user.profile.bonus_payment,
-                    'transportation_allowance': user.profile.transportation_allowance,
-                    'is_mpf_exempt': user.profile.is_mpf_exempt
-                }
-                cache.set(salary_key, salary_data, 60 * 30)  # 30 minutes
-                warmed_count += 1
-                
-            except Exception as e:
-                logger.error(f"Failed to warm cache for user {user.username}: {e}")
-        
-        logger.info(f"Successfully warmed cache for {warmed_count} users")
-        return warmed_count
-        
+        entries = []
+        for user in User.objects.select_related('profile'):
+            entries.extend(_user_entries(user))
+
+        warmed = write_entries(entries)
+        logger.info(f"Warmed {warmed} user cache keys")
+        return warmed
+
     except Exception as e:
         logger.error(f"Cache warming failed: {e}")
         return 0
 
-def warm_report_caches():
-    """Pre-populate cache with recent report data"""
+
+def warm_report_caches(days=None):
+    """
+    Pre-populate ``REPORT_ENTRIES_DATE`` keys (salesman ``all``) for the last
+    ``days`` days (today is never cached) from one query, serialized and
+    enveloped exactly as ``AllReportEntriesView`` caches it.
+    """
+    from api.views.report_views import get_cache_timeout_for_date
+    from report.serializers import ReportEntrySerializer
+
     try:
-        # Warm cache for last 7 days of report dates
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=7)
-        
-        dates = ReportEntry.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).values_list('date', flat=True).distinct()
-        
-        warmed_count = 0
-        for date in dates:
-            date_str = date.strftime('%Y-%m-%d')
-            
-            # Skip current date (no cache)
-            if date == end_date:
+        days = days or _options().get('REPORT_DAYS', 7)
+        today = date.today()
+        queryset = ReportEntry.objects.select_related('salesman', 'salesman__profile').filter(
+            salesman__profile__is_active=True,
+            date__gte=today - timedelta(days=days),
+            date__lt=today,
+        ).order_by('-date')
+
+        by_date = defaultdict(list)
+        for item in ReportEntrySerializer(queryset, many=True).data:
+            by_date[item['date']].append(item)
+
+        entries = []
+        for date_str, items in by_date.items():
+            timeout = get_cache_timeout_for_date(date_str)
+            if timeout <= 0:
                 continue
-                
-            # Warm all entries for this date
-            entries = ReportEntry.objects.filter(date=date).select_related('salesman')
-            if entries.exists():
-                cache_key = f'report_entries_date:{date_str}:salesman:all'
-                cache.set(cache_key, list(entries.values()), 60 * 60)  # 1 hour
-                warmed_count += 1
-        
-        logger.info(f"Successfully warmed report cache for {warmed_count} dates")
-        return warmed_count
-        
+            entries.append(REPORT_ENTRIES_DATE.entry(
+                REPORT_ENTRIES_DATE.key(date_str, 'all'), items, timeout, [report_date_tag(date_str)], swr=True
+            ))
+
+        warmed = write_entries(entries)
+        logger.info(f"Warmed report cache for {warmed} dates")
+        return warmed
+
     except Exception as e:
         logger.error(f"Report cache warming failed: {e}")
         return 0
 
-def warm_essential_caches():
-    """Warm all essential caches for application startup"""
-    logger.info("Starting cache warming process...")
-    
-    results = {
-        'users_warmed': warm_user_caches(),
-        'reports_warmed': warm_report_caches(),
-    }
-    
+
+def warm_most_missed(limit=None):
+    """
+    Rebuild the most-missed keys recorded by ``core.cache_access`` that are not
+    cached right now, so warming follows what traffic actually asks for.
+    """
+    from django_redis import get_redis_connection
+    import api.cache_rebuilders  # noqa: F401 - registers the view key rebuilders
+
+    try:
+        keys = top_missed_keys(limit)
+        if not keys:
+            return 0
+
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(cache.make_key(key))
+        missing = [key for key, exists in zip(keys, pipe.execute()) if not exists]
+
+        entries = []
+        for key in missing:
+            try:
+                entry = get_rebuilder(key)(key)
+            except Exception as e:
+                logger.warning(f"Failed to rebuild cache key {key}: {e}")
+                continue
+            if entry is not None:
+                entries.append(entry)
+
+        warmed = write_entries(entries)
+        logger.info(f"Warmed {warmed} of the {len(keys)} most-missed cache keys")
+        return warmed
+
+    except Exception as e:
+        logger.error(f"Access-driven cache warming failed: {e}")
+        return 0
+
+
+WARMERS = {
+    'users': warm_user_caches,
+    'reports': warm_report_caches,
+    'hot': warm_most_missed,
+}
+
+
+def _run_warmer(family, in_thread):
+    try:
+        return WARMERS[family]()
+    finally:
+        if in_thread:
+            # Database connections are per thread; don't leak the pool thread's
+            connections.close_all()
+
+
+def warm_essential_caches(families=None, parallel=None):
+    """Warm the given families (all by default), in parallel unless disabled"""
+    families = list(families or WARMERS)
+    parallel = _options().get('PARALLEL', True) if parallel is None else parallel
+    logger.info(f"Starting cache warming for {', '.join(families)}...")
+    started = time.monotonic()
+
+    if parallel and len(families) > 1:
+        with ThreadPoolExecutor(max_workers=len(families), thread_name_prefix='cache-warm') as pool:
+            futures = {family: pool.submit(_run_warmer, family, True) for family in families}
+            results = {f'{family}_warmed': future.result() for family, future in futures.items()}
+    else:
+        results = {f'{family}_warmed': _run_warmer(family, False) for family in families}
+
+    results['duration_ms'] = round((time.monotonic() - started) * 1000, 2)
     logger.info(f"Cache warming completed: {results}")
-    return results
\ No newline at end of file
+    return results
+
+
+_background_lock = threading.Lock()
+
+
+def warm_in_background(families=None):
+    """Start warming on a daemon thread. Returns False if a warm is already running here."""
+    if not _background_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            warm_essential_caches(families)
+        except Exception as e:
+            logger.error(f"Background cache warming failed: {e}")
+        finally:
+            connections.close_all()
+            _background_lock.release()
+
+    threading.Thread(target=run, name='cache-warm', daemon=True).start()
+    return True
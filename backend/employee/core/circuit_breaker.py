@@ -0,0 +1,152 @@
+"""
+Circuit breaker for the shared Redis connection.
+
+Every Redis call made through the cache helpers asks the breaker first. After
+``FAILURE_THRESHOLD`` consecutive connection failures the breaker opens and
+callers skip Redis entirely (serving from ``core.degraded_cache`` instead)
+rather than each waiting for the socket timeout. After ``RECOVERY_TIMEOUT`` seconds it half-opens and
+lets ``HALF_OPEN_MAX_CALLS`` probe calls through: a success closes it again, a
+failure re-opens it for another cooldown. Listeners registered with
+``add_listener`` are told about every state change (e.g. degraded mode
+dropping the copies it kept during the outage).
+
+State is per process; each gunicorn worker finds out about an outage on its own.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean Redis could not be reached, as opposed to a bad value or command
+REDIS_OUTAGE_ERRORS = (ConnectionInterrupted, RedisConnectionError, RedisTimeoutError, OSError)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open breaker."""
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """Call ``callback(old_state, new_state)`` after each transition to closed or open."""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def _notify(self, old_state, new_state):
+        if old_state == new_state:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(old_state, new_state)
+            except Exception as e:
+                logger.error(f"Circuit '{self.name}' listener failed: {e}")
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"Circuit '{self.name}' half-open, probing")
+
+    def allow_request(self):
+        """Whether the caller may try the protected resource now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            previous = self._state
+            if previous != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed, resource is back")
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+        self._notify(previous, CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            previous = self._state
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(
+                        f"Circuit '{self.name}' open after {self._failures} failures, "
+                        f"skipping it for {self.recovery_timeout}s"
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            current = self._state
+        self._notify(previous, current)
+
+    def record_error(self, error):
+        """Record the outcome of an allowed call that raised ``error``."""
+        if isinstance(error, REDIS_OUTAGE_ERRORS):
+            self.record_failure()
+        else:
+            # Redis answered; the problem was the value or the command
+            self.record_success()
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = round(max(0, self.recovery_timeout - (time.monotonic() - self._opened_at)), 1)
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_in_seconds': retry_in,
+            }
+
+
+_redis_breaker = None
+_redis_breaker_lock = threading.Lock()
+
+
+def get_redis_breaker():
+    """The process-wide breaker guarding the default Redis cache."""
+    global _redis_breaker
+    if _redis_breaker is None:
+        with _redis_breaker_lock:
+            if _redis_breaker is None:
+                options = getattr(settings, 'CACHE_CIRCUIT_BREAKER', {})
+                _redis_breaker = CircuitBreaker(
+                    'redis',
+                    failure_threshold=options.get('FAILURE_THRESHOLD', 5),
+                    recovery_timeout=options.get('RECOVERY_TIMEOUT', 30),
+                    half_open_max_calls=options.get('HALF_OPEN_MAX_CALLS', 1),
+                )
+    return _redis_breaker
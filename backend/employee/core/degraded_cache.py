@@ -0,0 +1,345 @@
+"""
+Degraded mode: a bounded in-process cache used while Redis is unreachable.
+
+While the Redis circuit breaker is open - or a call fails with a connection
+error - the cache helpers in ``core.redis_config`` read and write this
+per-process LRU instead of sending every request to PostgreSQL. Entries live
+at most ``CACHE_DEGRADED['TTL']`` seconds and the cache is capped by entry
+count and by estimated (pickled) size, so an outage costs a little staleness
+rather than a database stampede.
+
+Invalidations that cannot reach Redis drop the matching local entries and are
+appended to a spool file (``CACHE_DEGRADED['SPOOL_PATH']``) shared by every
+process of the host, so they are not lost with the process that recorded
+them. Each process runs a replay thread that checks the spool every
+``REPLAY_INTERVAL`` seconds, and at once when its breaker closes. While
+invalidations are pending the cache helpers keep reading the degraded cache
+instead of Redis. The thread replays them in one call under a non-blocking
+lock on the spool, so only one process replays at a time. The others
+keep waiting and recheck on their next tick. If the spool overflows, the replay
+thread clears every registered key family instead. Request threads never
+wait on the spool or on the replay. Deployments running several hosts must
+point ``SPOOL_PATH`` at storage they all share.
+"""
+
+from collections import defaultdict
+import fcntl
+import json
+import logging
+import os
+import pickle
+import threading
+
+from django.conf import settings
+
+from core.circuit_breaker import CLOSED, REDIS_OUTAGE_ERRORS, get_redis_breaker
+from core.local_cache import MISSING, LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_replay_lock = threading.Lock()
+_start_lock = threading.Lock()
+_cache = None
+_replayer = None
+_replay_needed = threading.Event()  # Reads must not go to Redis while set
+_wakeup = threading.Event()
+_tagged = defaultdict(set)  # tag -> local keys written under it
+# Invalidations the spool could not take, replayed with it
+_pending_tags = {}
+_pending_keys = {}
+_overflow = False
+
+
+def _options():
+    return getattr(settings, 'CACHE_DEGRADED', {})
+
+
+def degraded_enabled():
+    return _options().get('ENABLED', True)
+
+
+def _spool_path():
+    return _options().get('SPOOL_PATH', '/tmp/lafarge_cache_invalidations.jsonl')
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                options = _options()
+                _cache = LocalLRUCache(
+                    options.get('MAX_ENTRIES', 500), options.get('TTL', 60), options.get('MAX_BYTES', 32 * 1024 * 1024)
+                )
+                get_redis_breaker().add_listener(_on_breaker_change)
+    return _cache
+
+
+def degraded_get(key):
+    """Locally cached value of ``key``, or ``MISSING``."""
+    if not degraded_enabled() or _cache is None:
+        return MISSING
+    return _cache.get(key)
+
+
+def degraded_set(key, value, timeout=None, tags=()):
+    """Keep ``value`` locally for at most ``CACHE_DEGRADED['TTL']`` seconds (and never past ``timeout``)."""
+    if not degraded_enabled() or (timeout is not None and timeout <= 0):
+        return False
+    options = _options()
+    try:
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return False
+    if size > options.get('MAX_VALUE_BYTES', 1024 * 1024):
+        return False
+    ttl = options.get('TTL', 60) if timeout is None else min(timeout, options.get('TTL', 60))
+    _get_cache().set(key, value, ttl, size)
+    if tags:
+        with _lock:
+            for tag in tags:
+                _tagged[tag].add(key)
+    return True
+
+
+def discard(tags=(), keys=()):
+    """Drop local entries of ``keys`` and of everything written under ``tags``."""
+    if _cache is None:
+        return
+    with _lock:
+        keys = set(keys)
+        for tag in tags:
+            keys |= _tagged.pop(tag, set())
+    _cache.delete_many(keys)
+
+
+def _append_to_spool(record):
+    """
+    Append one JSON line under the spool lock; past ``MAX_SPOOL_BYTES`` only an
+    overflow marker. Raises ``BlockingIOError`` rather than wait for the lock.
+    """
+    limit = _options().get('MAX_SPOOL_BYTES', 4 * 1024 * 1024)
+    line = json.dumps(record) + '\n'
+    with open(_spool_path(), 'a', encoding='utf-8') as spool:
+        fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            size = os.fstat(spool.fileno()).st_size
+            if size + len(line) > limit:
+                if size >= limit:
+                    return  # Already overflowed: recovery clears every family anyway
+                line = json.dumps({'overflow': True}) + '\n'
+            spool.write(line)
+            spool.flush()
+        finally:
+            fcntl.flock(spool, fcntl.LOCK_UN)
+
+
+def remember_invalidation(tags=(), keys=()):
+    """An invalidation Redis could not apply: drop it locally and spool it for replay."""
+    global _overflow
+    discard(tags, keys)
+    if not degraded_enabled():
+        return
+    _get_cache()  # make sure the recovery listener is registered
+    _ensure_replayer()
+    try:
+        _append_to_spool({'tags': list(tags), 'keys': list(keys)})
+        _replay_needed.set()
+        return
+    except BlockingIOError:
+        pass  # Spool busy (being replayed or appended to): keep it in this process
+    except OSError as e:
+        logger.error(f"Cannot spool cache invalidation to {_spool_path()}, keeping it in this process: {e}")
+    limit = _options().get('MAX_PENDING_INVALIDATIONS', 10000)
+    with _lock:
+        for pending, items in ((_pending_tags, tags), (_pending_keys, keys)):
+            for item in items:
+                if len(_pending_tags) + len(_pending_keys) >= limit:
+                    _overflow = True
+                    break
+                pending[item] = None
+        _replay_needed.set()
+
+
+def _spool_size():
+    try:
+        return os.path.getsize(_spool_path())
+    except OSError:
+        return 0
+
+
+def has_pending_invalidations():
+    return bool(_pending_tags or _pending_keys or _overflow) or _spool_size() > 0
+
+
+def _clear_families():
+    """Every key of every registered family: what a lost invalidation could have left stale."""
+    from django_redis import get_redis_connection
+
+    from core.cache_keys import families
+    from core.keyspace import KeyspaceAnalyzer
+
+    client = get_redis_connection('default')
+    deleted = sum(
+        KeyspaceAnalyzer(client, match=family.match()).delete_matching()[0] for family in families().values()
+    )
+    logger.error(f"Cache invalidations overflowed during the Redis outage; cleared all {deleted} family keys")
+
+
+def _read_spool(spool):
+    spool.seek(0)
+    records = []
+    for line in spool.read().splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # A line cut short by a crash mid-write
+    return records
+
+
+def _replay(records):
+    """Apply spooled and in-process invalidations; raises if Redis fails."""
+    global _overflow
+    from core.cache_tags import run_invalidation
+
+    with _lock:
+        tags, keys, overflow = dict(_pending_tags), dict(_pending_keys), _overflow
+    for record in records:
+        overflow = overflow or record.get('overflow', False)
+        tags.update(dict.fromkeys(record.get('tags', ())))
+        keys.update(dict.fromkeys(record.get('keys', ())))
+    if overflow:
+        _clear_families()
+    if tags or keys:
+        deleted = run_invalidation(list(tags), list(keys))
+        logger.info(
+            f"Replayed {len(tags)} tag and {len(keys)} key invalidations after the Redis outage ({deleted} keys)"
+        )
+    with _lock:
+        # Only what was replayed; other threads may have added more meanwhile
+        for tag in tags:
+            _pending_tags.pop(tag, None)
+        for key in keys:
+            _pending_keys.pop(key, None)
+        if overflow:
+            _overflow = False
+
+
+def replay_invalidations():
+    """
+    Apply the invalidations recorded during an outage, by any process, and
+    return whether none are left. Run by the replay thread. Gives up at once,
+    returning False, if another thread or process holds the spool - it is
+    replaying it - or if Redis cannot be reached.
+    """
+    if not _replay_lock.acquire(blocking=False):
+        return False
+    try:
+        try:
+            spool = open(_spool_path(), 'a+', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Cannot open cache invalidation spool {_spool_path()}: {e}")
+            spool = None
+        try:
+            if spool is not None:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    spool.close()
+                    spool = None
+                    return False
+            breaker = get_redis_breaker()
+            if not breaker.allow_request():
+                return False
+            try:
+                _replay(_read_spool(spool) if spool is not None else [])
+                breaker.record_success()
+            except Exception as e:
+                breaker.record_error(e)
+                if isinstance(e, REDIS_OUTAGE_ERRORS):
+                    logger.warning(f"Redis still unreachable, keeping cache invalidations for the next attempt: {e}")
+                    return False
+                # Retrying would fail the same way every time
+                logger.error(f"Dropping cache invalidations that could not be replayed: {e}")
+                with _lock:
+                    _pending_tags.clear()
+                    _pending_keys.clear()
+            if spool is not None:
+                spool.truncate(0)
+            with _lock:
+                if _pending_tags or _pending_keys or _overflow:
+                    return False
+                _replay_needed.clear()
+            return True
+        finally:
+            if spool is not None:
+                fcntl.flock(spool, fcntl.LOCK_UN)
+                spool.close()
+    finally:
+        _replay_lock.release()
+
+
+def _replay_loop():
+    while True:
+        _wakeup.wait(_options().get('REPLAY_INTERVAL', 1))
+        _wakeup.clear()
+        try:
+            if _replay_needed.is_set() or has_pending_invalidations():
+                _replay_needed.set()
+                replay_invalidations()
+        except Exception as e:
+            logger.error(f"Cache invalidation replay failed: {e}")
+
+
+def _ensure_replayer():
+    """Start the replay thread lazily, once per process (after gunicorn forks)."""
+    global _replayer
+    if _replayer is not None and _replayer.is_alive() and _replayer.pid == os.getpid():
+        return
+    with _start_lock:
+        if _replayer is not None and _replayer.is_alive() and _replayer.pid == os.getpid():
+            return
+        if _spool_size() > 0:
+            # Left by other processes, or by this host before a restart
+            _replay_needed.set()
+        _replayer = threading.Thread(target=_replay_loop, name='cache-invalidation-replay', daemon=True)
+        _replayer.pid = os.getpid()
+        _replayer.start()
+
+
+def replay_pending():
+    """
+    Whether invalidations made during an outage are still waiting to be
+    replayed, in which case nothing may be read from Redis. Only checks a
+    flag; the replay thread watches the spool.
+    """
+    if not degraded_enabled():
+        return False
+    _ensure_replayer()
+    return _replay_needed.is_set()
+
+
+def _on_breaker_change(old_state, new_state):
+    if new_state == CLOSED:
+        # Reads go to Redis again; nothing should be served from the outage copies
+        with _lock:
+            _tagged.clear()
+        if _cache is not None:
+            _cache.clear()
+        _wakeup.set()
+    else:
+        logger.warning("Redis unavailable, cache helpers are serving from the local degraded cache")
+
+
+def degraded_stats():
+    with _lock:
+        pending = {'tags': len(_pending_tags), 'keys': len(_pending_keys), 'overflow': _overflow}
+    pending['spool_bytes'] = _spool_size()
+    pending['replay_pending'] = _replay_needed.is_set()
+    return {
+        'enabled': degraded_enabled(),
+        'entries': len(_cache) if _cache is not None else 0,
+        'estimated_bytes': _cache.size if _cache is not None else 0,
+        'pending_invalidations': pending,
+    }
@@ -0,0 +1,191 @@
+"""
+Incremental keyspace analysis for the shared Redis instance.
+
+Walks the keyspace with ``SCAN`` (never ``KEYS``), a batch at a time and under
+a key budget, so analysis cannot block Redis the way a full ``KEYS`` walk
+does. Every key is counted per family; a random sample of keys is also
+measured with ``MEMORY USAGE`` and ``TTL`` (pipelined per batch) to estimate
+memory, TTL distribution and the largest keys of each family.
+"""
+
+from collections import defaultdict
+import heapq
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TTL_BUCKETS = [
+    (60, '<1m'),
+    (60 * 10, '<10m'),
+    (60 * 60, '<1h'),
+    (60 * 60 * 24, '<1d'),
+]
+
+_FAMILY_RE = re.compile(r'^(.*?)(?::|_\d)')
+
+
+def key_family(key):
+    """
+    Family of a cache key: the part before the first ``:`` or ``_<id>``,
+    after stripping the ``KEY_PREFIX:version:`` added by django-redis.
+    """
+    if isinstance(key, bytes):
+        key = key.decode('utf-8', errors='replace')
+
+    prefix = settings.CACHES['default'].get('KEY_PREFIX', '')
+    parts = key.split(':', 2)
+    if len(parts) == 3 and parts[0] == prefix and parts[1].isdigit():
+        key = parts[2]
+
+    if key.startswith('django.contrib.sessions'):
+        return 'session'
+    if key.startswith('views.decorators.cache.cache_page'):
+        return 'cache_page'
+    if key.startswith('views.decorators.cache.cache_header'):
+        return 'cache_header'
+
+    match = _FAMILY_RE.match(key)
+    return match.group(1) if match else key
+
+
+def _ttl_bucket(ttl):
+    if ttl is None or ttl < 0:
+        return 'no_expiry'
+    for limit, label in TTL_BUCKETS:
+        if ttl < limit:
+            return label
+    return '>=1d'
+
+
+class _FamilyStats:
+    def __init__(self):
+        self.count = 0
+        self.sampled = 0
+        self.sampled_bytes = 0
+        self.ttl = defaultdict(int)
+        self.largest = []  # min-heap of (bytes, key)
+
+    def add_sample(self, key, size, ttl, top_n):
+        self.sampled += 1
+        self.sampled_bytes += size
+        self.ttl[_ttl_bucket(ttl)] += 1
+        if len(self.largest) < top_n:
+            heapq.heappush(self.largest, (size, key))
+        elif size > self.largest[0][0]:
+            heapq.heapreplace(self.largest, (size, key))
+
+    def as_dict(self):
+        average = self.sampled_bytes / self.sampled if self.sampled else 0
+        return {
+            'keys': self.count,
+            'sampled': self.sampled,
+            'avg_bytes': round(average),
+            'estimated_bytes': round(average * self.count),
+            'ttl_distribution': dict(self.ttl),
+            'largest_keys': [
+                {'key': key, 'bytes': size} for size, key in sorted(self.largest, reverse=True)
+            ],
+        }
+
+
+class KeyspaceAnalyzer:
+    """SCAN-based, sampled keyspace report grouped by key family."""
+
+    def __init__(self, client, match=None, scan_count=None, max_keys=None, sample_rate=None, top_n=None,
+                 pause=None):
+        options = getattr(settings, 'CACHE_KEYSPACE_ANALYZER', {})
+        self.client = client
+        self.match = match
+        self.scan_count = scan_count or options.get('SCAN_COUNT', 500)
+        self.max_keys = max_keys or options.get('MAX_KEYS', 20000)
+        self.sample_rate = options.get('SAMPLE_RATE', 0.05) if sample_rate is None else sample_rate
+        self.top_n = top_n or options.get('TOP_N', 5)
+        # Seconds to sleep between SCAN batches, to leave room for real traffic
+        self.pause = options.get('PAUSE', 0) if pause is None else pause
+
+    def iter_batches(self, bounded=True):
+        """Yield SCAN batches until the cursor wraps or (if ``bounded``) the key budget is spent."""
+        cursor = 0
+        seen = 0
+        while True:
+            cursor, keys = self.client.scan(cursor=cursor, match=self.match, count=self.scan_count)
+            seen += len(keys)
+            yield keys, cursor == 0
+            if cursor == 0 or (bounded and seen >= self.max_keys):
+                return
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _measure(self, keys):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+            pipe.ttl(key)
+        results = pipe.execute(raise_on_error=False)
+        for index, key in enumerate(keys):
+            size, ttl = results[2 * index], results[2 * index + 1]
+            if isinstance(size, Exception) or size is None:
+                continue  # expired between SCAN and measurement
+            yield key, size, ttl if not isinstance(ttl, Exception) else None
+
+    def analyze(self):
+        started = time.monotonic()
+        families = defaultdict(_FamilyStats)
+        scanned = 0
+        complete = False
+
+        for keys, complete in self.iter_batches():
+            scanned += len(keys)
+            sample = []
+            for key in keys:
+                if isinstance(key, bytes):
+                    key = key.decode('utf-8', errors='replace')
+                families[key_family(key)].count += 1
+                if self.sample_rate and random.random() < self.sample_rate:
+                    sample.append(key)
+            if sample:
+                for key, size, ttl in self._measure(sample):
+                    families[key_family(key)].add_sample(key, size, ttl, self.top_n)
+
+        return {
+            'scanned_keys': scanned,
+            'complete': complete,
+            'sample_rate': self.sample_rate,
+            'duration_ms': round((time.monotonic() - started) * 1000, 2),
+            'families': {
+                name: stats.as_dict()
+                for name, stats in sorted(families.items(), key=lambda item: -item[1].count)
+            },
+        }
+
+    def count_families(self):
+        """Key counts per family only - no sampling, cheapest possible walk."""
+        counts = defaultdict(int)
+        for keys, _ in self.iter_batches():
+            for key in keys:
+                counts[key_family(key)] += 1
+        return dict(counts)
+
+    def delete_matching(self, batch_size=500):
+        """
+        UNLINK every key matching ``match``, batch by batch, publishing each batch
+        on the L1 invalidation channel so no process keeps serving its in-memory
+        copy. Returns (deleted, first few keys).
+        """
+        from core.local_cache import publish_invalidation
+
+        deleted = 0
+        examples = []
+        for keys, _ in self.iter_batches(bounded=False):
+            keys = [key.decode('utf-8', errors='replace') if isinstance(key, bytes) else key for key in keys]
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                deleted += self.client.unlink(*batch)
+                publish_invalidation(self.client, batch)
+            examples.extend(keys[:max(0, 10 - len(examples))])
+        return deleted, examples
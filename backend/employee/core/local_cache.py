@@ -0,0 +1,235 @@
+"""
+In-process L1 cache in front of Redis.
+
+Hot, small keys (``settings.CACHE_L1['FAMILIES']``) are kept in a bounded,
+TTL-limited LRU inside each worker process so repeated reads skip the Redis
+round trip, decompression and unpickling. Coherence across gunicorn workers
+and hosts comes from Redis pub/sub: every delete, overwrite or tag
+invalidation publishes the affected full keys on ``CACHE_L1['CHANNEL']`` and
+each process drops them from its L1. While a process is not subscribed the L1
+is bypassed, and the TTL bounds staleness if a message is ever lost.
+
+Values are shared, not copied: treat anything read from the cache as read-only.
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    Thread-safe LRU with a per-entry TTL, bounded by the number of entries and
+    optionally by ``max_bytes``, the sum of the sizes callers pass to ``set``.
+    """
+
+    def __init__(self, max_entries=1000, ttl=30, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value, size = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.size -= size
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, size=0):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            self._data[key] = (expires_at, value, size)
+            self.size += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.size -= evicted_size
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                entry = self._data.pop(key, None)
+                if entry is not None:
+                    self.size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _options():
+    return getattr(settings, 'CACHE_L1', {})
+
+
+_l1 = None
+_families = frozenset()
+_subscriber = None
+_subscribed = threading.Event()
+_start_lock = threading.Lock()
+_epoch_lock = threading.Lock()
+# Bumped on every invalidation; a read only fills L1 if no invalidation raced with it
+_epoch = 0
+
+
+_process_token = (None, None)
+
+
+def _process_id():
+    """Identifies this process's own messages, which it has already applied. Regenerated after fork."""
+    global _process_token
+    pid = os.getpid()
+    if _process_token[0] != pid:
+        _process_token = (pid, f'{pid}-{uuid.uuid4().hex[:8]}')
+    return _process_token[1]
+
+
+def _get_l1():
+    global _l1, _families
+    if _l1 is None:
+        options = _options()
+        _families = frozenset(options.get('FAMILIES', ()))
+        _l1 = LocalLRUCache(options.get('MAX_ENTRIES', 1000), options.get('TTL', 30))
+    return _l1
+
+
+def l1_enabled_for(key):
+    """Whether ``key`` (un-prefixed) belongs to an L1 family and the L1 is coherent right now."""
+    if not _options().get('ENABLED', False):
+        return False
+    from core.keyspace import key_family
+    _get_l1()
+    if key_family(key) not in _families:
+        return False
+    _ensure_subscriber()
+    return _subscribed.is_set()
+
+
+def current_epoch():
+    return _epoch
+
+
+def l1_get(full_key):
+    return _get_l1().get(full_key)
+
+
+def l1_store(full_key, value, epoch):
+    """Fill L1 after a Redis read, unless an invalidation arrived since ``epoch``."""
+    if epoch == _epoch:
+        _get_l1().set(full_key, value)
+
+
+def l1_discard(full_keys):
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+    _get_l1().delete_many(full_keys)
+
+
+def publish_invalidation(client, full_keys):
+    """Tell every other process to drop ``full_keys`` from its L1."""
+    l1_discard(full_keys)
+    message = json.dumps({'origin': _process_id(), 'keys': list(full_keys)})
+    client.publish(_options().get('CHANNEL', 'lafarge_cache:l1:invalidate'), message)
+
+
+def _handle_message(data):
+    try:
+        payload = json.loads(data)
+    except (TypeError, ValueError):
+        return
+    if payload.get('origin') == _process_id():
+        return
+    keys = payload.get('keys') or []
+    l1_discard([key.decode() if isinstance(key, bytes) else key for key in keys])
+
+
+def _subscriber_client():
+    """
+    A client of its own for the subscription. The pub/sub connection is held for
+    the life of the process, so taking it from the shared cache pool would leave
+    every request, revalidation and warming thread one connection short; and the
+    pool's socket timeout would drop an idle subscription every few seconds.
+    """
+    import redis
+
+    cache = settings.CACHES['default']
+    location = cache['LOCATION']
+    if isinstance(location, (list, tuple)):
+        location = location[0]
+    pool_kwargs = cache.get('OPTIONS', {}).get('CONNECTION_POOL_KWARGS', {})
+    return redis.Redis.from_url(
+        location,
+        max_connections=1,
+        socket_connect_timeout=pool_kwargs.get('socket_connect_timeout', 5),
+        socket_timeout=None,  # listen() blocks until the next message
+        socket_keepalive=True,
+    )
+
+
+def _listen():
+    channel = _options().get('CHANNEL', 'lafarge_cache:l1:invalidate')
+    backoff = 1
+    while True:
+        client = pubsub = None
+        try:
+            client = _subscriber_client()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel)
+            # Anything cached before (re)subscribing may have missed invalidations
+            _get_l1().clear()
+            _subscribed.set()
+            backoff = 1
+            for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    _handle_message(message['data'])
+        except Exception as e:
+            logger.warning(f"L1 cache invalidation subscriber lost connection: {e}")
+        finally:
+            _subscribed.clear()
+            _get_l1().clear()
+            for resource in (pubsub, client):
+                if resource is not None:
+                    try:
+                        resource.close()
+                    except Exception:
+                        pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def _ensure_subscriber():
+    """Start the pub/sub listener lazily, once per process (after gunicorn forks)."""
+    global _subscriber
+    if _subscriber is not None and _subscriber.is_alive() and _subscriber.pid == os.getpid():
+        return
+    with _start_lock:
+        if _subscriber is not None and _subscriber.is_alive() and _subscriber.pid == os.getpid():
+            return
+        _subscriber = threading.Thread(target=_listen, name='l1-cache-invalidation', daemon=True)
+        _subscriber.pid = os.getpid()
+        _subscriber.start()
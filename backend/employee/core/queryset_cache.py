@@ -0,0 +1,177 @@
+"""
+Queryset result caching with model-driven invalidation.
+
+``SomeModel.objects.filter(...).cached(timeout)`` evaluates the queryset
+through ``safe_cache_get_or_set`` under a key derived from its SQL, and tags
+the entry with every table the result depends on: the model's table, joined
+tables (filters, ``select_related``) and tables reached by
+``prefetch_related``. A ``post_save`` / ``post_delete`` / ``m2m_changed`` of a
+watched model invalidates its table tag, so cached results never outlive a
+write made through the ORM's instance API.
+
+Only the models a cached queryset can read are watched, so writes elsewhere
+(tokens, sessions, admin log) cost nothing: models whose manager is a
+``CachedQuerySet``, every model reachable from them through forward relations,
+and their own reverse and many-to-many relations. ``connect_invalidation_receivers``
+works the set out from the model graph once the apps are loaded, so every
+process watches the same tables. A queryset reading a table outside it is
+evaluated without caching.
+
+``QuerySet.update()``, ``bulk_create()`` and raw SQL send no signals: call
+``invalidate_model_cache(Model)`` after them.
+"""
+
+from hashlib import md5
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from core.cache_keys import QUERYSET
+from core.cache_tags import invalidate_tags, table_tag
+from core.redis_config import safe_cache_get_or_set
+
+logger = logging.getLogger(__name__)
+
+_watched_tables = frozenset()
+
+
+def _relation_model(model, name):
+    """Model reached from ``model`` through field or reverse accessor ``name``."""
+    try:
+        return model._meta.get_field(name).related_model
+    except FieldDoesNotExist:
+        for relation in model._meta.related_objects:
+            if relation.get_accessor_name() == name:
+                return relation.related_model
+    return None
+
+
+def _prefetch_tables(queryset):
+    tables = set()
+    for lookup in queryset._prefetch_related_lookups:
+        if isinstance(lookup, Prefetch):
+            if lookup.queryset is not None:
+                tables.update(involved_tables(lookup.queryset))
+            lookup = lookup.prefetch_through
+        model = queryset.model
+        for name in lookup.split('__'):
+            model = _relation_model(model, name)
+            if model is None:
+                logger.debug(f"Cannot resolve prefetch '{lookup}' on {queryset.model.__name__} for cache tags")
+                break
+            tables.add(model._meta.db_table)
+    return tables
+
+
+def _compile(queryset):
+    """SQL and params of ``queryset`` plus the tables it reads, without touching the queryset itself."""
+    query = queryset.query.clone()
+    sql, params = query.get_compiler(using=queryset.db).as_sql()
+    tables = {alias.table_name for alias in query.alias_map.values()}
+    tables.add(queryset.model._meta.db_table)
+    return sql, params, tables
+
+
+def involved_tables(queryset):
+    try:
+        _, _, tables = _compile(queryset)
+    except EmptyResultSet:
+        tables = {queryset.model._meta.db_table}
+    return tables | _prefetch_tables(queryset)
+
+
+class CachedQuerySet(models.QuerySet):
+    def cached(self, timeout=None, tags=()):
+        """
+        Evaluate into a list, served from Redis while no involved table has
+        changed. Extra ``tags`` are added to the automatic table tags.
+        """
+        if timeout is None:
+            timeout = settings.CACHE_TIMEOUTS.get('queryset', 300)
+        try:
+            sql, params, tables = _compile(self)
+        except EmptyResultSet:
+            return []
+
+        tables |= _prefetch_tables(self)
+        unwatched = tables - _watched_tables
+        if unwatched:
+            # Writes to these tables would not invalidate the entry
+            logger.warning(
+                f"Not caching {self.model.__name__} queryset: no invalidation receivers for {sorted(unwatched)}"
+            )
+            return list(self._chain())
+
+        signature = repr((sql, params, self._prefetch_related_lookups, self._iterable_class.__name__))
+        key = QUERYSET.key(self.model._meta.label_lower, md5(signature.encode()).hexdigest())
+        return safe_cache_get_or_set(
+            key, lambda: list(self._chain()), timeout,
+            tags=[table_tag(table) for table in sorted(tables)] + list(tags)
+        )
+
+
+CachedManager = models.Manager.from_queryset(CachedQuerySet)
+
+
+def invalidate_model_cache(*model_classes):
+    """Drop every cached queryset that reads any of these models' tables."""
+    invalidate_tags(*[table_tag(model._meta.db_table) for model in model_classes])
+
+
+def _invalidate_on_write(sender, raw=False, **kwargs):
+    if raw:
+        return  # loaddata
+    invalidate_model_cache(sender)
+
+
+def _invalidate_on_m2m_change(sender, action, model, instance, **kwargs):
+    if action.startswith('post_'):
+        invalidate_model_cache(sender, type(instance), model)
+
+
+def _readable_models(model):
+    """Models a cached queryset of ``model`` can join, select or prefetch."""
+    readable = {model}
+    pending = [model]
+    while pending:
+        # Forward relations chain (select_related, filters across foreign keys)
+        current = pending.pop()
+        for field in (*current._meta.fields, *current._meta.many_to_many):
+            if not field.is_relation or field.related_model is None:
+                continue
+            related = [field.related_model]
+            if field.many_to_many:
+                related.append(field.remote_field.through)
+            for related_model in related:
+                if related_model not in readable:
+                    readable.add(related_model)
+                    pending.append(related_model)
+    # One step back: rows of other models pointing at this one (prefetches, reverse filters)
+    for relation in model._meta.related_objects:
+        readable.add(relation.related_model)
+        if relation.many_to_many:
+            readable.add(relation.through)
+    return readable
+
+
+def connect_invalidation_receivers():
+    """Watch every model a ``CachedQuerySet`` can read; call once the app registry is ready."""
+    global _watched_tables
+    watched = set()
+    for model in apps.get_models():
+        if isinstance(model._default_manager.get_queryset(), CachedQuerySet):
+            watched |= _readable_models(model)
+
+    for model in watched:
+        uid = f'queryset_cache:{model._meta.label_lower}'
+        post_save.connect(_invalidate_on_write, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_on_write, sender=model, dispatch_uid=uid)
+        # Sent with the through model as sender
+        m2m_changed.connect(_invalidate_on_m2m_change, sender=model, dispatch_uid=uid)
+    _watched_tables = frozenset(model._meta.db_table for model in watched)
+    logger.debug(f"Cached querysets watch {sorted(_watched_tables)}")
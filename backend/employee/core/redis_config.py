@@ -1,50 +1,479 @@
-import redis
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import random
+import threading
+import time
+import uuid
+
 from django.conf import settings
 import logging
+from core.cache_access import record_access
+from core.cache_metrics import record_cache_op
+from core.circuit_breaker import OPEN, REDIS_OUTAGE_ERRORS, get_redis_breaker
+from core.degraded_cache import degraded_get, degraded_set, discard, remember_invalidation, replay_pending
+from core.local_cache import MISSING, l1_enabled_for, l1_get, l1_store, current_epoch, publish_invalidation
 
 logger = logging.getLogger(__name__)
 
 def get_redis_client():
     """
-    Get Redis client with error handling for small in-house applications.
-    Returns None if Redis is unavailable to allow graceful fallback.
+    Raw Redis client for monitoring and maintenance, sharing django-redis's
+    process-wide connection pool. There is no PING per call: Redis health is
+    tracked lazily by the circuit breaker from the outcome of real commands,
+    and None is returned while it is open so callers can fall back.
     """
-    try:
-        client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-        client.ping()
-        return client
-    except redis.ConnectionError as e:
-        logger.warning(f"Redis connection failed: {e}. Application will continue without caching.")
+    if get_redis_breaker().state == OPEN:
         return None
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
     except Exception as e:
         logger.error(f"Unexpected Redis error: {e}")
         return None
 
 def safe_cache_get(key, default=None):
-    """Safe cache get with fallback"""
+    """
+    Safe cache get with fallback.
+    Keys in ``CACHE_L1['FAMILIES']`` are served from the in-process L1 when possible.
+    While Redis is unreachable the value comes from the degraded-mode cache
+    (``core.degraded_cache``), or ``default`` without touching Redis.
+    """
+    started = time.perf_counter()
+    breaker = get_redis_breaker()
     try:
         from django.core.cache import cache
-        return cache.get(key, default)
+        full_key = None
+        if l1_enabled_for(key):
+            full_key = cache.make_key(key)
+            value = l1_get(full_key)
+            if value is not MISSING:
+                record_access(key, hit=True)
+                record_cache_op(key, 'get', 'l1_hit', started)
+                return value
+            epoch = current_epoch()
+
+        # Until invalidations left over from an outage are replayed, Redis may hold values they cover
+        if replay_pending() or not breaker.allow_request():
+            return _degraded_read(key, default, started)
+        try:
+            value = cache.get(key, MISSING)
+        except Exception as e:
+            breaker.record_error(e)
+            raise
+        breaker.record_success()
+        record_access(key, hit=value is not MISSING)
+        record_cache_op(key, 'get', 'miss' if value is MISSING else 'hit', started)
+        if value is MISSING:
+            return default
+        if full_key is not None:
+            l1_store(full_key, value, epoch)
+        return value
     except Exception as e:
         logger.warning(f"Cache get failed for key {key}: {e}")
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            return _degraded_read(key, default, started)
+        record_cache_op(key, 'get', 'error', started)
         return default
 
-def safe_cache_set(key, value, timeout=300):
-    """Safe cache set with error handling"""
+def _degraded_read(key, default, started):
+    value = degraded_get(key)
+    if value is MISSING:
+        record_cache_op(key, 'get', 'skipped', started)
+        return default
+    record_cache_op(key, 'get', 'degraded_hit', started)
+    return value
+
+def _degraded_write(key, value, timeout, tags, started):
+    """Keep a write Redis could not take in the degraded-mode cache."""
+    stored = degraded_set(key, value, timeout, tags or ())
+    record_cache_op(key, 'set', 'degraded' if stored else 'skipped', started)
+
+def safe_cache_set(key, value, timeout=300, tags=None):
+    """
+    Safe cache set with error handling.
+    ``tags`` registers the key for ``core.cache_tags.invalidate_tags``.
+    While Redis is unreachable the value is kept in the degraded-mode cache.
+    """
+    started = time.perf_counter()
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        _degraded_write(key, value, timeout, tags, started)
+        return False
     try:
-        from django.core.cache import cache
-        cache.set(key, value, timeout)
+        if tags:
+            from core.cache_tags import set_with_tags
+            set_with_tags(key, value, timeout, tags)
+        else:
+            from django.core.cache import cache
+            cache.set(key, value, timeout)
+        _publish_l1_invalidation(key)
+        discard(keys=[key])
+        breaker.record_success()
+        record_cache_op(key, 'set', 'ok', started)
         return True
     except Exception as e:
+        breaker.record_error(e)
         logger.warning(f"Cache set failed for key {key}: {e}")
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            _degraded_write(key, value, timeout, tags, started)
+        else:
+            record_cache_op(key, 'set', 'error', started)
         return False
 
 def safe_cache_delete(key):
-    """Safe cache delete with error handling"""
+    """Safe cache delete with error handling; replayed once Redis is back if it is unreachable"""
+    started = time.perf_counter()
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        remember_invalidation(keys=[key])
+        record_cache_op(key, 'delete', 'deferred', started)
+        return False
     try:
         from django.core.cache import cache
         cache.delete(key)
+        _publish_l1_invalidation(key)
+        discard(keys=[key])
+        breaker.record_success()
+        record_cache_op(key, 'delete', 'ok', started)
         return True
     except Exception as e:
+        breaker.record_error(e)
         logger.warning(f"Cache delete failed for key {key}: {e}")
-        return False
\ No newline at end of file
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            remember_invalidation(keys=[key])
+            record_cache_op(key, 'delete', 'deferred', started)
+        else:
+            record_cache_op(key, 'delete', 'error', started)
+        return False
+
+def _publish_l1_invalidation(*keys):
+    """Other processes may hold the previous value of an L1 key in memory"""
+    from django.core.cache import cache
+    full_keys = [cache.make_key(key) for key in keys if l1_enabled_for(key)]
+    if not full_keys:
+        return
+    from django_redis import get_redis_connection
+    publish_invalidation(get_redis_connection('default'), full_keys)
+
+
+# Batch variants: one Redis round trip for any number of keys, with the same
+# fallback semantics, L1 handling and per-key metrics as the single-key helpers.
+
+def safe_cache_get_many(keys):
+    """
+    Batch ``safe_cache_get``: a dict of the keys found, read with one MGET.
+    L1 keys are served in-process when possible; while Redis is unreachable
+    the rest come from the degraded-mode cache.
+    """
+    from django.core.cache import cache
+
+    started = time.perf_counter()
+    found = {}
+    remaining = []
+    epoch = current_epoch()
+    for key in dict.fromkeys(keys):
+        if l1_enabled_for(key):
+            value = l1_get(cache.make_key(key))
+            if value is not MISSING:
+                found[key] = value
+                record_access(key, hit=True)
+                record_cache_op(key, 'get', 'l1_hit', started)
+                continue
+        remaining.append(key)
+    if not remaining:
+        return found
+
+    breaker = get_redis_breaker()
+    if replay_pending() or not breaker.allow_request():
+        return _degraded_read_many(remaining, found, started)
+    try:
+        values = cache.get_many(remaining)
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache get_many failed for {len(remaining)} keys: {e}")
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            return _degraded_read_many(remaining, found, started)
+        for key in remaining:
+            record_cache_op(key, 'get', 'error', started)
+        return found
+    breaker.record_success()
+
+    for key in remaining:
+        hit = key in values
+        record_access(key, hit=hit)
+        record_cache_op(key, 'get', 'hit' if hit else 'miss', started)
+        if hit:
+            found[key] = values[key]
+            if l1_enabled_for(key):
+                l1_store(cache.make_key(key), values[key], epoch)
+    return found
+
+def _degraded_read_many(keys, found, started):
+    for key in keys:
+        value = _degraded_read(key, MISSING, started)
+        if value is not MISSING:
+            found[key] = value
+    return found
+
+def safe_cache_set_many(entries):
+    """
+    Batch ``safe_cache_set`` of ``(key, value, timeout, tags)`` entries (``tags``
+    may be empty), written with their tag registrations in one pipeline.
+    """
+    started = time.perf_counter()
+    entries = list(entries)
+    if not entries:
+        return True
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        for key, value, timeout, tags in entries:
+            _degraded_write(key, value, timeout, tags, started)
+        return False
+    try:
+        from core.cache_tags import set_many_with_tags
+        set_many_with_tags(entries)
+        keys = [key for key, _, _, _ in entries]
+        _publish_l1_invalidation(*keys)
+        discard(keys=keys)
+        breaker.record_success()
+        outcome = 'ok'
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache set_many failed for {len(entries)} keys: {e}")
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            for key, value, timeout, tags in entries:
+                _degraded_write(key, value, timeout, tags, started)
+            return False
+        outcome = 'error'
+    for key, _, _, _ in entries:
+        record_cache_op(key, 'set', outcome, started)
+    return outcome == 'ok'
+
+def safe_cache_delete_many(keys):
+    """Batch ``safe_cache_delete``: one multi-key DEL."""
+    started = time.perf_counter()
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return True
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        remember_invalidation(keys=keys)
+        for key in keys:
+            record_cache_op(key, 'delete', 'deferred', started)
+        return False
+    try:
+        from django.core.cache import cache
+        cache.delete_many(keys)
+        _publish_l1_invalidation(*keys)
+        discard(keys=keys)
+        breaker.record_success()
+        outcome = 'ok'
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache delete_many failed for {len(keys)} keys: {e}")
+        outcome = 'error'
+        if isinstance(e, REDIS_OUTAGE_ERRORS):
+            remember_invalidation(keys=keys)
+            outcome = 'deferred'
+    for key in keys:
+        record_cache_op(key, 'delete', outcome, started)
+    return outcome == 'ok'
+
+
+# Stampede protection for expensive cached values.
+#
+# ``safe_cache_get_or_set`` stores an envelope carrying the logical expiry and
+# how long the value took to compute. Redis keeps it ``STALE_GRACE`` seconds
+# past that expiry, so while one worker recomputes under a short lock the
+# others serve the previous value instead of all hitting the database. Each
+# read may also refresh early with a probability that grows as expiry nears
+# and with the recompute cost (XFetch), spreading refreshes of popular keys.
+
+_ENVELOPE_MARKER = '__cache_envelope__'
+
+# Delete the lock only if we still own it - it may have expired and been re-taken
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_lock_script = None
+
+
+def _stampede_options():
+    return getattr(settings, 'CACHE_STAMPEDE', {})
+
+
+def _wrap(value, timeout, delta):
+    return {_ENVELOPE_MARKER: 1, 'value': value, 'expires_at': time.time() + timeout, 'delta': delta}
+
+
+def make_envelope(value, timeout, swr=False, delta=0.0):
+    """
+    ``(envelope, redis_timeout)`` for writing a value that ``safe_cache_get_or_set``
+    will read - used to pre-populate keys outside a request, e.g. cache warming.
+    """
+    return _wrap(value, timeout, delta), timeout + _stale_window(swr)
+
+
+def _unwrap(raw):
+    """(value, expires_at, delta) of an envelope, or None for a miss or a plain legacy value."""
+    if isinstance(raw, dict) and raw.get(_ENVELOPE_MARKER) == 1:
+        return raw['value'], raw['expires_at'], raw['delta']
+    return None
+
+
+def _should_refresh(expires_at, delta, beta):
+    """XFetch: true once expired, and occasionally before - earlier for slow-to-compute values."""
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def _acquire_lock(key, ttl):
+    """
+    Take the recompute lock for ``key``. Returns the token to release it with,
+    or None if another worker holds it. If Redis is unreachable everyone computes.
+    """
+    token = uuid.uuid4().hex
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        return token
+    try:
+        from django.core.cache import cache
+        from django_redis import get_redis_connection
+        client = get_redis_connection('default')
+        acquired = client.set(cache.make_key(f'{key}:lock'), token, nx=True, ex=ttl)
+        breaker.record_success()
+        return token if acquired else None
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache lock failed for key {key}: {e}")
+        return token
+
+
+def _release_lock(key, token):
+    global _release_lock_script
+    breaker = get_redis_breaker()
+    if not breaker.allow_request():
+        return
+    try:
+        from django.core.cache import cache
+        from django_redis import get_redis_connection
+        client = get_redis_connection('default')
+        if _release_lock_script is None:
+            _release_lock_script = client.register_script(_RELEASE_LOCK_SCRIPT)
+        _release_lock_script(keys=[cache.make_key(f'{key}:lock')], args=[token], client=client)
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_error(e)
+        logger.warning(f"Cache lock release failed for key {key}: {e}")
+
+
+def _stale_window(swr):
+    options = _stampede_options()
+    return options.get('SWR_STALE_TTL', 600) if swr else options.get('STALE_GRACE', 60)
+
+
+def _recompute(key, compute, timeout, tags, swr=False):
+    started = time.perf_counter()
+    value = compute()
+    record_cache_op(key, 'compute', 'ok', started)
+    envelope, redis_timeout = make_envelope(value, timeout, swr, time.perf_counter() - started)
+    safe_cache_set(key, envelope, redis_timeout, tags=tags)
+    return value
+
+
+_revalidation_pool = None
+_revalidation_pool_pid = None
+_revalidation_pool_lock = threading.Lock()
+
+
+def _get_revalidation_pool():
+    """Per-process pool (a pool inherited across gunicorn's fork has no threads)."""
+    global _revalidation_pool, _revalidation_pool_pid
+    if _revalidation_pool_pid != os.getpid():
+        with _revalidation_pool_lock:
+            if _revalidation_pool_pid != os.getpid():
+                _revalidation_pool = ThreadPoolExecutor(
+                    max_workers=_stampede_options().get('REVALIDATE_WORKERS', 2),
+                    thread_name_prefix='cache-revalidate',
+                )
+                _revalidation_pool_pid = os.getpid()
+    return _revalidation_pool
+
+
+def _revalidate(key, compute, timeout, tags, token):
+    from django.db import close_old_connections, connections
+    try:
+        close_old_connections()
+        _recompute(key, compute, timeout, tags, swr=True)
+    except Exception as e:
+        logger.warning(f"Background revalidation failed for key {key}: {e}")
+    finally:
+        _release_lock(key, token)
+        # Database connections are per thread; don't leave this one open in the pool
+        connections.close_all()
+
+
+def safe_cache_get_or_set(key, compute, timeout, tags=None, swr=False):
+    """
+    Return the cached value of ``key``, calling ``compute()`` on a miss.
+
+    Only one worker at a time recomputes a key. Concurrent callers get the
+    stale value if there is one, otherwise they poll briefly for the winner's
+    result before computing it themselves. ``timeout <= 0`` disables caching.
+
+    With ``swr`` (stale-while-revalidate) ``timeout`` is a soft expiry: for up
+    to ``SWR_STALE_TTL`` seconds after it the stale value is returned at once
+    and the refresh runs on a background thread. ``compute`` must then be safe
+    to call after the request has been answered.
+    """
+    if timeout is not None and timeout <= 0:
+        return compute()
+
+    started = time.perf_counter()
+    options = _stampede_options()
+    envelope = _unwrap(safe_cache_get(key))
+    stale = MISSING
+    if envelope is not None:
+        value, expires_at, delta = envelope
+        if not _should_refresh(expires_at, delta, options.get('BETA', 1.0)):
+            record_cache_op(key, 'get_or_set', 'fresh', started)
+            return value
+        stale = value
+
+    token = _acquire_lock(key, options.get('LOCK_TIMEOUT', 10))
+    if token is not None:
+        if swr and stale is not MISSING:
+            try:
+                _get_revalidation_pool().submit(_revalidate, key, compute, timeout, tags, token)
+                record_cache_op(key, 'get_or_set', 'stale', started)
+                return stale
+            except RuntimeError as e:
+                logger.warning(f"Could not schedule revalidation of {key}, refreshing inline: {e}")
+        try:
+            value = _recompute(key, compute, timeout, tags, swr)
+            record_cache_op(key, 'get_or_set', 'computed', started)
+            return value
+        finally:
+            _release_lock(key, token)
+
+    if stale is not MISSING:
+        record_cache_op(key, 'get_or_set', 'stale', started)
+        return stale
+
+    # Cold key and someone else is computing it: wait for their result
+    deadline = time.monotonic() + options.get('WAIT_TIMEOUT', 2.0)
+    poll_interval = options.get('POLL_INTERVAL', 0.05)
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        envelope = _unwrap(safe_cache_get(key))
+        if envelope is not None:
+            record_cache_op(key, 'get_or_set', 'waited', started)
+            return envelope[0]
+    logger.info(f"Gave up waiting for cache key {key} to be computed, computing it here")
+    value = compute()
+    record_cache_op(key, 'get_or_set', 'wait_timeout', started)
+    return value
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -105,6 +106,11 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# Leave calendar: weekdays that count as working days (Monday=0) and a local
+# file of public holidays (one YYYY-MM-DD per line), see vacation/working_days.py
+WORKING_WEEKDAYS = (0, 1, 2, 3, 4)
+PUBLIC_HOLIDAYS_FILE = os.getenv('PUBLIC_HOLIDAYS_FILE', os.path.join(BASE_DIR, 'holidays.txt'))
+
 # Static files
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
@@ -137,6 +143,8 @@ REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
 REDIS_URL = f"redis://:{REDIS_PASSWORD}@redis:6379/0" if REDIS_PASSWORD else 'redis://redis:6379/0'
 
 # Cache Configuration with connection pooling
+# Redis must evict with a volatile-* maxmemory-policy (docker-compose.yml): cache tag sets
+# carry no TTL and must never be evicted before the keys they track (core/cache_tags.py).
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -149,8 +157,12 @@ CACHES = {
                 'socket_connect_timeout': 5,
                 'socket_timeout': 5,
             },
-            'SERIALIZER': 'django_redis.serializers.pickle.PickleSerializer',
-            'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
+            # msgpack with a pickle fallback, compressed only above a size threshold
+            # (core/cache_serializers.py; compare options with manage.py cache_benchmark)
+            'SERIALIZER': 'core.cache_serializers.MsgpackSerializer',
+            'COMPRESSOR': 'core.cache_serializers.ThresholdCompressor',
+            'COMPRESS_ALGORITHM': os.getenv('CACHE_COMPRESS_ALGORITHM', 'lz4'),
+            'COMPRESS_MIN_LENGTH': int(os.getenv('CACHE_COMPRESS_MIN_LENGTH', '1024')),
         },
         'KEY_PREFIX': 'lafarge_cache',
         'TIMEOUT': 300,  # 5 minutes default timeout
@@ -162,15 +174,97 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
 SESSION_COOKIE_AGE = 86400  # 24 hours
 
+# In-process L1 cache in front of Redis for small, hot key families (core/local_cache.py).
+# Kept coherent across workers and hosts by pub/sub invalidation on CHANNEL.
+CACHE_L1 = {
+    'ENABLED': os.getenv('CACHE_L1_ENABLED', 'True') == 'True',
+    'MAX_ENTRIES': 1000,    # Per process
+    'TTL': 30,              # Seconds; bounds staleness if an invalidation is ever missed
+    'FAMILIES': ['user_profile', 'user_salary', 'employee_salaries', 'report_entry_dates'],
+    'CHANNEL': 'lafarge_cache:l1:invalidate',
+}
+
+# Redis circuit breaker shared by the cache helpers (core/circuit_breaker.py)
+CACHE_CIRCUIT_BREAKER = {
+    'FAILURE_THRESHOLD': 5,     # Consecutive connection failures before Redis is skipped
+    'RECOVERY_TIMEOUT': 30,     # Seconds to skip Redis before probing it again
+    'HALF_OPEN_MAX_CALLS': 1,   # Probe calls allowed while half-open
+}
+
+# Per-process fallback cache used by the cache helpers while Redis is unreachable
+# (core/degraded_cache.py). Invalidations made meanwhile are replayed on recovery.
+CACHE_DEGRADED = {
+    'ENABLED': os.getenv('CACHE_DEGRADED_ENABLED', 'True') == 'True',
+    'MAX_ENTRIES': 500,                 # Per process
+    'MAX_BYTES': 32 * 1024 * 1024,      # Estimated (pickled) size of all entries, per process
+    'MAX_VALUE_BYTES': 1024 * 1024,     # Larger values are not kept
+    'TTL': 60,                          # Seconds; short, as nothing invalidates across processes meanwhile
+    # Invalidations made during an outage, replayed by whichever process reaches Redis first.
+    # Shared by the gunicorn workers of a host; use shared storage if several hosts run the app.
+    'SPOOL_PATH': os.getenv('CACHE_INVALIDATION_SPOOL', '/tmp/lafarge_cache_invalidations.jsonl'),
+    'MAX_SPOOL_BYTES': 4 * 1024 * 1024, # Past this, recovery clears every key family instead
+    'MAX_PENDING_INVALIDATIONS': 10000, # Kept in-process if the spool cannot be written
+    'REPLAY_INTERVAL': 1,               # Seconds between spool checks of each process's replay thread
+}
+
+# Single-flight recomputation and stale-while-revalidate for safe_cache_get_or_set
+CACHE_STAMPEDE = {
+    'LOCK_TIMEOUT': 10,     # Seconds a worker may hold a key's recompute lock
+    'WAIT_TIMEOUT': 2.0,    # Seconds others wait for a cold key before computing it themselves
+    'POLL_INTERVAL': 0.05,
+    'STALE_GRACE': 60,      # Seconds a value outlives its expiry so it can be served while recomputing
+    'BETA': 1.0,            # Early refresh aggressiveness; > 1 refreshes earlier
+    'SWR_STALE_TTL': 60 * 10,   # swr=True: seconds past soft expiry a value is served while refreshing
+    'REVALIDATE_WORKERS': 2,    # Background refresh threads per process
+}
+
+# Cache warming (core/cache_warming.py, manage.py warm_cache)
+CACHE_WARMING = {
+    'BATCH_SIZE': 500,      # Keys written per pipelined round trip
+    'PARALLEL': True,       # Warm resource families concurrently
+    'REPORT_DAYS': 7,       # Days of report entries to warm, today excluded
+}
+
+# Sampled per-family access / per-key miss counters driving the 'hot' warmer (core/cache_access.py)
+CACHE_ACCESS_TRACKING = {
+    'ENABLED': os.getenv('CACHE_ACCESS_TRACKING_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': 0.1,         # Fraction of cache lookups recorded
+    'FLUSH_INTERVAL': 10,       # Seconds between flushes of a process's counters to Redis
+    'WINDOW_DAYS': 3,           # Days of counters kept and ranked
+    'MAX_TRACKED_KEYS': 2000,   # Most-missed keys kept per day
+    'WARM_TOP_N': 50,           # Keys the 'hot' warmer rebuilds per run
+}
+
+# Per-key-family hit/miss/error counts and latency histograms (core/cache_metrics.py)
+CACHE_METRICS = {
+    'ENABLED': os.getenv('CACHE_METRICS_ENABLED', 'True') == 'True',
+    'FLUSH_INTERVAL': 10,       # Seconds between flushes of a process's counters to Redis
+    'LATENCY_BUCKETS_MS': [1, 2, 5, 10, 25, 50, 100, 250, 1000],
+    'RETENTION': 60 * 60 * 24 * 7,  # Seconds flushed metrics are kept after the last update
+}
+
+# SCAN-based keyspace analysis (monitoring endpoints and cache_management analyze)
+CACHE_KEYSPACE_ANALYZER = {
+    'SCAN_COUNT': 500,      # Keys per SCAN batch
+    'MAX_KEYS': 20000,      # Stop after this many keys so a walk stays short
+    'SAMPLE_RATE': 0.05,    # Fraction of keys measured with MEMORY USAGE and TTL
+    'TOP_N': 5,             # Largest keys reported per family
+    'PAUSE': 0,             # Seconds to sleep between batches
+}
+
 # Cache timeout configurations
 CACHE_TIMEOUTS = {
     'user_profile': 60 * 30,        # 30 minutes
     'employee_salaries': 60 * 60,   # 60 minutes  
     'user_salary': 60 * 30,         # 30 minutes
     'vacation_requests': 60 * 10,   # 10 minutes
+    'vacation_calendar': 60 * 60,   # 60 minutes, invalidated on create/status change
+    'vacation_pending_count': 60 * 10,  # 10 minutes, invalidated on create/status change
+    'vacation_summary': 60 * 30,    # 30 minutes, invalidated on create/status change
     'report_current_date': 0,       # No cache
     'report_recent': 60 * 2,        # 2 minutes
     'report_historical': 60 * 60,   # 60 minutes
     'sales_commission': 60 * 30,    # 30 minutes
+    'queryset': 60 * 5,             # 5 minutes, default for QuerySet.cached(), invalidated on model writes
 }
 
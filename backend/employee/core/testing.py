@@ -0,0 +1,101 @@
+"""
+Test support for the cache layer.
+
+``FakeRedisMixin`` points the default cache at an in-memory fakeredis server -
+Lua scripts, pipelines and pub/sub included - so tests exercise the real
+cache code without a Redis server, and resets the state the cache helpers
+keep per process (circuit breaker, degraded cache, L1, counters) around each
+test.
+"""
+
+import copy
+import os
+import tempfile
+import time
+
+import fakeredis
+from django.conf import settings
+from django.test import override_settings
+from django_redis import get_redis_connection
+
+from core import cache_access, cache_metrics, circuit_breaker, degraded_cache, local_cache
+
+FAKE_REDIS_SERVER = fakeredis.FakeServer()
+
+
+def fake_redis_caches():
+    """``settings.CACHES`` with the default cache on ``FAKE_REDIS_SERVER``."""
+    caches = copy.deepcopy(settings.CACHES)
+    default = caches['default']
+    # Its own URL, so django-redis never hands out a pool made for a real server
+    default['LOCATION'] = 'redis://fakeredis:6379/0'
+    options = default.setdefault('OPTIONS', {})
+    options['CONNECTION_POOL_KWARGS'] = {
+        **options.get('CONNECTION_POOL_KWARGS', {}),
+        'connection_class': fakeredis.FakeConnection,
+        'server': FAKE_REDIS_SERVER,
+    }
+    return caches
+
+
+def reset_cache_state():
+    """Forget what the cache helpers remember between calls in this process."""
+    circuit_breaker._redis_breaker = None
+    with degraded_cache._lock:
+        degraded_cache._cache = None
+        degraded_cache._tagged.clear()
+        degraded_cache._pending_tags.clear()
+        degraded_cache._pending_keys.clear()
+        degraded_cache._overflow = False
+        degraded_cache._replay_needed.clear()
+    local_cache._l1 = None
+    with cache_access._lock:
+        cache_access._family_counts.clear()
+        cache_access._missed_keys.clear()
+    with cache_metrics._lock:
+        cache_metrics._pending.clear()
+
+
+class FakeRedisMixin:
+    """
+    Run each test against an empty fakeredis server. ``self.redis`` is the raw
+    client; ``redis_down()`` / ``redis_up()`` simulate an outage. The L1 is off
+    unless a test enables it, and the degraded cache spools to a temporary file.
+    """
+
+    cache_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_path = os.path.join(spool_dir.name, 'invalidations.jsonl')
+        overrides = {
+            'CACHES': fake_redis_caches(),
+            'CACHE_L1': {**settings.CACHE_L1, 'ENABLED': False},
+            'CACHE_DEGRADED': {**settings.CACHE_DEGRADED, 'SPOOL_PATH': self.spool_path, 'REPLAY_INTERVAL': 0.05},
+        }
+        for name, options in self.cache_settings.items():
+            overrides[name] = {**overrides.get(name, getattr(settings, name)), **options}
+        override = override_settings(**overrides)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.redis_up()
+        reset_cache_state()
+        self.addCleanup(reset_cache_state)
+        self.redis = get_redis_connection('default')
+        self.redis.flushall()
+
+    def redis_down(self):
+        FAKE_REDIS_SERVER.connected = False
+
+    def redis_up(self):
+        FAKE_REDIS_SERVER.connected = True
+
+    def wait_until(self, condition, timeout=5.0):
+        """Poll ``condition`` until true, for work done by background threads."""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail(f"Timed out after {timeout}s waiting for {condition}")
+            time.sleep(0.01)
@@ -0,0 +1,828 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+import fcntl
+import json
+import os
+import pickle
+import threading
+import time
+from unittest import mock
+import zlib
+
+import fakeredis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase
+from redis.client import Pipeline, Redis
+
+from core import cache_tags
+from core.cache_access import family_access_stats, flush_access_counts, record_access, top_missed_keys
+from core.cache_keys import (
+    ENVELOPE, USER_PROFILE, VACATION_PENDING_COUNT, VACATION_SUMMARY, KeyFamily, register, schema_version,
+)
+from core.cache_metrics import flush_metrics, get_family_metrics, record_cache_op
+from core.cache_serializers import MsgpackSerializer, ThresholdCompressor
+from core.cache_tags import invalidate_keys, invalidate_tags, set_many_with_tags, set_with_tags, tag_key
+from core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_redis_breaker
+from core.degraded_cache import degraded_get, degraded_stats, replay_invalidations, replay_pending
+from core.keyspace import KeyspaceAnalyzer, _FamilyStats, key_family
+from core.local_cache import MISSING, LocalLRUCache, l1_enabled_for
+from core.redis_config import (
+    _should_refresh, _wrap, get_redis_client, make_envelope, safe_cache_delete_many, safe_cache_get,
+    safe_cache_get_many, safe_cache_get_or_set, safe_cache_set, safe_cache_set_many,
+)
+from core.testing import FAKE_REDIS_SERVER, FakeRedisMixin
+
+
+class InvalidationReplayTest(FakeRedisMixin, SimpleTestCase):
+    """Invalidations made while Redis is unreachable are applied once it is back, before it is read."""
+
+    cache_settings = {'CACHE_CIRCUIT_BREAKER': {'RECOVERY_TIMEOUT': 0.05}}
+
+    def _spool_size(self):
+        return os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+
+    def test_spooled_invalidation_is_replayed_on_recovery(self):
+        key = USER_PROFILE.key(1)
+        safe_cache_set(key, {'name': 'before'}, 60, tags=['user:1'])
+
+        self.redis_down()
+        invalidate_tags('user:1')
+        self.assertGreater(self._spool_size(), 0)
+        self.assertTrue(replay_pending())
+
+        self.redis_up()
+        # Redis still holds the invalidated value until the replay: it must not be served
+        self.assertIsNone(safe_cache_get(key))
+        self.wait_until(lambda: not replay_pending())
+        self.assertFalse(self.redis.exists(cache.make_key(key)))
+        self.assertEqual(self._spool_size(), 0)
+        self.assertIsNone(safe_cache_get(key))
+
+    def test_failed_replay_keeps_spool(self):
+        safe_cache_set(USER_PROFILE.key(1), 'value', 60, tags=['user:1'])
+        self.redis_down()
+        invalidate_tags('user:1')
+        self.assertFalse(replay_invalidations())
+        self.assertGreater(self._spool_size(), 0)
+        self.assertTrue(replay_pending())
+
+    def test_overflow_clears_every_family(self):
+        family_key = USER_PROFILE.key(2)
+        safe_cache_set(family_key, 'value', 60)
+        self.redis.set('unrelated', 'kept')
+
+        with self.settings(CACHE_DEGRADED={**settings.CACHE_DEGRADED, 'MAX_SPOOL_BYTES': 1}):
+            self.redis_down()
+            invalidate_tags('user:1')
+            with open(self.spool_path, encoding='utf-8') as spool:
+                self.assertEqual([json.loads(line) for line in spool], [{'overflow': True}])
+
+            self.redis_up()
+            self.wait_until(lambda: not replay_pending())
+        self.assertFalse(self.redis.exists(cache.make_key(family_key)))
+        self.assertEqual(self.redis.get('unrelated'), b'kept')
+
+    def test_spool_of_another_process_is_replayed_here(self):
+        key = USER_PROFILE.key(3)
+        safe_cache_set(key, 'stale', 60, tags=['user:3'])
+        self.assertEqual(safe_cache_get(key), 'stale')
+
+        # Another worker spooled this during the outage and holds the spool, replaying it
+        with open(self.spool_path, 'a', encoding='utf-8') as spool:
+            spool.write(json.dumps({'tags': ['user:3'], 'keys': []}) + '\n')
+        other = open(self.spool_path, 'a+', encoding='utf-8')
+        self.addCleanup(other.close)
+        fcntl.flock(other, fcntl.LOCK_EX)
+
+        self.wait_until(replay_pending)
+        self.assertFalse(replay_invalidations())
+        self.assertIsNone(safe_cache_get(key))  # from the degraded cache, not Redis
+        self.assertTrue(self.redis.exists(cache.make_key(key)))
+
+        # That worker died before finishing: this one replays the spool itself
+        fcntl.flock(other, fcntl.LOCK_UN)
+        self.wait_until(lambda: not replay_pending())
+        self.assertFalse(self.redis.exists(cache.make_key(key)))
+
+
+class TagInvalidationTest(FakeRedisMixin, SimpleTestCase):
+    """Tags evict every key written under them in one script call, and tell the L1s."""
+
+    def _exists(self, key):
+        return bool(self.redis.exists(cache.make_key(key)))
+
+    def test_invalidating_a_tag_removes_its_keys_and_set(self):
+        set_many_with_tags([('a', 1, 60, ['t1', 't2']), ('b', 2, 60, ['t1']), ('c', 3, 60, ['t2'])])
+        self.assertEqual(cache.get('a'), 1)
+
+        self.assertEqual(invalidate_tags('t1'), 2)
+        self.assertEqual([self._exists(key) for key in 'abc'], [False, False, True])
+        self.assertFalse(self.redis.exists(tag_key('t1')))
+
+        self.assertEqual(invalidate_keys('c'), 1)
+        self.assertFalse(self._exists('c'))
+        self.assertEqual(invalidate_tags('never-used'), 0)
+
+    def test_removed_keys_are_published_to_l1s(self):
+        set_with_tags('a', 1, 60, ['t1'])
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(settings.CACHE_L1['CHANNEL'])
+        pubsub.get_message(timeout=1)
+
+        invalidate_tags('t1')
+        message = pubsub.get_message(timeout=1)
+        self.assertEqual(json.loads(message['data'])['keys'], [cache.make_key('a')])
+        pubsub.close()
+
+    def test_tag_sets_never_expire_and_drop_expired_members(self):
+        set_with_tags('short', 1, 10, ['t1'])
+        set_with_tags('long', 2, 60, ['t1'])
+        self.assertEqual(self.redis.ttl(tag_key('t1')), -1)  # never evicted under volatile-lru
+
+        with mock.patch('core.cache_tags.time.time', return_value=time.time() + 30):
+            set_with_tags('later', 3, 60, ['t1'])
+        members = {member.decode() for member in self.redis.zrange(tag_key('t1'), 0, -1)}
+        self.assertEqual(members, {cache.make_key('long'), cache.make_key('later')})
+
+    def test_zero_timeout_writes_nothing(self):
+        self.assertEqual(set_many_with_tags([('a', 1, 0, ['t1'])]), [])
+        self.assertFalse(self._exists('a'))
+        self.assertFalse(self.redis.exists(tag_key('t1')))
+
+
+class KeyspaceAnalyzerTest(FakeRedisMixin, SimpleTestCase):
+    """Keyspace reports walk Redis with bounded SCANs, never KEYS."""
+
+    def setUp(self):
+        super().setUp()
+        for user_id in range(20):
+            cache.set(USER_PROFILE.key(user_id), 'x' * 100, 600)
+        for day in range(5):
+            cache.set(f'report_{day}', 'y', None)
+        keys = mock.patch.object(self.redis, 'keys', side_effect=AssertionError('KEYS must not be used'))
+        keys.start()
+        self.addCleanup(keys.stop)
+
+    def test_key_family(self):
+        self.assertEqual(key_family(cache.make_key(USER_PROFILE.key(3))), 'user_profile')
+        self.assertEqual(key_family(b'lafarge_cache:1:report_12'), 'report')
+        self.assertEqual(key_family('django.contrib.sessions.cacheabc'), 'session')
+
+    def test_analyze_counts_every_key(self):
+        report = KeyspaceAnalyzer(self.redis, scan_count=7, sample_rate=1.0).analyze()
+        self.assertTrue(report['complete'])
+        self.assertEqual(report['scanned_keys'], 25)
+        self.assertEqual(
+            {family: stats['keys'] for family, stats in report['families'].items()}, {'user_profile': 20, 'report': 5}
+        )
+
+    def test_family_stats_extrapolate_from_samples(self):
+        # fakeredis has no MEMORY USAGE, so samples are fed in directly
+        stats = _FamilyStats()
+        stats.count = 10
+        for index, (size, ttl) in enumerate([(100, 30), (300, 3600 * 2), (200, -1)]):
+            stats.add_sample(f'key{index}', size, ttl, top_n=2)
+        self.assertEqual(stats.as_dict(), {
+            'keys': 10,
+            'sampled': 3,
+            'avg_bytes': 200,
+            'estimated_bytes': 2000,
+            'ttl_distribution': {'<1m': 1, '<1d': 1, 'no_expiry': 1},
+            'largest_keys': [{'key': 'key1', 'bytes': 300}, {'key': 'key2', 'bytes': 200}],
+        })
+
+    def test_walk_stops_at_key_budget(self):
+        report = KeyspaceAnalyzer(self.redis, scan_count=5, max_keys=10, sample_rate=0).analyze()
+        self.assertFalse(report['complete'])
+        self.assertLess(report['scanned_keys'], 25)
+        self.assertEqual(KeyspaceAnalyzer(self.redis, scan_count=5).count_families(), {'user_profile': 20, 'report': 5})
+
+    def test_delete_matching_only_touches_the_pattern(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(settings.CACHE_L1['CHANNEL'])
+        pubsub.get_message(timeout=1)
+
+        deleted, examples = KeyspaceAnalyzer(self.redis, match=cache.make_key('report_*'), scan_count=2).delete_matching()
+        self.assertEqual(deleted, 5)
+        self.assertEqual(len(examples), 5)
+        self.assertEqual(KeyspaceAnalyzer(self.redis).count_families(), {'user_profile': 20})
+        published = json.loads(pubsub.get_message(timeout=1)['data'])['keys']
+        self.assertTrue(all(key.startswith(cache.make_key('report_')) for key in published))
+        pubsub.close()
+
+
+class LocalLRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRUCache(max_entries=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual([lru.get(key) for key in 'abc'], [1, MISSING, 3])
+
+    def test_expires_and_bounds_bytes(self):
+        lru = LocalLRUCache(max_entries=10, ttl=60, max_bytes=10)
+        lru.set('gone', 1, ttl=0)
+        self.assertIs(lru.get('gone'), MISSING)
+        lru.set('a', 1, size=6)
+        lru.set('b', 2, size=6)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.size), (MISSING, 2, 6))
+        lru.delete_many(['b'])
+        self.assertEqual((len(lru), lru.size), (0, 0))
+
+
+class L1CacheTest(FakeRedisMixin, SimpleTestCase):
+    """Hot families are served in-process and dropped everywhere on any invalidation."""
+
+    cache_settings = {'CACHE_L1': {'ENABLED': True}}
+
+    def setUp(self):
+        super().setUp()
+        subscriber = mock.patch(
+            'core.local_cache._subscriber_client', lambda: fakeredis.FakeRedis(server=FAKE_REDIS_SERVER)
+        )
+        subscriber.start()
+        self.addCleanup(subscriber.stop)
+        self.key = USER_PROFILE.key(1)
+        self.full_key = cache.make_key(self.key)
+        self.wait_until(lambda: l1_enabled_for(self.key))
+
+    def _fill(self, value):
+        safe_cache_set(self.key, value, 60, tags=['user:1'])
+        self.assertEqual(safe_cache_get(self.key), value)
+        # Gone from Redis, yet still served: the read came from L1
+        self.redis.delete(self.full_key)
+        self.assertEqual(safe_cache_get(self.key), value)
+
+    def test_only_l1_families_are_kept(self):
+        self.assertFalse(l1_enabled_for('vacation_requests:v1:all:-'))
+
+    def test_other_process_invalidation_drops_entry(self):
+        self._fill('before')
+        self.redis.publish(settings.CACHE_L1['CHANNEL'], json.dumps({'origin': 'other', 'keys': [self.full_key]}))
+        self.wait_until(lambda: safe_cache_get(self.key) is None)
+
+    def test_tag_invalidation_drops_entry(self):
+        self._fill('before')
+        # Dropped here at once, not when the published message comes back
+        with mock.patch('core.local_cache._handle_message'):
+            invalidate_tags('user:1')
+            self.assertIsNone(safe_cache_get(self.key))
+
+    def test_overwrite_is_visible_at_once(self):
+        self._fill('before')
+        safe_cache_set(self.key, 'after', 60)
+        self.assertEqual(safe_cache_get(self.key), 'after')
+
+
+class SingleFlightTest(FakeRedisMixin, SimpleTestCase):
+    """One worker recomputes a key; the others get its result or the stale value."""
+
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def _compute(self, value='fresh', delay=0):
+        def compute():
+            with self.calls_lock:
+                self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_concurrent_misses_compute_once(self):
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(safe_cache_get_or_set('expensive', self._compute(delay=0.3), 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(self.calls, 1)
+
+        self.assertEqual(safe_cache_get_or_set('expensive', self._compute('other'), 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_another_worker_recomputes(self):
+        cache.set('expensive', _wrap('stale', -1, 0.0), 60)
+        cache.set('expensive:lock', 'someone-else', 10)
+        self.assertEqual(safe_cache_get_or_set('expensive', self._compute(), 60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_value_is_recomputed(self):
+        cache.set('expensive', _wrap('stale', -1, 0.0), 60)
+        self.assertEqual(safe_cache_get_or_set('expensive', self._compute(), 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get('expensive:lock'))
+
+    def test_zero_timeout_is_not_cached(self):
+        safe_cache_get_or_set('uncached', self._compute(), 0)
+        safe_cache_get_or_set('uncached', self._compute(), 0)
+        self.assertEqual(self.calls, 2)
+        self.assertIsNone(cache.get('uncached'))
+
+    def test_xfetch_refreshes_slow_values_early(self):
+        now = time.time()
+        self.assertTrue(_should_refresh(now - 1, 0.0, 1.0))
+        self.assertFalse(_should_refresh(now + 60, 0.0, 1.0))
+        # Ten seconds before expiry: a 0.01s computation waits, a 5s one is likely refreshed
+        with mock.patch('core.redis_config.random.random', return_value=0.9):
+            self.assertFalse(_should_refresh(now + 10, 0.01, 1.0))
+            self.assertTrue(_should_refresh(now + 10, 5.0, 1.0))
+
+
+class StaleWhileRevalidateTest(FakeRedisMixin, SimpleTestCase):
+    """Past its soft expiry a value is served at once and refreshed in the background."""
+
+    def test_stale_value_returned_and_refreshed_in_background(self):
+        envelope, redis_timeout = make_envelope('stale', 60, swr=True)
+        self.assertEqual(redis_timeout, 60 + settings.CACHE_STAMPEDE['SWR_STALE_TTL'])
+        cache.set('report', _wrap('stale', -1, 0.0), redis_timeout)
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.wait(5)
+            return 'fresh'
+
+        self.assertEqual(safe_cache_get_or_set('report', compute, 60, swr=True), 'stale')
+        refreshed.set()
+        self.wait_until(lambda: safe_cache_get_or_set('report', compute, 60, swr=True) == 'fresh')
+        self.wait_until(lambda: cache.get('report:lock') is None)
+
+    def test_cold_key_is_computed_inline(self):
+        self.assertEqual(safe_cache_get_or_set('report', lambda: 'fresh', 60, swr=True), 'fresh')
+        self.assertGreater(cache.ttl('report'), 60)
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """Closed -> open after repeated failures -> half-open probes -> closed or open."""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('core.circuit_breaker.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.transitions = []
+        self.breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30, half_open_max_calls=2)
+        self.breaker.add_listener(lambda old, new: self.transitions.append((old, new)))
+
+    def _open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.transitions, [(CLOSED, OPEN)])
+        self.assertEqual(self.breaker.snapshot()['retry_in_seconds'], 30)
+
+    def test_half_open_allows_limited_probes(self):
+        self._open()
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 1
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_successful_probe_closes(self):
+        self._open()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.transitions, [(CLOSED, OPEN), (HALF_OPEN, CLOSED)])
+        self.assertEqual(self.breaker.snapshot()['consecutive_failures'], 0)
+
+    def test_failed_probe_reopens_for_another_cooldown(self):
+        self._open()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_only_outage_errors_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.record_error(ValueError('bad value'))
+        self.assertEqual(self.breaker.state, CLOSED)
+        for _ in range(3):
+            self.breaker.record_error(ConnectionError('refused'))
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_failing_listener_does_not_break_transitions(self):
+        self.breaker.add_listener(mock.Mock(side_effect=RuntimeError('boom')))
+        self._open()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.transitions, [(CLOSED, OPEN)])
+
+
+class CacheHelpersBreakerTest(FakeRedisMixin, SimpleTestCase):
+    """The cache helpers stop calling Redis once the breaker opens."""
+
+    cache_settings = {'CACHE_CIRCUIT_BREAKER': {'FAILURE_THRESHOLD': 2}}
+
+    def test_open_breaker_skips_redis(self):
+        self.redis_down()
+        self.assertIsNone(safe_cache_get('report'))
+        self.assertIsNone(safe_cache_get('report'))
+        self.assertEqual(get_redis_breaker().state, OPEN)
+
+        self.redis_up()
+        cache.set('report', 'in-redis')
+        self.assertEqual(safe_cache_get('report', 'default'), 'default')
+        self.assertFalse(safe_cache_set('report', 'new', 60))
+        self.assertEqual(cache.get('report'), 'in-redis')
+
+
+class RedisClientTest(FakeRedisMixin, SimpleTestCase):
+    def test_client_shares_the_cache_connection_pool(self):
+        client = get_redis_client()
+        self.assertIs(client.connection_pool, cache.client.get_client().connection_pool)
+        cache.set('shared', 1)
+        self.assertTrue(client.exists(cache.make_key('shared')))
+
+    def test_no_client_while_breaker_is_open(self):
+        breaker = get_redis_breaker()
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertIsNone(get_redis_client())
+        breaker.record_success()
+        self.assertIsNotNone(get_redis_client())
+
+
+class AccessTrackingTest(FakeRedisMixin, SimpleTestCase):
+    """Sampled lookups are counted in-process and flushed to daily buckets in Redis."""
+
+    cache_settings = {'CACHE_ACCESS_TRACKING': {'SAMPLE_RATE': 1.0, 'FLUSH_INTERVAL': 3600}}
+
+    def setUp(self):
+        super().setUp()
+        import core.cache_warming  # noqa: F401 - registers the user_profile rebuilder
+
+    def test_lookups_are_counted_per_family(self):
+        cache.set(USER_PROFILE.key(1), {'username': 'a'})
+        safe_cache_get(USER_PROFILE.key(1))
+        safe_cache_get(USER_PROFILE.key(2))
+        safe_cache_get(USER_PROFILE.key(2))
+        self.assertEqual(self.redis.keys('*cache_access*'), [])
+
+        flush_access_counts()
+        stats = family_access_stats()
+        self.assertEqual(stats['families']['user_profile'], {'hits': 1, 'misses': 2, 'hit_ratio': 33.33})
+
+    def test_most_missed_keys_with_a_rebuilder(self):
+        for key, misses in ((USER_PROFILE.key(1), 1), (USER_PROFILE.key(2), 3), ('unregistered:key', 5)):
+            for _ in range(misses):
+                record_access(key, hit=False)
+        self.assertEqual(top_missed_keys(), [USER_PROFILE.key(2), USER_PROFILE.key(1)])
+        self.assertEqual(top_missed_keys(limit=1), [USER_PROFILE.key(2)])
+
+    def test_sampling_and_disabling(self):
+        with self.settings(CACHE_ACCESS_TRACKING={**settings.CACHE_ACCESS_TRACKING, 'SAMPLE_RATE': 0.0}):
+            record_access(USER_PROFILE.key(1), hit=False)
+        with self.settings(CACHE_ACCESS_TRACKING={**settings.CACHE_ACCESS_TRACKING, 'ENABLED': False}):
+            record_access(USER_PROFILE.key(1), hit=False)
+        self.assertEqual(top_missed_keys(), [])
+
+
+class CacheSerializationTest(FakeRedisMixin, SimpleTestCase):
+    """msgpack with a pickle fallback for other types, compression above a threshold."""
+
+    def setUp(self):
+        super().setUp()
+        self.serializer = MsgpackSerializer({})
+
+    def test_values_round_trip_exactly(self):
+        values = [
+            {'date': date(2024, 5, 1), 'salary': Decimal('123.45'), 'days': (1, 2), 'ids': {3}},
+            [OrderedDict(a=1), 'text', b'bytes', None, 1.5],
+            {1: 'int keys'},
+        ]
+        for value in values:
+            data = self.serializer.dumps(value)
+            self.assertEqual(data[:1], b'\xc1')
+            loaded = self.serializer.loads(data)
+            self.assertEqual(loaded, value)
+            self.assertEqual(type(loaded), type(value))
+
+    def test_pickled_values_still_readable(self):
+        self.assertEqual(self.serializer.loads(pickle.dumps({'legacy': 1})), {'legacy': 1})
+
+    def test_compression_threshold(self):
+        compressor = ThresholdCompressor({'COMPRESS_MIN_LENGTH': 100, 'COMPRESS_ALGORITHM': 'lz4'})
+        self.assertEqual(compressor.algorithm, 'lz4')
+        small, large = b'x' * 99, b'x' * 1000
+        self.assertEqual(compressor.compress(small), b'\x00' + small)
+        compressed = compressor.compress(large)
+        self.assertEqual(compressed[:1], b'\x02')
+        self.assertLess(len(compressed), len(large))
+        self.assertEqual(compressor.decompress(compressed), large)
+        self.assertEqual(compressor.decompress(compressor.compress(small)), small)
+        # Written by django-redis's ZlibCompressor
+        self.assertEqual(compressor.decompress(zlib.compress(large)), large)
+
+    def test_unavailable_algorithm_falls_back_to_zlib(self):
+        self.assertEqual(ThresholdCompressor({'COMPRESS_ALGORITHM': 'brotli'}).algorithm, 'zlib')
+
+    def test_cache_round_trip(self):
+        value = {'entries': [{'date': date(2024, 5, 1), 'notes': 'n' * 2000}]}
+        cache.set('large', value)
+        self.assertEqual(self.redis.get(cache.make_key('large'))[:1], b'\x02')
+        self.assertEqual(cache.get('large'), value)
+
+
+class CacheMetricsTest(FakeRedisMixin, SimpleTestCase):
+    """Operations are aggregated per key family in-process and flushed in one batch."""
+
+    cache_settings = {'CACHE_METRICS': {'FLUSH_INTERVAL': 3600}}
+
+    def test_outcomes_per_family(self):
+        safe_cache_set(USER_PROFILE.key(1), {'username': 'a'}, 60)
+        safe_cache_get(USER_PROFILE.key(1))
+        safe_cache_get(USER_PROFILE.key(2))
+        safe_cache_get(VACATION_PENDING_COUNT.key())
+        self.assertEqual(self.redis.keys('*cache_metrics*'), [])
+
+        metrics = get_family_metrics()
+        self.assertEqual(set(metrics), {'user_profile', 'vacation_pending_count'})
+        profile = metrics['user_profile']
+        self.assertEqual(profile['set']['ok'], 1)
+        self.assertEqual((profile['get']['hit'], profile['get']['miss'], profile['get']['count']), (1, 1, 2))
+        self.assertEqual(profile['get']['hit_ratio'], 50.0)
+        self.assertEqual(metrics['vacation_pending_count']['get']['hit_ratio'], 0)
+
+    def test_latency_histogram(self):
+        now = time.perf_counter()
+        for elapsed in (0.0005, 0.0005, 0.003, 0.04):
+            record_cache_op('report_entries_date:v1:x', 'get', 'hit', now - elapsed)
+        get = get_family_metrics()['report_entries_date']['get']
+        self.assertEqual(get['latency_histogram_ms'], {'1': 2, '5': 1, '50': 1})
+        self.assertEqual((get['p50_le_ms'], get['p95_le_ms']), ('1', '50'))
+        self.assertGreater(get['avg_ms'], 10)
+
+    def test_flushes_accumulate(self):
+        record_cache_op(USER_PROFILE.key(1), 'get', 'miss', time.perf_counter())
+        flush_metrics()
+        record_cache_op(USER_PROFILE.key(1), 'get', 'miss', time.perf_counter())
+        self.assertEqual(get_family_metrics()['user_profile']['get']['miss'], 2)
+        self.assertGreater(self.redis.ttl(cache.make_key('cache_metrics:user_profile')), 0)
+
+    def test_disabled(self):
+        with self.settings(CACHE_METRICS={**settings.CACHE_METRICS, 'ENABLED': False}):
+            safe_cache_get(USER_PROFILE.key(1))
+        self.assertEqual(get_family_metrics(), {})
+
+
+class InvalidationBatchingTest(FakeRedisMixin, TransactionTestCase):
+    """Invalidations made in a transaction are flushed once, on commit."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('a', 'b', 'c'):
+            set_with_tags(f'key-{name}', name, 60, [f'tag-{name}'])
+        patcher = mock.patch('core.cache_tags.run_invalidation', wraps=cache_tags.run_invalidation)
+        self.run_invalidation = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cached(self):
+        return [name for name in ('a', 'b', 'c') if cache.get(f'key-{name}') is not None]
+
+    def test_outside_a_transaction_invalidates_at_once(self):
+        self.assertEqual(invalidate_tags('tag-a'), 1)
+        self.assertEqual(self._cached(), ['b', 'c'])
+
+    def test_nested_atomics_flush_once_on_commit(self):
+        with transaction.atomic():
+            self.assertEqual(invalidate_tags('tag-a'), 0)
+            with transaction.atomic():
+                invalidate_tags('tag-b', 'tag-a')
+                invalidate_keys('key-c')
+            self.assertEqual(self._cached(), ['a', 'b', 'c'])
+            self.run_invalidation.assert_not_called()
+        self.assertEqual(self._cached(), [])
+        self.run_invalidation.assert_called_once_with(['tag-a', 'tag-b'], ['key-c'])
+
+    def test_rollback_flushes_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                invalidate_tags('tag-a')
+                raise RuntimeError
+        self.run_invalidation.assert_not_called()
+        self.assertEqual(self._cached(), ['a', 'b', 'c'])
+
+    def test_batch_from_rolled_back_savepoint_is_dropped(self):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    invalidate_tags('tag-a')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            invalidate_tags('tag-b')
+        self.run_invalidation.assert_called_once_with(['tag-b'], [])
+        self.assertEqual(self._cached(), ['a', 'c'])
+
+    def test_next_transaction_starts_a_new_batch(self):
+        for tag in ('tag-a', 'tag-b'):
+            with transaction.atomic():
+                invalidate_tags(tag)
+        self.assertEqual(self.run_invalidation.call_count, 2)
+        self.assertEqual(self._cached(), ['c'])
+
+
+class BatchHelpersTest(FakeRedisMixin, SimpleTestCase):
+    """The batch helpers make one Redis round trip for any number of keys."""
+
+    @contextmanager
+    def _round_trips(self):
+        calls = []
+        execute_command, execute = Redis.execute_command, Pipeline.execute
+
+        def count_command(client, *args, **kwargs):
+            if not isinstance(client, Pipeline):
+                calls.append(args[0])
+            return execute_command(client, *args, **kwargs)
+
+        def count_pipeline(pipeline, *args, **kwargs):
+            calls.append('pipeline')
+            return execute(pipeline, *args, **kwargs)
+
+        with mock.patch.object(Redis, 'execute_command', count_command), \
+                mock.patch.object(Pipeline, 'execute', count_pipeline):
+            yield calls
+
+    def test_get_many(self):
+        for name in ('a', 'b', 'c'):
+            cache.set(name, name.upper())
+        with self._round_trips() as calls:
+            found = safe_cache_get_many(['a', 'b', 'missing', 'a', 'c'])
+        self.assertEqual(found, {'a': 'A', 'b': 'B', 'c': 'C'})
+        self.assertEqual(calls, ['MGET'])
+        self.assertEqual(safe_cache_get_many([]), {})
+
+    def test_set_many_with_tags(self):
+        entries = [(f'key-{i}', i, 60, ['even' if i % 2 == 0 else 'odd']) for i in range(10)]
+        entries.append(('untagged', 'value', 60, []))
+        with self._round_trips() as calls:
+            self.assertTrue(safe_cache_set_many(entries))
+        self.assertEqual(calls, ['pipeline'])
+        self.assertEqual(cache.get('key-3'), 3)
+        self.assertTrue(0 < cache.ttl('untagged') <= 60)
+
+        invalidate_tags('even')
+        self.assertEqual(sorted(safe_cache_get_many([f'key-{i}' for i in range(10)]).values()), [1, 3, 5, 7, 9])
+
+    def test_delete_many(self):
+        for name in ('a', 'b', 'c'):
+            cache.set(name, name)
+        with self._round_trips() as calls:
+            self.assertTrue(safe_cache_delete_many(['a', 'b', 'a']))
+        self.assertEqual(calls, ['DEL'])
+        self.assertEqual(safe_cache_get_many(['a', 'b', 'c']), {'c': 'c'})
+
+    def test_degraded_while_redis_is_down(self):
+        self.redis_down()
+        self.assertFalse(safe_cache_set_many([('a', 1, 60, ['tag']), ('b', 2, 60, [])]))
+        self.assertEqual(safe_cache_get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertFalse(safe_cache_delete_many(['a']))
+        self.assertIs(degraded_get('a'), MISSING)
+        self.assertEqual(safe_cache_get_many(['a', 'b']), {'b': 2})
+
+
+class KeyFamilyTest(FakeRedisMixin, SimpleTestCase):
+    """Keys are ``<family>:v<version>:<parts>``; bumping the version orphans the old ones."""
+
+    def test_key_format_and_parsing(self):
+        self.assertEqual(VACATION_SUMMARY.key(7, 2024), 'vacation_summary:v1:7:2024')
+        self.assertEqual(VACATION_PENDING_COUNT.key(), 'vacation_pending_count:v1')
+        self.assertEqual(VACATION_SUMMARY.parse('vacation_summary:v1:7:2024'), {'profile_id': '7', 'year': '2024'})
+        self.assertIsNone(VACATION_SUMMARY.parse('vacation_summary:v0:7:2024'))
+        self.assertIsNone(VACATION_SUMMARY.parse('vacation_summary:v1:7'))
+        self.assertIsNone(VACATION_SUMMARY.parse('user_profile:v1:7:2024'))
+        with self.assertRaises(ValueError):
+            VACATION_SUMMARY.key(7)
+
+    def test_last_part_may_contain_colons(self):
+        family = KeyFamily('report_test', 1, ('date', 'rest'), 'test')
+        key = family.key('2024-05-01', 'a:b')
+        self.assertEqual(family.parse(key), {'date': '2024-05-01', 'rest': 'a:b'})
+
+    def test_schema_version(self):
+        self.assertEqual(schema_version(cache.make_key(USER_PROFILE.key(3))), ('user_profile', 'v1'))
+        self.assertEqual(schema_version(b'user_profile:3'), ('user_profile', None))
+
+    def test_version_bump(self):
+        current = KeyFamily('versioned', 1, ('id',), 'test')
+        bumped = KeyFamily('versioned', 2, ('id',), 'test')
+        cache.set(current.key(1), 'old')
+        self.assertIsNone(cache.get(bumped.key(1)))
+        self.assertIsNone(bumped.parse(current.key(1)))
+
+        cache.set(bumped.key(1), 'new')
+        cache.set('versioned_other:v1:1', 'unrelated')
+
+        def scan(pattern):
+            return sorted(key.decode() for key in self.redis.scan_iter(match=pattern))
+
+        self.assertEqual(scan(bumped.match()), [cache.make_key(current.key(1)), cache.make_key(bumped.key(1))])
+        self.assertEqual(scan(bumped.match(all_versions=False)), [cache.make_key(bumped.key(1))])
+
+    def test_entries_use_the_family_format(self):
+        key, value, timeout, tags = VACATION_SUMMARY.entry(VACATION_SUMMARY.key(1, 2024), {'x': 1}, 60, ('t',))
+        self.assertEqual((value, timeout, tags), ({'x': 1}, 60, ['t']))
+
+        enveloped = KeyFamily('enveloped', 1, ('id',), 'test', ENVELOPE)
+        _, value, timeout, _ = enveloped.entry(enveloped.key(1), {'x': 1}, 60, swr=True)
+        cache.set(enveloped.key(1), value, timeout)
+        self.assertEqual(safe_cache_get_or_set(enveloped.key(1), lambda: self.fail('recomputed'), 60), {'x': 1})
+        with self.assertRaises(ValueError):
+            enveloped.entry('enveloped:v0:1', {}, 60)
+
+    def test_names_are_registered_once(self):
+        with self.assertRaises(ValueError):
+            register('user_profile', 2, ('user_id',), 'duplicate')
+
+
+class DegradedModeTest(FakeRedisMixin, SimpleTestCase):
+    """While Redis is unreachable the cache helpers read and write a bounded local cache."""
+
+    cache_settings = {
+        'CACHE_CIRCUIT_BREAKER': {'FAILURE_THRESHOLD': 1},
+        'CACHE_DEGRADED': {'MAX_VALUE_BYTES': 1024},
+    }
+
+    def test_reads_and_writes_stay_local(self):
+        self.redis_down()
+        self.assertFalse(safe_cache_set(USER_PROFILE.key(1), {'username': 'a'}, 300))
+        self.assertEqual(get_redis_breaker().state, OPEN)
+        self.assertEqual(safe_cache_get(USER_PROFILE.key(1)), {'username': 'a'})
+        self.assertEqual(safe_cache_get(USER_PROFILE.key(2), 'default'), 'default')
+        self.assertEqual(degraded_stats()['entries'], 1)
+
+    def test_computed_values_are_kept_locally(self):
+        self.redis_down()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'value'
+
+        self.assertEqual(safe_cache_get_or_set('expensive', compute, 60), 'value')
+        self.assertEqual(safe_cache_get_or_set('expensive', compute, 60), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_local_entries_are_bounded(self):
+        self.redis_down()
+        safe_cache_set('large', 'x' * 2048, 300)
+        safe_cache_set('uncached', 'value', 0)
+        self.assertIs(degraded_get('large'), MISSING)
+        self.assertIs(degraded_get('uncached'), MISSING)
+        safe_cache_set('short', 'value', 300)
+        # Kept for CACHE_DEGRADED['TTL'] (60s), not the 300s asked for
+        with mock.patch('core.local_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIs(degraded_get('short'), MISSING)
+
+    def test_outage_invalidations_drop_local_entries(self):
+        self.redis_down()
+        safe_cache_set('tagged', 'value', 300, tags=['tag'])
+        invalidate_tags('tag')
+        self.assertIsNone(safe_cache_get('tagged'))
+        self.assertEqual(degraded_stats()['pending_invalidations']['replay_pending'], True)
+
+    def test_recovery_drops_local_copies(self):
+        self.redis_down()
+        safe_cache_set('key', 'outage copy', 300)
+        self.redis_up()
+        cache.set('key', 'in-redis')
+        get_redis_breaker().record_success()
+        self.assertIs(degraded_get('key'), MISSING)
+        self.assertEqual(safe_cache_get('key'), 'in-redis')
+
+    def test_disabled(self):
+        with self.settings(CACHE_DEGRADED={**settings.CACHE_DEGRADED, 'ENABLED': False}):
+            self.redis_down()
+            safe_cache_set('key', 'value', 300)
+            self.assertIsNone(safe_cache_get('key'))
+            self.assertFalse(replay_pending())
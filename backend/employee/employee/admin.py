@@ -1,9 +1,22 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import EmployeeProfile
+from vacation.ledger import set_leave_balance
 
 class EmployeeProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'role', 'base_salary', 'is_active']  # Display user, role, base_salary, and is_active
     search_fields = ['user__username', 'user__first_name', 'user__last_name']  # Allow search by username, first name, or last name
     list_filter = ['role', 'is_active']  # Add filters for role and active status
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Balance edits go through the ledger; the other columns are saved on their own
+        fields = [name for name in form.changed_data if name != 'annual_leave_days']
+        with transaction.atomic():
+            if fields:
+                obj.save(update_fields=fields)
+            if 'annual_leave_days' in form.changed_data:
+                set_leave_balance(obj.pk, obj.annual_leave_days)
+
 admin.site.register(EmployeeProfile, EmployeeProfileAdmin)
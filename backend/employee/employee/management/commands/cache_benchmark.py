@@ -0,0 +1,133 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django_redis.serializers.pickle import PickleSerializer
+
+from core.cache_keys import USER_PROFILE
+from core.cache_serializers import MsgpackSerializer, ThresholdCompressor, available_codecs
+from core.keyspace import KeyspaceAnalyzer, key_family
+from core.redis_config import get_redis_client
+
+
+class Command(BaseCommand):
+    help = 'Compare cache serializers and compressors on real cached payloads (size and encode/decode latency)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Encode/decode rounds per payload and codec (default 200)'
+        )
+        parser.add_argument(
+            '--min-length',
+            type=int,
+            action='append',
+            help='Compression threshold in bytes to try (repeatable, default 0 and 1024)'
+        )
+        parser.add_argument(
+            '--live-keys',
+            type=int,
+            default=20,
+            help='Also sample up to this many values per key family from Redis (0 to skip)'
+        )
+
+    def handle(self, *args, **options):
+        payloads = self.build_payloads()
+        if options['live_keys']:
+            payloads.update(self.sample_live_payloads(options['live_keys']))
+        if not payloads:
+            self.stdout.write(self.style.WARNING('No payloads to benchmark - is there any data?'))
+            return
+
+        serializers = {'pickle': PickleSerializer({}), 'msgpack': MsgpackSerializer({})}
+        compressors = {'none': None}
+        for threshold in options['min_length'] or [0, 1024]:
+            for algorithm in available_codecs():
+                compressors[f'{algorithm}>={threshold}'] = ThresholdCompressor({
+                    'COMPRESS_ALGORITHM': algorithm, 'COMPRESS_MIN_LENGTH': threshold,
+                })
+
+        for name, values in payloads.items():
+            self.stdout.write(self.style.SUCCESS(f'\n{name} ({len(values)} values)'))
+            self.stdout.write(f"  {'codec':<28} {'avg bytes':>10} {'encode µs':>10} {'decode µs':>10}")
+            for serializer_name, serializer in serializers.items():
+                for compressor_name, compressor in compressors.items():
+                    size, encode, decode = self.measure(values, serializer, compressor, options['iterations'])
+                    self.stdout.write(
+                        f"  {serializer_name + '+' + compressor_name:<28} {size:>10.0f} {encode:>10.1f} {decode:>10.1f}"
+                    )
+
+    def build_payloads(self):
+        """The shapes the views cache, built from the current database"""
+        from employee.models import EmployeeProfile
+        from employee.serializers import EmployeeProfileSerializer
+        from report.models import ReportEntry
+        from report.serializers import ReportEntrySerializer
+        from core.cache_warming import _user_entries
+        from django.contrib.auth.models import User
+
+        payloads = {}
+        dates = list(ReportEntry.objects.values_list('date', flat=True).distinct().order_by('-date')[:10])
+        if dates:
+            entries = ReportEntry.objects.select_related('salesman').filter(date__in=dates)
+            by_date = {}
+            for item in ReportEntrySerializer(entries, many=True).data:
+                by_date.setdefault(item['date'], []).append(item)
+            payloads['report_entries_date (serialized report lists)'] = list(by_date.values())
+
+        profiles = EmployeeProfile.objects.select_related('user').filter(is_active=True)
+        if profiles:
+            payloads['employee_salaries (salary list)'] = [EmployeeProfileSerializer(profiles, many=True).data]
+
+        user_values = [value for user in User.objects.select_related('profile')[:50]
+                       for key, value, _, _ in _user_entries(user) if USER_PROFILE.parse(key)]
+        if user_values:
+            payloads['user_profile (small dicts)'] = user_values
+        return payloads
+
+    def sample_live_payloads(self, per_family):
+        """Decoded values currently in Redis, grouped by key family"""
+        client = get_redis_client()
+        if client is None:
+            return {}
+        prefix = cache.make_key('')
+        samples = {}
+        for keys, _ in KeyspaceAnalyzer(client, match=f'{prefix}*').iter_batches():
+            for key in keys:
+                family = key_family(key)
+                if family in ('tag', 'cache_access', 'session') or len(samples.get(family, [])) >= per_family:
+                    continue
+                try:
+                    raw = client.get(key)
+                    if raw is not None:
+                        samples.setdefault(family, []).append(cache.client.decode(raw))
+                except Exception:
+                    continue  # not a cache value (tag set, lock token...)
+        return {f'live {family}': values for family, values in samples.items()}
+
+    @staticmethod
+    def measure(values, serializer, compressor, iterations):
+        def encode(value):
+            data = serializer.dumps(value)
+            return compressor.compress(data) if compressor else data
+
+        def decode(data):
+            return serializer.loads(compressor.decompress(data) if compressor else data)
+
+        encoded = [encode(value) for value in values]
+        encode_times, decode_times = [], []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            for value in values:
+                encode(value)
+            encode_times.append((time.perf_counter() - started) / len(values))
+            started = time.perf_counter()
+            for data in encoded:
+                decode(data)
+            decode_times.append((time.perf_counter() - started) / len(values))
+
+        size = sum(len(data) for data in encoded) / len(encoded)
+        return size, statistics.median(encode_times) * 1e6, statistics.median(decode_times) * 1e6
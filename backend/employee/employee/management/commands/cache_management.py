@@ -3,6 +3,9 @@ from django.core.cache import cache
 from core.cache_monitoring import RedisMonitor, log_cache_metrics
 from core.cache_warming import warm_essential_caches
 from core.redis_config import get_redis_client
+from core.cache_keys import families, get_family
+from core.cache_tags import invalidate_tags
+from core.keyspace import KeyspaceAnalyzer
 import json
 
 class Command(BaseCommand):
@@ -11,7 +14,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             'action',
-            choices=['stats', 'warm', 'clear', 'monitor', 'test'],
+            choices=['stats', 'analyze', 'schema', 'warm', 'clear', 'monitor', 'test'],
             help='Action to perform on Redis cache'
         )
         parser.add_argument(
@@ -19,6 +22,27 @@ class Command(BaseCommand):
             type=str,
             help='Key pattern to clear (use with clear action)'
         )
+        parser.add_argument(
+            '--family',
+            action='append',
+            choices=sorted(families()),
+            help='Key family to clear, every schema version (use with clear action, repeatable)'
+        )
+        parser.add_argument(
+            '--tag',
+            action='append',
+            help='Cache tag to invalidate, e.g. report:date:2025-03-01 (use with clear action, repeatable)'
+        )
+        parser.add_argument(
+            '--sample-rate',
+            type=float,
+            help='Fraction of keys measured with MEMORY USAGE/TTL (use with analyze action)'
+        )
+        parser.add_argument(
+            '--max-keys',
+            type=int,
+            help='Stop scanning after this many keys (use with analyze action)'
+        )
         parser.add_argument(
             '--verbose',
             action='store_true',
@@ -31,10 +55,14 @@ class Command(BaseCommand):
         
         if action == 'stats':
             self.show_cache_stats(verbose)
+        elif action == 'analyze':
+            self.analyze_keyspace(options.get('sample_rate'), options.get('max_keys'), verbose)
+        elif action == 'schema':
+            self.show_key_schema()
         elif action == 'warm':
             self.warm_cache(verbose)
         elif action == 'clear':
-            self.clear_cache(options.get('pattern'), verbose)
+            self.clear_cache(options.get('pattern'), verbose, options.get('tag'), options.get('family'))
         elif action == 'monitor':
             self.monitor_cache(verbose)
         elif action == 'test':
@@ -69,6 +97,41 @@ class Command(BaseCommand):
             if 'error' in stats:
                 self.stdout.write(self.style.ERROR(f"Error: {stats['error']}"))
 
+    def analyze_keyspace(self, sample_rate=None, max_keys=None, verbose=False):
+        """Show per-family key counts, memory, TTLs and largest keys using SCAN"""
+        self.stdout.write(self.style.SUCCESS('🔍 Analyzing Redis keyspace (SCAN, sampled)...'))
+
+        report = RedisMonitor().analyze_keyspace(sample_rate=sample_rate, max_keys=max_keys)
+        if 'families' not in report:
+            self.stdout.write(self.style.ERROR(f"❌ Analysis failed: {report.get('error', 'unknown error')}"))
+            return
+
+        scope = 'complete' if report['complete'] else 'partial (key budget reached)'
+        self.stdout.write(
+            f"🔑 Scanned {report['scanned_keys']} keys in {report['duration_ms']}ms, {scope}, "
+            f"sample rate {report['sample_rate']}"
+        )
+        for family, details in report['families'].items():
+            self.stdout.write(
+                f"  {family}: {details['keys']} keys, ~{details['estimated_bytes']} bytes "
+                f"(avg {details['avg_bytes']}), TTLs {details['ttl_distribution']}"
+            )
+            if verbose:
+                for largest in details['largest_keys']:
+                    self.stdout.write(f"      {largest['bytes']:>10} B  {largest['key']}")
+
+    def show_key_schema(self):
+        """Show the registered key families and how many keys of each schema version exist"""
+        self.stdout.write(self.style.SUCCESS('🗂️  Cache key schema'))
+        for name, details in RedisMonitor().get_key_schema().items():
+            current = f"v{details['version']}"
+            outdated = sum(count for version, count in details['keys_by_version'].items() if version != current)
+            self.stdout.write(
+                f"  {name} {current} ({details['format']}; parts {', '.join(details['parts']) or '-'}): "
+                f"{details['keys_by_version'].get(current, 0)} keys, {outdated} outdated"
+            )
+            self.stdout.write(f"      {details['payload']}")
+
     def warm_cache(self, verbose=False):
         """Warm the cache with frequently accessed data"""
         self.stdout.write(self.style.SUCCESS('🔥 Warming Cache...'))
@@ -76,8 +139,9 @@ class Command(BaseCommand):
         try:
             results = warm_essential_caches()
             
-            self.stdout.write(f"✅ Users warmed: {results.get('users_warmed', 0)}")
-            self.stdout.write(f"✅ Reports warmed: {results.get('reports_warmed', 0)}")
+            self.stdout.write(f"✅ User keys warmed: {results.get('users_warmed', 0)}")
+            self.stdout.write(f"✅ Report dates warmed: {results.get('reports_warmed', 0)}")
+            self.stdout.write(f"⏱️  Took {results.get('duration_ms', 0)} ms")
             
             if verbose:
                 self.stdout.write(f"📝 Full results: {json.dumps(results, indent=2)}")
@@ -87,22 +151,35 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"❌ Cache warming failed: {e}"))
 
-    def clear_cache(self, pattern=None, verbose=False):
+    def clear_cache(self, pattern=None, verbose=False, tags=None, family_names=None):
         """Clear cache keys"""
-        if pattern:
+        if family_names:
+            redis_client = get_redis_client()
+            if not redis_client:
+                self.stdout.write(self.style.ERROR("❌ Redis client unavailable"))
+                return
+            for name in family_names:
+                deleted, _ = KeyspaceAnalyzer(redis_client, match=get_family(name).match()).delete_matching()
+                self.stdout.write(f"✅ Cleared {deleted} {name} keys")
+        elif tags:
+            self.stdout.write(f'🏷️  Invalidating cache tags: {", ".join(tags)}')
+            deleted = invalidate_tags(*tags)
+            self.stdout.write(f"✅ Cleared {deleted} keys")
+        elif pattern:
             self.stdout.write(f'🧹 Clearing cache keys matching pattern: {pattern}')
             try:
                 redis_client = get_redis_client()
                 if redis_client:
-                    keys = redis_client.keys(f'lafarge_cache:{pattern}')
-                    if keys:
-                        redis_client.delete(*keys)
-                        self.stdout.write(f"✅ Cleared {len(keys)} keys")
+                    # SCAN + batched UNLINK instead of KEYS, so Redis is never blocked
+                    analyzer = KeyspaceAnalyzer(redis_client, match=f'lafarge_cache:*:{pattern}')
+                    deleted, examples = analyzer.delete_matching()
+                    if deleted:
+                        self.stdout.write(f"✅ Cleared {deleted} keys")
                         if verbose:
-                            for key in keys[:10]:  # Show first 10 keys
+                            for key in examples:  # Show first 10 keys
                                 self.stdout.write(f"  - {key}")
-                            if len(keys) > 10:
-                                self.stdout.write(f"  ... and {len(keys) - 10} more")
+                            if deleted > len(examples):
+                                self.stdout.write(f"  ... and {deleted - len(examples)} more")
                     else:
                         self.stdout.write("ℹ️  No keys found matching pattern")
                 else:
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from core.cache_warming import WARMERS, warm_essential_caches
+
+
+class Command(BaseCommand):
+    help = 'Warm the Redis cache; safe to run from cron or a systemd timer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--family',
+            action='append',
+            choices=sorted(WARMERS),
+            help='Resource family to warm (repeatable, default: all)'
+        )
+        parser.add_argument(
+            '--sequential',
+            action='store_true',
+            help='Warm families one after another instead of in parallel'
+        )
+
+    def handle(self, *args, **options):
+        results = warm_essential_caches(options.get('family'), parallel=not options['sequential'])
+        duration = results.pop('duration_ms')
+        for name, count in results.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Cache warming completed in {duration} ms"))
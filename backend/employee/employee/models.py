@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from core.queryset_cache import CachedQuerySet
 
 class EmployeeProfile(models.Model):
 
@@ -23,5 +24,7 @@ class EmployeeProfile(models.Model):
     year_end_bonus = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     is_active = models.BooleanField(default=True, help_text="Designates whether this employee should be treated as active.")
 
+    objects = CachedQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username}"
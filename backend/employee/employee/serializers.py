@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import EmployeeProfile
 from django.contrib.auth.models import User
+from vacation.ledger import set_leave_balance
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,3 +14,18 @@ class EmployeeProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = EmployeeProfile
         fields = '__all__'
+
+    def update(self, instance, validated_data):
+        serializers.raise_errors_on_nested_writes('update', self, validated_data)
+        balance = validated_data.pop('annual_leave_days', None)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            if validated_data:
+                # Only the edited columns, so a concurrent ledger debit is never overwritten
+                instance.save(update_fields=list(validated_data))
+            if balance is not None:
+                # The balance only moves through the ledger
+                set_leave_balance(instance.pk, balance)
+                instance.refresh_from_db(fields=['annual_leave_days'])
+        return instance
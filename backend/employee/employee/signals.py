@@ -2,7 +2,8 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import EmployeeProfile
-from core.redis_config import safe_cache_delete
+from core.cache_tags import invalidate_tags, user_tag, EMPLOYEES_TAG
+from vacation.ledger import open_ledger
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,19 +11,19 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
+        # The profile's post_save below opens its ledger and invalidates the caches
         EmployeeProfile.objects.create(user=instance)
     else:
-        instance.profile.save()
-    
-    # Invalidate user-related caches
-    safe_cache_delete(f'user_profile_{instance.id}')
-    safe_cache_delete('employee_salaries')  # Clear all employee salaries cache
-    logger.info(f"Cache invalidated for user {instance.username}")
+        # No profile save: rewriting the whole row could undo a concurrent balance change
+        invalidate_tags(user_tag(instance.pk), EMPLOYEES_TAG)
+
+@receiver(post_save, sender=EmployeeProfile)
+def open_leave_ledger(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        open_ledger(instance)
 
 @receiver(post_save, sender=EmployeeProfile)
 def invalidate_employee_cache(sender, instance, **kwargs):
-    """Invalidate caches when employee profile is updated"""
-    safe_cache_delete(f'user_profile_{instance.user.id}')
-    safe_cache_delete(f'user_salary_{instance.user.id}')
-    safe_cache_delete('employee_salaries')
-    logger.info(f"Cache invalidated for employee profile {instance.user.username}")
+    """Invalidate user-related caches (profile, salary) and the all-employee listings"""
+    invalidate_tags(user_tag(instance.user_id), EMPLOYEES_TAG)
+    logger.info(f"Cache invalidated for employee profile of user {instance.user_id}")
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User 
+from core.queryset_cache import CachedQuerySet
 
 class ReportEntry(models.Model):
     CLIENT_TYPE_CHOICES = [
@@ -27,7 +28,9 @@ class ReportEntry(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    objects = CachedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date', '-created_at']  # Default ordering
         indexes = [
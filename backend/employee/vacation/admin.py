@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import VacationRequest, VacationItem
+from .models import VacationRequest, VacationItem, LeaveLedgerEntry
 # Register your models here.
 
 class VacationItemInline(admin.TabularInline):
@@ -10,3 +10,14 @@ class VacationRequestAdmin(admin.ModelAdmin):
     inlines = [VacationItemInline]
     list_display = ('employee', 'submitted_at', 'status')
 admin.site.register(VacationRequest, VacationRequestAdmin)
+
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'entry_type', 'days', 'balance_after', 'request', 'created_at')
+    list_filter = ('entry_type',)
+    search_fields = ('employee__user__username',)
+    readonly_fields = ('employee', 'request', 'entry_type', 'days', 'balance_after', 'created_at')
+
+    def has_add_permission(self, request):
+        # Entries must go through vacation.ledger so the profile balance stays in sync
+        return False
+admin.site.register(LeaveLedgerEntry, LeaveLedgerEntryAdmin)
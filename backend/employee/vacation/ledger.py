@@ -0,0 +1,166 @@
+"""
+Leave balance ledger.
+
+Every balance change locks the employee's profile row (``select_for_update``),
+applies the delta with an ``F()`` expression and appends a ``LeaveLedgerEntry``
+inside the same transaction. Concurrent submissions for the same employee
+queue on that single row; different employees never block each other.
+Batches (bulk approvals) lock all affected rows in one query and apply their
+deltas with one UPDATE and one INSERT.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Min, Sum, Value, When
+from rest_framework.exceptions import ValidationError
+from employee.models import EmployeeProfile
+from core.cache_tags import invalidate_tags, user_tag, EMPLOYEES_TAG
+from core.queryset_cache import invalidate_model_cache
+from .models import LeaveLedgerEntry
+from .working_days import WorkingDayCalendar
+
+# Leave was counted in calendar days before the ledger existed
+_CALENDAR_DAYS = WorkingDayCalendar(working_weekdays=range(7))
+
+
+def _invalidate_balance_caches(user_ids):
+    # QuerySet.update() and bulk_create() bypass the post_save signals
+    invalidate_tags(*[user_tag(user_id) for user_id in user_ids], EMPLOYEES_TAG)
+    invalidate_model_cache(EmployeeProfile, LeaveLedgerEntry)
+
+
+def apply_ledger_changes(changes, check_balance=False):
+    """
+    Apply ``(profile_id, days, entry_type, request)`` changes in one transaction.
+
+    Affected profiles are locked in primary-key order (so concurrent batches
+    cannot deadlock), every balance moves in a single UPDATE and the ledger
+    entries are bulk-inserted.
+    """
+    changes = [change for change in changes if change[1]]
+    if not changes:
+        return []
+
+    totals = defaultdict(float)
+    for profile_id, days, _, _ in changes:
+        totals[profile_id] += days
+
+    with transaction.atomic():
+        profiles = {
+            profile.pk: profile
+            for profile in EmployeeProfile.objects.select_for_update()
+            .filter(pk__in=totals)
+            .only('id', 'user_id', 'annual_leave_days')
+            .order_by('pk')
+        }
+        if check_balance:
+            for profile_id, total in totals.items():
+                balance = profiles[profile_id].annual_leave_days
+                if -total > balance:
+                    raise ValidationError(f"You only have {balance} days left, but requested {-total}.")
+
+        EmployeeProfile.objects.filter(pk__in=totals).update(
+            annual_leave_days=F('annual_leave_days') + Case(
+                *[When(pk=profile_id, then=Value(total)) for profile_id, total in totals.items()],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+        running = {profile_id: profile.annual_leave_days for profile_id, profile in profiles.items()}
+        entries = []
+        for profile_id, days, entry_type, request in changes:
+            running[profile_id] += days
+            entries.append(LeaveLedgerEntry(
+                employee_id=profile_id,
+                request=request,
+                entry_type=entry_type,
+                days=days,
+                balance_after=running[profile_id],
+            ))
+        entries = LeaveLedgerEntry.objects.bulk_create(entries)
+
+        # Deferred to commit by invalidate_tags
+        _invalidate_balance_caches([profile.user_id for profile in profiles.values()])
+    return entries
+
+
+def debit_leave(profile_id, days, request=None):
+    """Deduct ``days`` from the balance, raising ValidationError if it would go negative."""
+    entries = apply_ledger_changes([(profile_id, -days, LeaveLedgerEntry.DEBIT, request)], check_balance=True)
+    return entries[0] if entries else None
+
+
+def credit_leave(profile_id, days, request=None, entry_type=LeaveLedgerEntry.REFUND):
+    """Give ``days`` back to the balance (rejections, manual adjustments)."""
+    entries = apply_ledger_changes([(profile_id, days, entry_type, request)])
+    return entries[0] if entries else None
+
+
+def held_days(requests):
+    """
+    Days each of ``requests`` currently holds off its employee's balance, by request pk.
+
+    This is what the request's own ledger entries took rather than a recount, so
+    a refund gives back exactly the days debited, whatever the working-day rules
+    or holiday calendar say today. Requests submitted before the employee's
+    opening entry were debited outside the ledger, in calendar days; that debit
+    still counts unless the request was already rejected when the ledger opened.
+    Expects ``submitted_at``, ``status`` and ``date_items`` to be loaded.
+    """
+    requests = list(requests)
+    entries = defaultdict(list)
+    for request_id, entry_type, days in (
+        LeaveLedgerEntry.objects.filter(request__in=requests)
+        .order_by('created_at', 'id')
+        .values_list('request_id', 'entry_type', 'days')
+    ):
+        entries[request_id].append((entry_type, days))
+    opened = dict(
+        LeaveLedgerEntry.objects.filter(
+            employee_id__in={request.employee_id for request in requests}, entry_type=LeaveLedgerEntry.OPENING
+        )
+        .values('employee_id')
+        .annotate(opened_at=Min('created_at'))
+        .values_list('employee_id', 'opened_at')
+    )
+
+    held = {}
+    for request in requests:
+        own = entries[request.pk]
+        held[request.pk] = -sum(days for _, days in own)
+        opened_at = opened.get(request.employee_id)
+        if opened_at is not None and request.submitted_at < opened_at:
+            # Held at the opening if its first ledger move was a refund, or it never moved and is not rejected
+            if own[0][0] == LeaveLedgerEntry.REFUND if own else request.status != 'rejected':
+                held[request.pk] += sum(item.get_leave_days(_CALENDAR_DAYS) for item in request.date_items.all())
+    return held
+
+
+def open_ledger(profile):
+    """Opening entry for a new profile, so the ledger accounts for its starting balance."""
+    return LeaveLedgerEntry.objects.create(
+        employee=profile,
+        entry_type=LeaveLedgerEntry.OPENING,
+        days=profile.annual_leave_days,
+        balance_after=profile.annual_leave_days,
+    )
+
+
+def set_leave_balance(profile_id, balance, entry_type=LeaveLedgerEntry.ADJUSTMENT):
+    """Move the balance to ``balance``, recording the difference as one ledger entry."""
+    with transaction.atomic():
+        current = (
+            EmployeeProfile.objects.select_for_update()
+            .values_list('annual_leave_days', flat=True)
+            .get(pk=profile_id)
+        )
+        entries = apply_ledger_changes([(profile_id, balance - current, entry_type, None)])
+    return entries[0] if entries else None
+
+
+def ledger_balance(profile_id):
+    """Balance recomputed from the ledger, for reconciling the cached profile value."""
+    total = LeaveLedgerEntry.objects.filter(employee_id=profile_id).aggregate(total=Sum('days'))['total']
+    return total or 0.0
@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_opening_balances(apps, schema_editor):
+    EmployeeProfile = apps.get_model('employee', 'EmployeeProfile')
+    LeaveLedgerEntry = apps.get_model('vacation', 'LeaveLedgerEntry')
+    LeaveLedgerEntry.objects.bulk_create([
+        LeaveLedgerEntry(
+            employee_id=profile.id,
+            entry_type='opening',
+            days=profile.annual_leave_days,
+            balance_after=profile.annual_leave_days,
+        )
+        for profile in EmployeeProfile.objects.only('id', 'annual_leave_days')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0008_employeeprofile_is_active'),
+        ('vacation', '0004_vacationitem_leave_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening balance'), ('debit', 'Leave taken'), ('refund', 'Leave refunded'), ('adjustment', 'Manual adjustment')], max_length=20)),
+                ('days', models.FloatField(help_text='Signed change to the balance; negative for leave taken.')),
+                ('balance_after', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_ledger', to='employee.employeeprofile')),
+                ('request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='vacation.vacationrequest')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['employee', 'created_at'], name='leave_ledger_employee_idx')],
+            },
+        ),
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
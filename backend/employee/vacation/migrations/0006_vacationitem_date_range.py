@@ -0,0 +1,38 @@
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+from django.db.backends.postgresql.psycopg_any import DateRange
+
+
+def populate_date_range(apps, schema_editor):
+    VacationItem = apps.get_model('vacation', 'VacationItem')
+    items = []
+    for item in VacationItem.objects.all():
+        if item.type == 'half' and item.single_date:
+            item.date_range = DateRange(item.single_date, item.single_date, '[]')
+        elif item.type == 'full' and item.from_date and item.to_date:
+            item.date_range = DateRange(item.from_date, item.to_date, '[]')
+        else:
+            continue
+        items.append(item)
+    VacationItem.objects.bulk_update(items, ['date_range'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacation', '0005_leaveledgerentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vacationitem',
+            name='date_range',
+            field=django.contrib.postgres.fields.ranges.DateRangeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_date_range, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vacationitem',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['date_range'], name='vacation_item_range_gist'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacation', '0006_vacationitem_date_range'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vacationrequest',
+            index=models.Index(fields=['status', 'submitted_at'], name='vacation_status_submitted_idx'),
+        ),
+    ]
@@ -1,5 +1,25 @@
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.db.models import Prefetch
+from core.queryset_cache import CachedQuerySet
 from employee.models import EmployeeProfile
+from .working_days import get_working_day_calendar
+
+
+class VacationRequestQuerySet(CachedQuerySet):
+
+    def for_listing(self):
+        """
+        Everything the list serializers touch, in a constant number of queries.
+        ``get_total_days`` then runs over the prefetched items without hitting the database.
+        """
+        return (
+            self.select_related('employee__user')
+            .prefetch_related(Prefetch('date_items', queryset=VacationItem.objects.order_by('id')))
+        )
+
 
 class VacationRequest(models.Model):
     employee = models.ForeignKey(EmployeeProfile, on_delete=models.CASCADE)
@@ -14,17 +34,18 @@ class VacationRequest(models.Model):
         default="pending"
     )
 
+    objects = VacationRequestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Approval queues filter by status and page newest-first
+            models.Index(fields=['status', 'submitted_at'], name='vacation_status_submitted_idx'),
+        ]
+
     def get_total_days(self):
-        total = 0
-        for item in self.date_items.all():
-            if item.leave_type == 'Sick Leave':
-                continue
-            if item.type == 'half' and item.single_date:
-                total += 0.5
-            elif item.type == 'full' and item.from_date and item.to_date:
-                delta = (item.to_date - item.from_date).days + 1
-                total += max(delta, 0)
-        return total
+        """Leave days deducted from the balance: working days only, sick leave excluded."""
+        calendar = get_working_day_calendar()
+        return sum(item.get_leave_days(calendar) for item in self.date_items.all())
 
 
 class VacationItem(models.Model):
@@ -45,4 +66,72 @@ class VacationItem(models.Model):
     # For half-day vacation
     single_date = models.DateField(null=True, blank=True)
     half_day_period = models.CharField(max_length=2, choices=HALF_DAY_PERIOD_CHOICES, null=True, blank=True)
-    leave_type = models.CharField(max_length=20, choices=LEAVE_CHOICES, null=True, blank=True, default='Annual Leave',)
\ No newline at end of file
+    leave_type = models.CharField(max_length=20, choices=LEAVE_CHOICES, null=True, blank=True, default='Annual Leave',)
+
+    # Denormalized from the date fields above so range queries can use the GiST index
+    date_range = DateRangeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=['date_range'], name='vacation_item_range_gist'),
+        ]
+
+    def get_date_bounds(self):
+        """Inclusive (start, end) dates covered by this item, or None if incomplete."""
+        if self.type == 'half' and self.single_date:
+            return self.single_date, self.single_date
+        if self.type == 'full' and self.from_date and self.to_date:
+            return self.from_date, self.to_date
+        return None
+
+    def get_leave_days(self, calendar=None):
+        """Working days this item deducts from the annual leave balance."""
+        if self.leave_type == 'Sick Leave':
+            return 0
+        bounds = self.get_date_bounds()
+        if not bounds:
+            return 0
+        calendar = calendar or get_working_day_calendar()
+        if self.type == 'half':
+            return 0.5 if calendar.is_working_day(bounds[0]) else 0
+        return calendar.count(*bounds)
+
+    def save(self, *args, **kwargs):
+        bounds = self.get_date_bounds()
+        self.date_range = DateRange(bounds[0], bounds[1], '[]') if bounds else None
+        super().save(*args, **kwargs)
+
+class LeaveLedgerEntry(models.Model):
+    """
+    Append-only record of every change to an employee's annual leave balance.
+    ``EmployeeProfile.annual_leave_days`` is the cached running balance; the
+    ledger is the audit trail it can be reconciled against.
+    """
+    OPENING = 'opening'
+    DEBIT = 'debit'
+    REFUND = 'refund'
+    ADJUSTMENT = 'adjustment'
+    ENTRY_TYPE_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (DEBIT, 'Leave taken'),
+        (REFUND, 'Leave refunded'),
+        (ADJUSTMENT, 'Manual adjustment'),
+    ]
+
+    employee = models.ForeignKey(EmployeeProfile, on_delete=models.CASCADE, related_name='leave_ledger')
+    request = models.ForeignKey(
+        VacationRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    days = models.FloatField(help_text="Signed change to the balance; negative for leave taken.")
+    balance_after = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['employee', 'created_at'], name='leave_ledger_employee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} {self.entry_type} {self.days:+g}"
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from .models import VacationRequest, VacationItem
+from employee.models import EmployeeProfile
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.backends.postgresql.psycopg_any import DateRange
 
 User = get_user_model()
 
@@ -20,17 +24,71 @@ class VacationItemSerializer(serializers.ModelSerializer):
 class VacationRequestSerializer(serializers.ModelSerializer):
     date_items = VacationItemSerializer(many=True)
     employee = serializers.CharField(source='employee.user.username', read_only=True)
+    total_days = serializers.FloatField(source='get_total_days', read_only=True)
 
     class Meta:
         model = VacationRequest
-        fields = ['id', 'employee', 'submitted_at', 'status', 'date_items']
-        read_only_fields = ['submitted_at', 'status', 'employee']
+        fields = ['id', 'employee', 'submitted_at', 'status', 'date_items', 'total_days']
+        read_only_fields = ['submitted_at', 'status', 'employee', 'total_days']
 
     def create(self, validated_data):
         date_items_data = validated_data.pop('date_items')
-        request_obj = VacationRequest.objects.create(**validated_data)
 
-        for item_data in date_items_data:
-            VacationItem.objects.create(request=request_obj, **item_data)
+        with transaction.atomic():
+            self._check_overlaps(validated_data['employee'], date_items_data)
+            request_obj = VacationRequest.objects.create(**validated_data)
+
+            for item_data in date_items_data:
+                VacationItem.objects.create(request=request_obj, **item_data)
 
         return request_obj
+
+    @staticmethod
+    def _items_clash(a, b):
+        # Morning and afternoon of the same day may be booked separately
+        if a.type == 'half' and b.type == 'half' and a.half_day_period and b.half_day_period:
+            return a.half_day_period == b.half_day_period
+        return True
+
+    def _check_overlaps(self, employee, date_items_data):
+        """
+        Reject items that overlap each other or any of the employee's non-rejected
+        leave. Uses one range-overlap query served by the GiST index on date_range.
+        """
+        items = [VacationItem(**item_data) for item_data in date_items_data]
+        bounded = [(item.get_date_bounds(), item) for item in items if item.get_date_bounds()]
+        if not bounded:
+            return
+
+        bounded.sort(key=lambda pair: pair[0])
+        for index, ((start, end), item) in enumerate(bounded):
+            for (other_start, _), other in bounded[index + 1:]:
+                if other_start > end:
+                    break
+                if self._items_clash(item, other):
+                    raise serializers.ValidationError(
+                        {'date_items': [f"Dates {start} to {end} overlap another item in this request."]}
+                    )
+
+        # Serialize submissions per employee so two concurrent requests cannot both pass the check
+        list(EmployeeProfile.objects.select_for_update().filter(pk=employee.pk).values_list('pk', flat=True))
+
+        overlap = Q()
+        for (start, end), item in bounded:
+            clause = Q(date_range__overlap=DateRange(start, end, '[]'))
+            if item.type == 'half' and item.half_day_period:
+                clause &= Q(type='full') | Q(half_day_period=item.half_day_period) | Q(half_day_period__isnull=True)
+            overlap |= clause
+
+        clash = (
+            VacationItem.objects
+            .filter(overlap, request__employee=employee)
+            .exclude(request__status='rejected')
+            .order_by('request_id')
+            .first()
+        )
+        if clash:
+            start, end = clash.get_date_bounds()
+            raise serializers.ValidationError(
+                {'date_items': [f"Overlaps your existing leave request #{clash.request_id} ({start} to {end})."]}
+            )
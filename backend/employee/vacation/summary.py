@@ -0,0 +1,84 @@
+"""
+Per-employee leave summary: days by leave type and status for one year.
+
+The breakdown comes from a single grouped query over ``VacationItem`` joined
+to ``VacationRequest``; identical date ranges collapse into one row with an
+occurrence count and are then weighed with the working-day calendar, which SQL
+cannot see. The breakdown is cached per employee and year and tagged with the
+employee's vacation tag, which views invalidate on create or status change.
+The remaining balance is read fresh from the profile because the ledger can
+move it at any time.
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.db.models import Count
+
+from core.redis_config import safe_cache_get, safe_cache_set
+from core.cache_tags import vacation_employee_tag
+from core.cache_keys import VACATION_SUMMARY
+from .models import VacationItem
+from .working_days import get_working_day_calendar
+
+STATUSES = ('approved', 'pending', 'rejected')
+
+
+def summary_cache_key(profile_id, year):
+    return VACATION_SUMMARY.key(profile_id, year)
+
+
+def _row_days(row, calendar, year_start, year_end):
+    if row['type'] == 'half' and row['single_date']:
+        return 0.5 if calendar.is_working_day(row['single_date']) else 0
+    if row['type'] == 'full' and row['from_date'] and row['to_date']:
+        return calendar.count(max(row['from_date'], year_start), min(row['to_date'], year_end))
+    return 0
+
+
+def _build_breakdown(profile_id, year):
+    year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+    rows = (
+        VacationItem.objects
+        .filter(request__employee_id=profile_id, date_range__overlap=DateRange(year_start, year_end, '[]'))
+        .values('leave_type', 'request__status', 'type', 'from_date', 'to_date', 'single_date')
+        .annotate(occurrences=Count('id'))
+        .order_by()
+    )
+
+    calendar = get_working_day_calendar()
+    by_leave_type = defaultdict(lambda: {status: 0 for status in STATUSES})
+    for row in rows:
+        leave_type = row['leave_type'] or 'Annual Leave'
+        days = _row_days(row, calendar, year_start, year_end) * row['occurrences']
+        by_leave_type[leave_type][row['request__status']] += days
+
+    # Always report every leave type, even with nothing booked
+    for leave_type, _ in VacationItem.LEAVE_CHOICES:
+        by_leave_type.setdefault(leave_type, {status: 0 for status in STATUSES})
+    return dict(by_leave_type)
+
+
+def get_leave_summary(profile, year):
+    """Used / pending / remaining leave for ``profile`` in ``year``."""
+    cache_key = summary_cache_key(profile.pk, year)
+    by_leave_type = safe_cache_get(cache_key)
+    if by_leave_type is None:
+        by_leave_type = _build_breakdown(profile.pk, year)
+        safe_cache_set(
+            cache_key, by_leave_type, settings.CACHE_TIMEOUTS['vacation_summary'],
+            tags=[vacation_employee_tag(profile.pk)]
+        )
+
+    annual = by_leave_type.get('Annual Leave', {})
+    return {
+        'employee': profile.user.username,
+        'year': year,
+        'used': annual.get('approved', 0),
+        'pending': annual.get('pending', 0),
+        'remaining': profile.annual_leave_days,
+        'by_leave_type': by_leave_type,
+    }
+
@@ -0,0 +1,121 @@
+"""
+Team leave calendar: who is out on each day of a date window.
+
+Absences are computed one calendar month at a time with a single range-overlap
+query (served by the GiST index on ``VacationItem.date_range``) and cached per
+month, so any window is assembled from at most a handful of cached months,
+read with one MGET.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.backends.postgresql.psycopg_any import DateRange
+
+from core.redis_config import safe_cache_get, safe_cache_get_many, safe_cache_set, safe_cache_set_many
+from core.cache_tags import invalidate_tags, vacation_month_tag
+from core.cache_keys import VACATION_CALENDAR
+from .models import VacationItem
+
+
+def month_cache_key(year, month):
+    return VACATION_CALENDAR.key(f'{year:04d}-{month:02d}')
+
+
+def _month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _months_between(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _build_month(year, month):
+    month_start, month_end = _month_bounds(year, month)
+    items = (
+        VacationItem.objects
+        .filter(date_range__overlap=DateRange(month_start, month_end, '[]'))
+        .exclude(request__status='rejected')
+        .select_related('request__employee__user')
+        .order_by('request__employee__user__username', 'id')
+    )
+
+    days = defaultdict(list)
+    for item in items:
+        bounds = item.get_date_bounds()
+        if not bounds:
+            continue
+        user = item.request.employee.user
+        absence = {
+            'employee': user.username,
+            'name': user.get_full_name() or user.username,
+            'request_id': item.request_id,
+            'status': item.request.status,
+            'type': item.type,
+            'half_day_period': item.half_day_period,
+            'leave_type': item.leave_type,
+        }
+        day = max(bounds[0], month_start)
+        last = min(bounds[1], month_end)
+        while day <= last:
+            days[day.isoformat()].append(absence)
+            day += timedelta(days=1)
+    return dict(days)
+
+
+def get_month_absences(year, month):
+    """Absentees keyed by ISO date for one calendar month, cached."""
+    cache_key = month_cache_key(year, month)
+    cached = safe_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    days = _build_month(year, month)
+    safe_cache_set(
+        cache_key, days, settings.CACHE_TIMEOUTS['vacation_calendar'], tags=[vacation_month_tag(year, month)]
+    )
+    return days
+
+
+def get_team_calendar(start, end):
+    """One entry per day in the inclusive window, with that day's absentees."""
+    # Every cached month in one read; missing months are built and written back in one pipeline
+    months = {month_cache_key(year, month): (year, month) for year, month in _months_between(start, end)}
+    cached = safe_cache_get_many(months)
+    built = []
+    absences = {}
+    for cache_key, (year, month) in months.items():
+        days = cached.get(cache_key)
+        if days is None:
+            days = _build_month(year, month)
+            built.append(VACATION_CALENDAR.entry(
+                cache_key, days, settings.CACHE_TIMEOUTS['vacation_calendar'], [vacation_month_tag(year, month)]
+            ))
+        absences.update(days)
+    safe_cache_set_many(built)
+
+    result = []
+    day = start
+    while day <= end:
+        key = day.isoformat()
+        result.append({'date': key, 'absentees': absences.get(key, [])})
+        day += timedelta(days=1)
+    return result
+
+
+def invalidate_team_calendar(*vacation_requests):
+    """Drop the cached months touched by requests after they are created or change status."""
+    months = set()
+    items = VacationItem.objects.filter(request__in=[request.pk for request in vacation_requests]).only(
+        'type', 'from_date', 'to_date', 'single_date'
+    )
+    for item in items:
+        bounds = item.get_date_bounds()
+        if bounds:
+            months.update(_months_between(*bounds))
+    invalidate_tags(*[vacation_month_tag(year, month) for year, month in months])
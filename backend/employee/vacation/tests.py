@@ -1,3 +1,471 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import os
+import tempfile
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from core.testing import FakeRedisMixin
+from employee.models import EmployeeProfile
+from vacation.ledger import credit_leave, debit_leave, held_days, ledger_balance, set_leave_balance
+from vacation.models import LeaveLedgerEntry, VacationItem, VacationRequest
+from vacation.working_days import WorkingDayCalendar, load_holidays
+
+
+def make_employee(username, role='CLERK'):
+    profile = User.objects.create_user(username=username, password='x').profile
+    if profile.role != role:
+        profile.role = role
+        profile.save(update_fields=['role'])
+    return profile
+
+
+def full_days(start, end, leave_type='Annual Leave'):
+    return {'type': 'full', 'from_date': start, 'to_date': end, 'leave_type': leave_type}
+
+
+def half_day(day, period='AM', leave_type='Annual Leave'):
+    return {'type': 'half', 'single_date': day, 'half_day_period': period, 'leave_type': leave_type}
+
+
+def make_request(profile, *items, status='pending'):
+    request = VacationRequest.objects.create(employee=profile, status=status)
+    for item in items:
+        VacationItem.objects.create(request=request, **item)
+    return request
+
+
+class LeaveLedgerOpeningTest(FakeRedisMixin, TransactionTestCase):
+    """The ledger must account for the whole balance from the moment a profile exists."""
+
+    def test_new_profile_ledger_matches_balance(self):
+        user = User.objects.create_user(username='ledger-opening', password='x')
+        profile = EmployeeProfile.objects.get(user=user)
+        self.assertEqual(
+            list(profile.leave_ledger.values_list('entry_type', 'days')),
+            [(LeaveLedgerEntry.OPENING, profile.annual_leave_days)],
+        )
+        self.assertEqual(ledger_balance(profile.pk), profile.annual_leave_days)
+
+    def test_user_save_keeps_ledger_debit(self):
+        user = User.objects.create_user(username='ledger-user-save', password='x')
+        profile = EmployeeProfile.objects.get(user=user)
+        debit_leave(profile.pk, 2.0)
+        user.first_name = 'Changed'
+        user.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.annual_leave_days, 5.0)
+        self.assertEqual(ledger_balance(profile.pk), profile.annual_leave_days)
+
+
+class LeaveRefundTest(FakeRedisMixin, TransactionTestCase):
+    """A refund returns what the request's ledger entries took, not a recount."""
+
+    def test_refund_matches_debit(self):
+        user = User.objects.create_user(username='ledger-refund', password='x')
+        profile = EmployeeProfile.objects.get(user=user)
+        # No items: today's rules would count 0 days for it
+        request = VacationRequest.objects.create(employee=profile)
+        debit_leave(profile.pk, 3.0, request=request)
+        self.assertEqual(held_days([request]), {request.pk: 3.0})
+
+        credit_leave(profile.pk, held_days([request])[request.pk], request=request)
+        profile.refresh_from_db()
+        self.assertEqual(profile.annual_leave_days, 7.0)
+        self.assertEqual(held_days([request]), {request.pk: 0.0})
+
+
+class LeaveLedgerConcurrencyTest(FakeRedisMixin, TransactionTestCase):
+    """Bursty submissions must never overdraw the balance or lose an update."""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='ledger-test', password='x')
+        self.profile = EmployeeProfile.objects.get(user=user)
+        set_leave_balance(self.profile.pk, 5.0)
+
+    def _submit(self, results):
+        try:
+            debit_leave(self.profile.pk, 1.0)
+            results.append('ok')
+        except ValidationError:
+            results.append('rejected')
+        finally:
+            connection.close()
+
+    def test_concurrent_debits_never_overdraw(self):
+        results = []
+        barrier = threading.Barrier(12)
+
+        def worker():
+            barrier.wait()
+            self._submit(results)
+
+        threads = [threading.Thread(target=worker) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.profile.refresh_from_db()
+        self.assertEqual(results.count('ok'), 5)
+        self.assertEqual(results.count('rejected'), 7)
+        self.assertEqual(self.profile.annual_leave_days, 0.0)
+        self.assertEqual(ledger_balance(self.profile.pk), self.profile.annual_leave_days)
+
+
+class VacationListingTest(FakeRedisMixin, APITestCase):
+    """Listings cost the same few queries however many requests and items they return."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = make_employee('listing-manager', role='MANAGER')
+        self.employee = make_employee('listing-employee')
+        self.client.force_authenticate(self.manager.user)
+
+    def _queries(self, url):
+        self.redis.flushall()  # measure the database, not the response cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_results(self):
+        make_request(self.employee, full_days(date(2025, 3, 3), date(2025, 3, 7)))
+        make_request(self.manager, full_days(date(2025, 3, 3), date(2025, 3, 7)))
+        baseline = {url: self._queries(url) for url in ('/api/vacations/', '/api/vacations/me/')}
+
+        other = make_employee('listing-other')
+        for week in range(5):
+            make_request(other, full_days(date(2025, 4, 7 + week), date(2025, 4, 7 + week)), half_day(date(2025, 6, 2)))
+            make_request(self.manager, half_day(date(2025, 5, 5 + week), 'PM'))
+        for url, count in baseline.items():
+            self.assertEqual(self._queries(url), count, url)
+
+    def test_total_days_counts_working_days(self):
+        make_request(
+            self.employee,
+            full_days(date(2025, 3, 7), date(2025, 3, 10)),                 # Friday to Monday: 2
+            half_day(date(2025, 3, 11)),                                     # 0.5
+            full_days(date(2025, 3, 12), date(2025, 3, 12), 'Sick Leave'),  # not deducted
+        )
+        response = self.client.get('/api/vacations/')
+        self.assertEqual([row['total_days'] for row in response.data], [2.5])
+
+
+class TeamLeaveCalendarTest(FakeRedisMixin, APITransactionTestCase):
+    """One entry per day of the window, listing who is on non-rejected leave."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = make_employee('calendar-manager', role='MANAGER')
+        self.employee = make_employee('calendar-employee')
+        self.client.force_authenticate(self.manager.user)
+
+    def _calendar(self, start, end):
+        return self.client.get('/api/vacations/calendar/', {'start_date': start, 'end_date': end})
+
+    def _absentees(self, response):
+        return {day['date']: [absence['employee'] for absence in day['absentees']] for day in response.data}
+
+    def test_lists_absentees_per_day_across_months(self):
+        make_request(self.employee, full_days(date(2025, 2, 27), date(2025, 3, 3)), status='approved')
+        make_request(self.manager, half_day(date(2025, 3, 1), 'PM'))
+        make_request(self.manager, full_days(date(2025, 2, 28), date(2025, 2, 28)), status='rejected')
+
+        response = self._calendar('2025-02-28', '2025-03-04')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._absentees(response), {
+            '2025-02-28': ['calendar-employee'],
+            '2025-03-01': ['calendar-employee', 'calendar-manager'],
+            '2025-03-02': ['calendar-employee'],
+            '2025-03-03': ['calendar-employee'],
+            '2025-03-04': [],
+        })
+
+    def test_new_request_invalidates_cached_month(self):
+        self.assertEqual(self._absentees(self._calendar('2025-03-10', '2025-03-10')), {'2025-03-10': []})
+
+        self.client.force_authenticate(self.employee.user)
+        response = self.client.post(
+            '/api/vacation/create', {'date_items': [full_days('2025-03-10', '2025-03-10')]}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+        self.client.force_authenticate(self.manager.user)
+        self.assertEqual(
+            self._absentees(self._calendar('2025-03-10', '2025-03-10')), {'2025-03-10': ['calendar-employee']}
+        )
+
+    def test_rejects_invalid_windows(self):
+        for start, end in [
+            ('2025-02-30', '2025-03-01'),   # impossible date
+            ('2025-03-01', ''),             # missing
+            ('2025-03-02', '2025-03-01'),   # reversed
+            ('2025-01-01', '2026-01-02'),   # over 366 days
+        ]:
+            self.assertEqual(self._calendar(start, end).status_code, 400, (start, end))
+
+    def test_requires_management(self):
+        self.client.force_authenticate(self.employee.user)
+        self.assertEqual(self._calendar('2025-03-01', '2025-03-02').status_code, 403)
+
+
+class VacationOverlapTest(FakeRedisMixin, APITestCase):
+    """New leave may not overlap the employee's own pending or approved leave, or itself."""
+
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('overlap-employee')
+        self.client.force_authenticate(self.employee.user)
+
+    def _submit(self, *items):
+        return self.client.post('/api/vacation/create', {'date_items': list(items)}, format='json')
+
+    def test_rejects_overlap_with_existing_leave(self):
+        existing = make_request(self.employee, full_days(date(2025, 3, 3), date(2025, 3, 5)))
+        response = self._submit(full_days('2025-03-05', '2025-03-06'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'#{existing.pk}', response.data['date_items'][0])
+
+        response = self._submit(half_day('2025-03-04', 'PM'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejected_and_other_employees_leave_do_not_count(self):
+        make_request(self.employee, full_days(date(2025, 3, 3), date(2025, 3, 5)), status='rejected')
+        make_request(make_employee('overlap-colleague'), full_days(date(2025, 3, 3), date(2025, 3, 5)))
+        self.assertEqual(self._submit(full_days('2025-03-03', '2025-03-05')).status_code, 201)
+
+    def test_half_days_clash_only_on_the_same_period(self):
+        make_request(self.employee, half_day(date(2025, 3, 4), 'AM'))
+        self.assertEqual(self._submit(half_day('2025-03-04', 'PM')).status_code, 201)
+        self.assertEqual(self._submit(half_day('2025-03-04', 'AM')).status_code, 400)
+        self.assertEqual(self._submit(full_days('2025-03-04', '2025-03-04')).status_code, 400)
+
+    def test_rejects_items_overlapping_each_other(self):
+        response = self._submit(full_days('2025-03-03', '2025-03-05'), half_day('2025-03-05', 'AM'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VacationRequest.objects.filter(employee=self.employee).exists())
+
+
+class VacationRequestFilterTest(FakeRedisMixin, APITransactionTestCase):
+    """Management listing filters, cursor pagination and the pending-count badge."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = make_employee('filter-manager', role='MANAGER')
+        self.alice = make_employee('filter-alice')
+        self.bob = make_employee('filter-bob')
+        self.march = make_request(self.alice, full_days(date(2025, 3, 3), date(2025, 3, 4)))
+        self.april = make_request(self.alice, half_day(date(2025, 4, 1)), status='approved')
+        self.may = make_request(self.bob, full_days(date(2025, 5, 5), date(2025, 5, 6)), status='rejected')
+        self.client.force_authenticate(self.manager.user)
+
+    def _ids(self, **params):
+        response = self.client.get('/api/vacations/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data]
+
+    def test_filters(self):
+        self.assertEqual(self._ids(), [self.may.pk, self.april.pk, self.march.pk])
+        self.assertEqual(self._ids(status='pending,approved'), [self.april.pk, self.march.pk])
+        self.assertEqual(self._ids(employee=self.bob.pk), [self.may.pk])
+        self.assertEqual(self._ids(employee='filter-alice'), [self.april.pk, self.march.pk])
+        self.assertEqual(self._ids(start_date='2025-03-04', end_date='2025-04-01'), [self.april.pk, self.march.pk])
+        self.assertEqual(self._ids(start_date='2025-04-02'), [self.may.pk])
+
+    def test_impossible_date_is_rejected(self):
+        response = self.client.get('/api/vacations/', {'start_date': '2025-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination_walks_every_request_once(self):
+        response = self.client.get('/api/vacations/', {'paginate': 'true', 'page_size': 2})
+        first_page = [row['id'] for row in response.data['results']]
+        self.assertEqual(first_page, [self.may.pk, self.april.pk])
+
+        # A request submitted meanwhile does not shift the next page
+        make_request(self.bob, half_day(date(2025, 6, 2)))
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], [self.march.pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_pending_count_follows_status_changes(self):
+        response = self.client.get('/api/vacations/pending-count/')
+        self.assertEqual(response.data, {'pending': 1})
+
+        response = self.client.patch(f'/api/vacation/{self.march.pk}/update/', {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/vacations/pending-count/').data, {'pending': 0})
+
+    def test_pending_count_requires_management(self):
+        self.client.force_authenticate(self.alice.user)
+        self.assertEqual(self.client.get('/api/vacations/pending-count/').status_code, 403)
+
+
+class VacationBulkUpdateTest(FakeRedisMixin, APITransactionTestCase):
+    """Bulk decisions apply together, move balances once per employee and fail as a whole."""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = make_employee('bulk-manager', role='MANAGER')
+        self.employee = make_employee('bulk-employee')
+        self.first = self._booked(full_days(date(2025, 3, 3), date(2025, 3, 4)))   # 2 days
+        self.second = self._booked(half_day(date(2025, 3, 5)))                      # 0.5
+        self.client.force_authenticate(self.manager.user)
+
+    def _booked(self, *items):
+        request = make_request(self.employee, *items)
+        debit_leave(self.employee.pk, request.get_total_days(), request=request)
+        return request
+
+    def _post(self, data):
+        return self.client.post('/api/vacations/bulk-update/', data, format='json')
+
+    def _balance(self):
+        self.employee.refresh_from_db()
+        return self.employee.annual_leave_days
+
+    def test_decisions_apply_and_refund_rejections(self):
+        self.assertEqual(self._balance(), 4.5)
+        self.assertEqual(self.client.get('/api/vacations/pending-count/').data, {'pending': 2})
+
+        response = self._post({'decisions': [
+            {'id': self.first.pk, 'status': 'rejected'}, {'id': self.second.pk, 'status': 'approved'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': sorted([self.first.pk, self.second.pk]), 'unchanged': []})
+        self.assertEqual(self._balance(), 6.5)
+        self.assertEqual(ledger_balance(self.employee.pk), 6.5)
+        self.assertEqual(self.client.get('/api/vacations/pending-count/').data, {'pending': 0})
+
+        # Reinstating the rejection debits it again; repeating a decision changes nothing
+        response = self._post({'ids': [self.first.pk, self.second.pk], 'status': 'approved'})
+        self.assertEqual(response.data, {'updated': [self.first.pk], 'unchanged': [self.second.pk]})
+        self.assertEqual(self._balance(), 4.5)
+
+    def test_unknown_id_changes_nothing(self):
+        response = self._post({'ids': [self.first.pk, 999999], 'status': 'rejected'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['missing_ids'], [999999])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, 'pending')
+        self.assertEqual(self._balance(), 4.5)
+
+    def test_invalid_input(self):
+        self.assertEqual(self._post({'ids': [self.first.pk], 'status': 'cancelled'}).status_code, 400)
+        self.assertEqual(self._post({'ids': ['x'], 'status': 'approved'}).status_code, 400)
+        self.assertEqual(self._post({'ids': []}).status_code, 400)
+
+        self.client.force_authenticate(self.employee.user)
+        self.assertEqual(self._post({'ids': [self.first.pk], 'status': 'approved'}).status_code, 403)
+
+
+class WorkingDayCalendarTest(SimpleTestCase):
+    """Leave is counted in working days: weekends and public holidays are free."""
+
+    def setUp(self):
+        self.calendar = WorkingDayCalendar(holidays={date(2025, 4, 18), date(2025, 12, 25), date(2026, 1, 1)})
+
+    def _brute_force(self, start, end):
+        days = (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+        return sum(1 for day in days if day.weekday() < 5 and day not in self.calendar.holidays)
+
+    def test_counts_match_day_by_day(self):
+        for start, end in [
+            (date(2025, 4, 14), date(2025, 4, 20)),     # week with Good Friday
+            (date(2025, 12, 20), date(2026, 1, 5)),     # across the new year
+            (date(2024, 2, 28), date(2024, 3, 1)),      # leap day
+            (date(2025, 3, 8), date(2025, 3, 9)),       # weekend only
+            (date(2023, 6, 1), date(2026, 6, 1)),       # several years
+        ]:
+            self.assertEqual(self.calendar.count(start, end), self._brute_force(start, end), (start, end))
+        self.assertEqual(self.calendar.count(date(2025, 3, 5), date(2025, 3, 4)), 0)
+
+    def test_is_working_day(self):
+        self.assertTrue(self.calendar.is_working_day(date(2025, 4, 17)))
+        self.assertFalse(self.calendar.is_working_day(date(2025, 4, 18)))  # holiday
+        self.assertFalse(self.calendar.is_working_day(date(2025, 4, 19)))  # Saturday
+
+    def test_custom_working_week_and_last_year(self):
+        six_day_week = WorkingDayCalendar(working_weekdays=range(6))
+        self.assertEqual(six_day_week.count(date(2025, 3, 3), date(2025, 3, 9)), 6)
+        self.assertEqual(self.calendar.count(date(9999, 12, 27), date(9999, 12, 31)), 5)
+
+    def test_item_days(self):
+        calendar = WorkingDayCalendar()
+        self.assertEqual(VacationItem(**full_days(date(2025, 3, 7), date(2025, 3, 10))).get_leave_days(calendar), 2)
+        self.assertEqual(VacationItem(**half_day(date(2025, 3, 7))).get_leave_days(calendar), 0.5)
+        self.assertEqual(VacationItem(**half_day(date(2025, 3, 8))).get_leave_days(calendar), 0)
+        sick = VacationItem(**full_days(date(2025, 3, 3), date(2025, 3, 7), 'Sick Leave'))
+        self.assertEqual(sick.get_leave_days(calendar), 0)
+
+    def test_load_holidays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'holidays.txt')
+            with open(path, 'w') as holidays:
+                holidays.write("# 2025\n2025-01-01 New Year\n\n2025-04-18,Good Friday\nnot-a-date\n")
+            self.assertEqual(load_holidays(path), {date(2025, 1, 1), date(2025, 4, 18)})
+            self.assertEqual(load_holidays(os.path.join(directory, 'missing.txt')), set())
+
+
+class LeaveSummaryTest(FakeRedisMixin, APITransactionTestCase):
+    """Working days by leave type and status for one year, and the live balance."""
+
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('summary-employee')
+        make_request(
+            self.employee,
+            full_days(date(2025, 3, 3), date(2025, 3, 4)),                  # 2
+            full_days(date(2024, 12, 30), date(2025, 1, 3)),                # 3 of them in 2025
+            full_days(date(2025, 5, 5), date(2025, 5, 6), 'Sick Leave'),    # 2
+            status='approved',
+        )
+        make_request(self.employee, half_day(date(2025, 6, 2)))
+        make_request(self.employee, full_days(date(2025, 7, 7), date(2025, 7, 7)), status='rejected')
+        self.client.force_authenticate(self.employee.user)
+
+    def _summary(self, url='/api/vacations/summary/me/', year='2025'):
+        return self.client.get(url, {'year': year})
+
+    def test_breakdown(self):
+        response = self._summary()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['year'], 2025)
+        self.assertEqual((response.data['used'], response.data['pending']), (5, 0.5))
+        self.assertEqual(response.data['remaining'], self.employee.annual_leave_days)
+        self.assertEqual(response.data['by_leave_type'], {
+            'Annual Leave': {'approved': 5, 'pending': 0.5, 'rejected': 1},
+            'Sick Leave': {'approved': 2, 'pending': 0, 'rejected': 0},
+        })
+        self.assertEqual(self._summary(year='2024').data['used'], 2)
+
+    def test_new_request_invalidates_summary(self):
+        self.assertEqual(self._summary().data['pending'], 0.5)
+        response = self.client.post(
+            '/api/vacation/create', {'date_items': [full_days('2025-08-04', '2025-08-05')]}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        # As on a real request, the user and profile are loaded afresh
+        self.client.force_authenticate(User.objects.get(pk=self.employee.user_id))
+        summary = self._summary().data
+        self.assertEqual(summary['pending'], 2.5)
+        self.assertEqual(summary['remaining'], 5.0)
+
+    def test_invalid_year(self):
+        for year in ('0', '10000', 'abc', '-1'):
+            self.assertEqual(self._summary(year=year).status_code, 400, year)
+
+    def test_access_to_other_summaries(self):
+        colleague = make_employee('summary-colleague')
+        self.assertEqual(self._summary(f'/api/vacations/summary/{colleague.pk}/').status_code, 403)
+        self.assertEqual(self._summary(f'/api/vacations/summary/{self.employee.pk}/').status_code, 200)
+
+        self.client.force_authenticate(make_employee('summary-manager', role='MANAGER').user)
+        self.assertEqual(self._summary(f'/api/vacations/summary/{self.employee.pk}/').data['used'], 5)
+        self.assertEqual(self._summary('/api/vacations/summary/999999/').status_code, 404)
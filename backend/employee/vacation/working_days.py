@@ -0,0 +1,96 @@
+"""
+Working-day calendar used to count leave.
+
+Each year is precomputed once into a bitmap (1 = working day) and a prefix-sum
+table over it, so counting the working days in any range is two lookups per
+calendar year touched. Weekends come from ``settings.WORKING_WEEKDAYS`` and
+public holidays from the local file named by ``settings.PUBLIC_HOLIDAYS_FILE``.
+
+Holiday file format: one ``YYYY-MM-DD`` per line, optionally followed by a
+comma or whitespace and a description. Blank lines and ``#`` comments are ignored.
+"""
+
+from array import array
+from calendar import isleap
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKING_WEEKDAYS = (0, 1, 2, 3, 4)  # Monday to Friday
+
+
+def load_holidays(path):
+    """Read holiday dates from a local file; a missing file means no holidays."""
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"Holiday file {path} not found, counting weekends only")
+        return set()
+
+    holidays = set()
+    for line_number, line in enumerate(path.read_text().splitlines(), start=1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        token = line.replace(',', ' ').split()[0]
+        try:
+            holidays.add(date.fromisoformat(token))
+        except ValueError:
+            logger.warning(f"Skipping invalid holiday on line {line_number} of {path}: {token!r}")
+    return holidays
+
+
+class WorkingDayCalendar:
+    """O(1)-per-year working-day counts backed by per-year bitmaps and prefix sums."""
+
+    def __init__(self, holidays=(), working_weekdays=DEFAULT_WORKING_WEEKDAYS):
+        self.holidays = frozenset(holidays)
+        self.working_weekdays = frozenset(working_weekdays)
+        self._years = {}
+
+    def _year_tables(self, year):
+        tables = self._years.get(year)
+        if tables is None:
+            # No date arithmetic past the year's last day, which would overflow in 9999
+            first = date(year, 1, 1).toordinal()
+            length = 366 if isleap(year) else 365
+            bitmap = bytearray(length)
+            prefix = array('H', [0]) * (length + 1)
+            for offset in range(length):
+                day = date.fromordinal(first + offset)
+                if day.weekday() in self.working_weekdays and day not in self.holidays:
+                    bitmap[offset] = 1
+                prefix[offset + 1] = prefix[offset] + bitmap[offset]
+            tables = (bitmap, prefix)
+            self._years[year] = tables
+        return tables
+
+    def is_working_day(self, day):
+        bitmap, _ = self._year_tables(day.year)
+        return bool(bitmap[day.timetuple().tm_yday - 1])
+
+    def count(self, start, end):
+        """Working days in the inclusive range ``start``..``end``."""
+        if start > end:
+            return 0
+
+        total = 0
+        for year in range(start.year, end.year + 1):
+            _, prefix = self._year_tables(year)
+            first = start.timetuple().tm_yday - 1 if year == start.year else 0
+            last = end.timetuple().tm_yday if year == end.year else len(prefix) - 1
+            total += prefix[last] - prefix[first]
+        return total
+
+
+@lru_cache(maxsize=1)
+def get_working_day_calendar():
+    """Process-wide calendar built from settings; call ``cache_clear()`` after editing the holiday file."""
+    holidays_file = getattr(settings, 'PUBLIC_HOLIDAYS_FILE', None)
+    holidays = load_holidays(holidays_file) if holidays_file else set()
+    working_weekdays = getattr(settings, 'WORKING_WEEKDAYS', DEFAULT_WORKING_WEEKDAYS)
+    return WorkingDayCalendar(holidays, working_weekdays)